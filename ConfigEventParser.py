@@ -0,0 +1,236 @@
+from collections import namedtuple
+
+from ConfigFastParser import (
+    ConfigTokenizer, convert_value, block_follows, VALUE_TOKENS,
+    IDENTIFIER, LCURLY, RCURLY, EQUALS, SEMICOLON, COMMA, EOF,
+)
+
+# Streaming, SAX-style parser for the ar7.cfg/vpn.cfg format. It reads the
+# file in chunks and yields events while it parses, so neither a parse tree
+# nor the complete result dict is ever built.
+#
+# Events, with path being the tuple of section names leading to a block:
+#   enter_section(path, index)       a '{' block of the section starts
+#   variable(path, name, value)      a variable of the block at path
+#   exit_section(path, index)        the block ends
+#   list_item(path, index)           another block of the same section
+#                                    follows, so the section is a list and
+#                                    the blocks are its items 0..index
+#
+# index counts the blocks of a section: 0 for the first one, 1, 2, ... for
+# the following ones. A section with only block 0 is a single section.
+#
+# With lookahead, the value of the enter_section event of block 0 tells
+# whether more blocks follow, so a consumer knows whether the section is a
+# list before its first block. This needs the whole config in memory (a str
+# or an mmap), the following blocks are found with the skip scanner.
+
+ENTER_SECTION = 'enter_section'
+EXIT_SECTION = 'exit_section'
+VARIABLE = 'variable'
+LIST_ITEM = 'list_item'
+
+ConfigEvent = namedtuple('ConfigEvent', ['kind', 'path', 'name', 'value', 'index'])
+
+
+class ConfigEventParser:
+    def __init__(self, tokenizer, lookahead=False):
+        self.tokenizer = tokenizer
+        self.lookahead = lookahead
+        self._tokens = tokenizer.tokens()
+        self._advance()
+
+    def _advance(self):
+        self.type, self.text, self.pos = next(self._tokens)
+
+    def _error(self, message):
+        return self.tokenizer.error(message, self.pos)
+
+    def _expect(self, token_type):
+        if self.type != token_type:
+            raise self._error(f"mismatched input '{self.text}' expecting {token_type}")
+        self._advance()
+
+    def events(self):
+        while self.type == IDENTIFIER:
+            path = (self.text,)
+            self._advance()
+            yield from self._section(path)
+        if self.type != EOF:
+            raise self._error(f"extraneous input '{self.text}' expecting {{IDENTIFIER, <EOF>}}")
+
+    def _section(self, path):
+        index = 0
+        if self.lookahead:
+            yield ConfigEvent(ENTER_SECTION, path, None, block_follows(self.tokenizer.text, self.pos), index)
+        else:
+            yield ConfigEvent(ENTER_SECTION, path, None, None, index)
+        while True:
+            yield from self._block(path)
+            yield ConfigEvent(EXIT_SECTION, path, None, None, index)
+            if self.type != LCURLY:
+                return
+            index += 1
+            yield ConfigEvent(LIST_ITEM, path, None, None, index)
+            yield ConfigEvent(ENTER_SECTION, path, None, None, index)
+
+    def _block(self, path):
+        self._expect(LCURLY)
+        while self.type == IDENTIFIER:
+            name = self.text
+            self._advance()
+            if self.type == EQUALS:
+                self._advance()
+                value = self._value()
+                if self.type == COMMA:
+                    values = [value]
+                    while self.type == COMMA:
+                        self._advance()
+                        values.append(self._value())
+                    value = values
+                self._expect(SEMICOLON)
+                yield ConfigEvent(VARIABLE, path, name, value, None)
+            elif self.type == LCURLY:
+                yield from self._section(path + (name,))
+            else:
+                raise self._error(f"mismatched input '{self.text}' expecting {{'{{', '='}}")
+        self._expect(RCURLY)
+
+    def _value(self):
+        if self.type not in VALUE_TOKENS:
+            raise self._error(f"mismatched input '{self.text}' expecting value")
+        value = convert_value(self.type, self.text)
+        self._advance()
+        return value
+
+
+def iter_config_events(path, chunk_size=1 << 16):
+    """Yields the ConfigEvents of a config file, reading it in chunks."""
+    with open(path, 'r', encoding='utf-8') as f:
+        yield from ConfigEventParser(ConfigTokenizer(stream=f, chunk_size=chunk_size)).events()
+
+
+def iter_config_string_events(text, lookahead=False):
+    yield from ConfigEventParser(ConfigTokenizer(text), lookahead=lookahead).events()
+
+
+def iter_dict_events(config, path=()):
+    """Yields the ConfigEvents of an already parsed config, with the values
+    of lookahead. Dicts are sections, lists of dicts are lists of sections
+    and everything else is a variable."""
+    for name, value in config.items():
+        if isinstance(value, dict):
+            blocks = [value]
+        elif isinstance(value, list) and value and all(isinstance(item, dict) for item in value):
+            blocks = value
+        else:
+            yield ConfigEvent(VARIABLE, path, name, value, None)
+            continue
+        section = path + (name,)
+        for index, block in enumerate(blocks):
+            if index:
+                yield ConfigEvent(LIST_ITEM, section, None, None, index)
+                yield ConfigEvent(ENTER_SECTION, section, None, None, index)
+            else:
+                yield ConfigEvent(ENTER_SECTION, section, None, len(blocks) > 1 or value is not block, index)
+            yield from iter_dict_events(block, section)
+            yield ConfigEvent(EXIT_SECTION, section, None, None, index)
+
+
+_MISSING = object()
+
+
+class _SectionRun:
+    """The blocks of one section that directly follow each other, placed
+    like ConfigFastParser._section_body does once the block is complete."""
+
+    def __init__(self, parent, name):
+        self.parent = parent
+        self.name = name
+        # A single block replaces the value, a list of blocks is added to it
+        self.previous = parent.get(name, _MISSING)
+        self.target = None
+        self.key = name
+        # Whether the last block contains sections
+        self.nested = False
+
+    def _place(self, block):
+        if isinstance(self.target, list):
+            self.target.append(block)
+        else:
+            self.target[self.key] = block
+
+    def add(self, block):
+        if self.target is None:
+            # Block 0 was placed as a single section, now it is the first of a list
+            first = self.parent[self.name]
+            if self.previous is _MISSING:
+                self.parent[self.name] = []
+            else:
+                self.parent[self.name] = self.previous
+            self.target = self.parent[self.name]
+            self._place(first)
+        if self.nested:
+            self.key = None
+        self._place(block)
+
+
+class BlockBuilder:
+    """Builds the dict of one block, and its nested sections, from events."""
+
+    def __init__(self):
+        self.root = {}
+        self.stack = [self.root]
+        # Per open block: the run of its current section and whether it
+        # contains sections
+        self.runs = [None]
+        self.nested = [False]
+
+    def feed(self, event):
+        kind = event.kind
+        if kind == VARIABLE:
+            self.stack[-1][event.name] = event.value
+        elif kind == ENTER_SECTION:
+            parent = self.stack[-1]
+            block = {}
+            if event.index == 0:
+                self.runs[-1] = _SectionRun(parent, event.path[-1])
+                parent[event.path[-1]] = block
+            else:
+                self.runs[-1].add(block)
+            self.nested[-1] = True
+            self.stack.append(block)
+            self.runs.append(None)
+            self.nested.append(False)
+        elif kind == EXIT_SECTION:
+            self.stack.pop()
+            self.runs.pop()
+            self.runs[-1].nested = self.nested.pop()
+
+
+def build_config(events):
+    """Builds the same dict as ConfigFastParser from a stream of events."""
+    builder = BlockBuilder()
+    for event in events:
+        builder.feed(event)
+    return builder.root
+
+
+def iter_section_blocks(events, path):
+    """Yields one dict per block of the section at path, e.g.
+    ('landevices', 'landevices'), as soon as the block has been parsed.
+
+    Only the block currently being built is held in memory.
+    """
+    path = tuple(path)
+    builder = None
+    depth = len(path)
+    for event in events:
+        if builder is None:
+            if event.kind == ENTER_SECTION and event.path == path:
+                builder = BlockBuilder()
+        elif event.kind == EXIT_SECTION and len(event.path) == depth:
+            yield builder.root
+            builder = None
+        else:
+            builder.feed(event)
@@ -0,0 +1,646 @@
+import re
+import mmap
+import contextlib
+
+# Hand-written tokenizer and recursive-descent parser for the ar7.cfg/vpn.cfg
+# format. It accepts the language described by ConfigLexer.g4/ConfigParser.g4
+# and builds exactly the structure ConfigJSONPrinter produces, without the
+# ANTLR runtime or the generated lexer/parser.
+
+LCURLY = 'LCURLY'
+RCURLY = 'RCURLY'
+EQUALS = 'EQUALS'
+SEMICOLON = 'SEMICOLON'
+COMMA = 'COMMA'
+COLON = 'COLON'
+IDENTIFIER = 'IDENTIFIER'
+STRING = 'STRING'
+NUMBER = 'NUMBER'
+TIME_MINUTES = 'TIME_MINUTES'
+TIME_SECONDS = 'TIME_SECONDS'
+TIME_HOURS = 'TIME_HOURS'
+TIME_DAYS = 'TIME_DAYS'
+TIME_WEEKS = 'TIME_WEEKS'
+IPV6_ADDRESS = 'IPV6_ADDRESS'
+IPV4_ADDRESS = 'IPV4_ADDRESS'
+MAC_ADDRESS = 'MAC_ADDRESS'
+EOF = 'EOF'
+
+VALUE_TOKENS = frozenset([
+    STRING, NUMBER, IPV6_ADDRESS, IPV4_ADDRESS, MAC_ADDRESS,
+    TIME_WEEKS, TIME_DAYS, TIME_HOURS, TIME_MINUTES, TIME_SECONDS,
+    IDENTIFIER,
+])
+
+_PUNCTUATION = {
+    '{': LCURLY,
+    '}': RCURLY,
+    '=': EQUALS,
+    ';': SEMICOLON,
+    ',': COMMA,
+}
+
+_HEX = r'[0-9a-fA-F]+'
+_OCTET = r'(?:25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9][0-9]|[0-9])'
+
+# ANTLR reads the '{7}' in the second IPV6_ADDRESS alternative of
+# ConfigLexer.g4 as an embedded action, not as a repetition, so that
+# alternative really matches exactly two segments.
+_IPV6 = (
+    rf'(?:{_HEX}(?::{_HEX})*::(?:{_HEX})?(?::{_HEX})*'
+    rf'|{_HEX}:{_HEX}'
+    rf'|::{_HEX}(?::{_HEX})*'
+    r'|::)'
+)
+_IPV4 = rf'{_OCTET}\.{_OCTET}\.{_OCTET}\.{_OCTET}'
+_MAC = r'[0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){5}'
+
+# Whitespace and both comment styles, all skipped by the lexer.
+_SKIP_RE = re.compile(r'(?:[ \t\r\n]+|//[^\r\n]*|/\*.*?\*/)+', re.S)
+_STRING_RE = re.compile(r'"(?:\\[btnfr"\'\\]|\\[0-3][0-7][0-7]|[^"\\\x00-\x1f])*"')
+
+# Every non-string value token is built from these characters. A maximal run
+# of them is almost always exactly one token, which _WORD_TOKEN_RE classifies
+# in a single fullmatch. The alternatives are listed in ConfigLexer.g4 rule
+# order, so ties are resolved the same way ANTLR resolves them.
+_WORD_RE = re.compile(r'[0-9A-Za-z_.:\-]+')
+_WORD_TOKEN_RE = re.compile(
+    r'(?P<IDENTIFIER>[a-zA-Z_][a-zA-Z0-9_]*)'
+    r'|(?P<NUMBER>-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?)'
+    r'|(?P<TIME_MINUTES>[0-9]+m)'
+    r'|(?P<TIME_SECONDS>[0-9]+s)'
+    r'|(?P<TIME_HOURS>[0-9]+h)'
+    r'|(?P<TIME_DAYS>[0-9]+d)'
+    r'|(?P<TIME_WEEKS>[0-9]+w)'
+    rf'|(?P<IPV6_ADDRESS>{_IPV6})'
+    rf'|(?P<IPV4_ADDRESS>{_IPV4})'
+    rf'|(?P<MAC_ADDRESS>{_MAC})'
+)
+
+# Single-rule patterns for words that hold more than one token. Each one
+# returns the longest match of its rule, in ConfigLexer.g4 rule order.
+_RULE_PATTERNS = [
+    (IDENTIFIER, re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')),
+    (NUMBER, re.compile(r'-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?')),
+    (TIME_MINUTES, re.compile(r'[0-9]+m')),
+    (TIME_SECONDS, re.compile(r'[0-9]+s')),
+    (TIME_HOURS, re.compile(r'[0-9]+h')),
+    (TIME_DAYS, re.compile(r'[0-9]+d')),
+    (TIME_WEEKS, re.compile(r'[0-9]+w')),
+    (IPV6_ADDRESS, None),
+    (IPV4_ADDRESS, re.compile(_IPV4)),
+    (MAC_ADDRESS, re.compile(_MAC)),
+]
+_IPV6_RE = re.compile(_IPV6)
+_IPV6_RUN_RE = re.compile(r'[0-9a-fA-F:]+')
+
+_UNESCAPE_RE = re.compile(r'\\(.)')
+
+# Patterns of the skip scanner below
+_SCAN_RE = re.compile(r'(?P<string>")|(?P<comment>/)|(?P<open>\{)|(?P<close>\})|(?P<semicolon>;)')
+# Skipping whole blocks only needs the braces. Each match consumes the text
+# up to the next brace outside of strings and comments, group 1 or 2 tells
+# which one. A bare '"' is an unterminated string.
+try:
+    _SCAN_BLOCK_RE = re.compile(
+        r'(?:[^"/{}]++|"(?:[^"\\]++|\\.)*+"|//[^\r\n]*+|/\*.*?\*/|/(?![/*]))*+(?:(\{)|(\})|")', re.S)
+except re.error:
+    # Possessive quantifiers need Python 3.11, this variant is slower but
+    # also cannot backtrack exponentially
+    _SCAN_BLOCK_RE = re.compile(
+        r'(?:[^"/{}]|"(?:[^"\\]|\\.)*"|//[^\r\n]*|/\*.*?\*/|/(?![/*]))*(?:(\{)|(\})|")', re.S)
+_SCAN_STRING_RE = re.compile(r'"(?:[^"\\]|\\.)*"', re.S)
+_SCAN_COMMENT_RE = re.compile(r'//[^\r\n]*|/\*.*?\*/', re.S)
+
+
+class _Syntax:
+    """The patterns of tokenizer and scanner, for str input or for bytes
+    input such as an mmap. Apart from STRING tokens the format is pure
+    ASCII, so the bytes patterns are the same expressions."""
+
+    def __init__(self, binary):
+        if binary:
+            def compile(pattern):
+                return re.compile(pattern.pattern.encode('ascii'), pattern.flags & ~re.UNICODE)
+
+            def char(c):
+                return c.encode('ascii')
+        else:
+            def compile(pattern):
+                return pattern
+
+            def char(c):
+                return c
+        self.binary = binary
+        self.skip = compile(_SKIP_RE)
+        self.string = compile(_STRING_RE)
+        self.word = compile(_WORD_RE)
+        self.word_token = compile(_WORD_TOKEN_RE)
+        self.rule_patterns = [(token_type, compile(pattern) if pattern is not None else None)
+                              for token_type, pattern in _RULE_PATTERNS]
+        self.ipv6 = compile(_IPV6_RE)
+        self.ipv6_run = compile(_IPV6_RUN_RE)
+        self.scan = compile(_SCAN_RE)
+        self.scan_block = compile(_SCAN_BLOCK_RE)
+        self.scan_string = compile(_SCAN_STRING_RE)
+        self.scan_comment = compile(_SCAN_COMMENT_RE)
+        # Maps the character to the token type and the token text
+        self.punctuation = {char(c): (token_type, c) for c, token_type in _PUNCTUATION.items()}
+        self.quote = char('"')
+        self.colon = char(':')
+        self.lcurly = char('{')
+        self.newline = char('\n')
+
+    def decode(self, text):
+        return text.decode('utf-8', 'replace') if self.binary else text
+
+
+_STR_SYNTAX = _Syntax(False)
+_BYTES_SYNTAX = _Syntax(True)
+
+
+def _syntax(text):
+    return _STR_SYNTAX if isinstance(text, str) else _BYTES_SYNTAX
+
+
+class ConfigSyntaxError(Exception):
+    def __init__(self, message, line, column):
+        super().__init__(f"line {line}:{column} {message}")
+        self.line = line
+        self.column = column
+
+
+def _longest_ipv6(syntax, text, pos, end):
+    # ANTLR picks the longest IPV6_ADDRESS, Python regexes the leftmost
+    # alternative, so try the candidate prefixes from longest to shortest.
+    run = syntax.ipv6_run.match(text, pos, end)
+    if run is None or syntax.colon not in run.group():
+        return 0
+    for stop in range(run.end(), pos, -1):
+        if syntax.ipv6.fullmatch(text, pos, stop):
+            return stop - pos
+    return 0
+
+
+class ConfigTokenizer:
+    """Tokenizes a config held in memory, or read in chunks from a file.
+
+    text may also be bytes or an mmap, then the tokenizer works on the raw
+    bytes and only decodes the tokens it yields. With a stream, only the
+    text after the last complete token is buffered, so memory stays bounded
+    by the chunk size and the longest token.
+    """
+
+    def __init__(self, text='', stream=None, chunk_size=1 << 16):
+        self.text = text
+        self._syntax = _syntax(text)
+        self._stream = stream
+        self._chunk_size = chunk_size
+        # Absolute position of self.text[0], plus the newlines dropped with
+        # the consumed text, so positions and error lines stay absolute.
+        self._offset = 0
+        self._dropped_lines = 0
+        self._dropped_line_start = 0
+
+    def position(self, pos):
+        rel = pos - self._offset
+        newline = self._syntax.newline
+        # mmap has no count(), errors are rare enough to copy the text
+        line = self._dropped_lines + self.text[:rel].count(newline) + 1
+        newline = self.text.rfind(newline, 0, rel)
+        line_start = self._offset + newline + 1 if newline >= 0 else self._dropped_line_start
+        return line, pos - line_start
+
+    def error(self, message, pos):
+        line, column = self.position(pos)
+        return ConfigSyntaxError(message, line, column)
+
+    def _read_more(self, pos):
+        """Drops the text before pos and appends the next chunk of the stream.
+
+        Returns False once the stream is exhausted.
+        """
+        if self._stream is None:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._stream = None
+            return False
+        dropped = self.text[:pos]
+        newlines = dropped.count('\n')
+        if newlines:
+            self._dropped_lines += newlines
+            self._dropped_line_start = self._offset + dropped.rfind('\n') + 1
+        self._offset += pos
+        self.text = self.text[pos:] + chunk
+        return True
+
+    def tokens(self, start=0):
+        """Yields (type, text, position) tuples, ending with an EOF token.
+
+        start resumes tokenizing an in-memory text at that position.
+        """
+        syntax = self._syntax
+        skip = syntax.skip.match
+        word = syntax.word.match
+        classify = syntax.word_token.fullmatch
+        string = syntax.string.match
+        punctuation = syntax.punctuation
+        quote = syntax.quote
+        binary = syntax.binary
+
+        text = self.text
+        length = len(text)
+        pos = start
+        if self._stream is not None and self._read_more(0):
+            text, length = self.text, len(self.text)
+
+        # A token that ends right at the end of the buffer, or that does not
+        # match at all, may continue in the next chunk. Such tokens are retried
+        # after _read_more(); everything else is final.
+        while True:
+            m = skip(text, pos)
+            if m is not None:
+                if m.end() == length and self._read_more(pos):
+                    text, length, pos = self.text, len(self.text), 0
+                    continue
+                pos = m.end()
+            if pos >= length:
+                if self._read_more(pos):
+                    text, length, pos = self.text, len(self.text), 0
+                    continue
+                break
+            c = text[pos:pos + 1]
+            if c in punctuation:
+                token_type, token = punctuation[c]
+                yield token_type, token, self._offset + pos
+                pos += 1
+            elif c == quote:
+                m = string(text, pos)
+                if m is None:
+                    if self._read_more(pos):
+                        text, length, pos = self.text, len(self.text), 0
+                        continue
+                    raise self.error(f"token recognition error at: '{syntax.decode(text[pos:pos + 20])}'",
+                                     self._offset + pos)
+                yield STRING, m.group().decode('utf-8') if binary else m.group(), self._offset + pos
+                pos = m.end()
+            else:
+                m = word(text, pos)
+                if m is None or m.end() == length:
+                    if self._read_more(pos):
+                        text, length, pos = self.text, len(self.text), 0
+                        continue
+                    if m is None:
+                        raise self.error(f"token recognition error at: '{syntax.decode(text[pos:pos + 4])[:1]}'",
+                                         self._offset + pos)
+                end = m.end()
+                token = classify(text, pos, end)
+                if token is not None:
+                    yield token.lastgroup, token.group().decode('ascii') if binary else token.group(), self._offset + pos
+                else:
+                    yield from self._split_word(pos, end)
+                pos = end
+
+        yield EOF, '<EOF>', self._offset + length
+
+    def _split_word(self, pos, end):
+        text = self.text
+        syntax = self._syntax
+        while pos < end:
+            best_type, best_length = None, 0
+            for token_type, pattern in syntax.rule_patterns:
+                if pattern is None:
+                    length = _longest_ipv6(syntax, text, pos, end)
+                else:
+                    m = pattern.match(text, pos, end)
+                    length = m.end() - pos if m is not None else 0
+                if length > best_length:
+                    best_type, best_length = token_type, length
+            if best_type is None:
+                if text[pos:pos + 1] == syntax.colon:
+                    best_type, best_length = COLON, 1
+                else:
+                    raise self.error(f"token recognition error at: '{syntax.decode(text[pos:pos + 1])}'",
+                                     self._offset + pos)
+            yield best_type, syntax.decode(text[pos:pos + best_length]), self._offset + pos
+            pos += best_length
+
+
+def convert_value(token_type, text):
+    """Converts a value token the same way ConfigJSONPrinter.visitValue does.
+
+    BOOLEAN never reaches the parser, since IDENTIFIER wins the tie for 'yes'
+    and 'no' in ConfigLexer.g4, so those stay strings.
+    """
+    if token_type == NUMBER:
+        return float(text) if '.' in text else int(text)
+    if token_type == STRING:
+        text = text[1:-1]
+        if '\\' in text:
+            text = _UNESCAPE_RE.sub(r'\1', text)
+        return text
+    return text
+
+
+# Cheap scanner for skipping unwanted sections and variables. It only looks
+# at braces, strings and comments and does not tokenize or validate the
+# skipped text.
+
+
+def _scan(text, pos, until_semicolon):
+    """Returns the position after the '}' closing the block that starts at
+    pos, or after the next ';' outside of any block, or -1 if there is none.
+    """
+    syntax = _syntax(text)
+    search = syntax.scan.search
+    depth = 0
+    while True:
+        m = search(text, pos)
+        if m is None:
+            return -1
+        c = m.lastgroup
+        pos = m.start()
+        if c == 'string':
+            m = syntax.scan_string.match(text, pos)
+            if m is None:
+                return -1
+            pos = m.end()
+        elif c == 'comment':
+            m = syntax.scan_comment.match(text, pos)
+            pos = m.end() if m is not None else pos + 1
+        elif c == 'open':
+            depth += 1
+            pos += 1
+        elif c == 'close':
+            depth -= 1
+            pos += 1
+            if depth == 0 and not until_semicolon:
+                return pos
+            if depth < 0:
+                return -1
+        else:
+            pos += 1
+            if depth == 0 and until_semicolon:
+                return pos
+
+
+def skip_block(text, pos):
+    match = _syntax(text).scan_block.match
+    depth = 0
+    while True:
+        m = match(text, pos)
+        if m is None:
+            return -1
+        pos = m.end()
+        if m.lastindex == 1:
+            depth += 1
+        elif m.lastindex == 2:
+            depth -= 1
+            if depth == 0:
+                return pos
+        else:
+            return -1
+
+
+def skip_statement(text, pos):
+    return _scan(text, pos, True)
+
+
+def skip_section_blocks(text, pos):
+    """Skips the '{ ... }' block at pos and all blocks directly following it."""
+    syntax = _syntax(text)
+    while True:
+        pos = skip_block(text, pos)
+        if pos < 0:
+            return pos
+        m = syntax.skip.match(text, pos)
+        if m is not None:
+            pos = m.end()
+        if text[pos:pos + 1] != syntax.lcurly:
+            return pos
+
+
+def block_follows(text, pos):
+    """Returns whether another block follows the '{ ... }' block at pos,
+    i.e. whether the section is a list. False if the block is not closed."""
+    syntax = _syntax(text)
+    pos = skip_block(text, pos)
+    if pos < 0:
+        return False
+    m = syntax.skip.match(text, pos)
+    if m is not None:
+        pos = m.end()
+    return text[pos:pos + 1] == syntax.lcurly
+
+
+def section_tree(sections):
+    """Turns dotted section paths like 'ar7cfg.targets' into a nested dict.
+
+    A value of None selects the complete subtree below that name.
+    """
+    tree = {}
+    for section in sections:
+        node = tree
+        parts = section.split('.')
+        for part in parts[:-1]:
+            if part in node and node[part] is None:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def filter_top_level_sections(text, names):
+    """Returns text with only the top-level sections listed in names.
+
+    Text that the scanner cannot follow is returned unchanged, so that the
+    parser reports the error. Bytes-like input returns bytes.
+    """
+    syntax = _syntax(text)
+    identifier = syntax.rule_patterns[0][1].match
+    skip = syntax.skip.match
+    parts = []
+    pos = 0
+    while True:
+        m = skip(text, pos)
+        if m is not None:
+            pos = m.end()
+        if pos >= len(text):
+            return (b'' if syntax.binary else '').join(parts)
+        start = pos
+        m = identifier(text, pos)
+        if m is None:
+            return text
+        name = syntax.decode(m.group())
+        pos = m.end()
+        m = skip(text, pos)
+        if m is not None:
+            pos = m.end()
+        if text[pos:pos + 1] != syntax.lcurly:
+            return text
+        pos = skip_section_blocks(text, pos)
+        if pos < 0:
+            return text
+        if name in names:
+            parts.append(text[start:pos])
+            parts.append(syntax.newline)
+
+
+class ConfigFastParser:
+    def __init__(self, text, sections=None, value_converter=convert_value):
+        """With sections, an iterable of dotted paths such as 'ar7cfg.targets',
+        only those sections or variables are parsed, everything else is
+        skipped by a scanner that does not tokenize it.
+
+        value_converter(token_type, text) turns value tokens into Python
+        values, see config_types.convert_typed_value for an alternative.
+        """
+        self.tokenizer = ConfigTokenizer(text)
+        self._convert = value_converter
+        self._wanted = section_tree(sections) if sections is not None else None
+        self._tokens = self.tokenizer.tokens()
+        self._advance()
+
+    def _seek(self, pos):
+        self._tokens = self.tokenizer.tokens(pos)
+        self._advance()
+
+    def _skip_section(self):
+        pos = skip_section_blocks(self.tokenizer.text, self.pos)
+        if pos < 0:
+            raise self._error("missing '}' at end of section")
+        self._seek(pos)
+
+    def _skip_variable(self):
+        pos = skip_statement(self.tokenizer.text, self.pos)
+        if pos < 0:
+            raise self._error("missing ';' at end of variable")
+        self._seek(pos)
+
+    def _advance(self):
+        self.type, self.text, self.pos = next(self._tokens)
+
+    def _error(self, message):
+        return self.tokenizer.error(message, self.pos)
+
+    def _expect(self, token_type):
+        if self.type != token_type:
+            raise self._error(f"mismatched input '{self.text}' expecting {token_type}")
+        text = self.text
+        self._advance()
+        return text
+
+    def parse(self):
+        result = {}
+        wanted = self._wanted
+        while self.type == IDENTIFIER:
+            name = self.text
+            self._advance()
+            if wanted is None:
+                self._section_body(result, name, None)
+            elif name in wanted:
+                self._section_body(result, name, wanted[name])
+            else:
+                self._expect_token(LCURLY)
+                self._skip_section()
+        if self.type != EOF:
+            raise self._error(f"extraneous input '{self.text}' expecting {{IDENTIFIER, <EOF>}}")
+        return result
+
+    def _expect_token(self, token_type):
+        if self.type != token_type:
+            raise self._error(f"mismatched input '{self.text}' expecting {token_type}")
+
+    def _block(self, wanted):
+        self._expect(LCURLY)
+        block = {}
+        nested = False
+        while self.type == IDENTIFIER:
+            name = self.text
+            self._advance()
+            if self.type == EQUALS:
+                if wanted is not None and (name not in wanted or wanted[name] is not None):
+                    self._skip_variable()
+                    continue
+                self._advance()
+                value = self._value()
+                if self.type == COMMA:
+                    values = [value]
+                    while self.type == COMMA:
+                        self._advance()
+                        values.append(self._value())
+                    value = values
+                self._expect(SEMICOLON)
+                block[name] = value
+            elif self.type == LCURLY:
+                if wanted is None:
+                    self._section_body(block, name, None)
+                elif name in wanted:
+                    self._section_body(block, name, wanted[name])
+                else:
+                    self._skip_section()
+                nested = True
+            else:
+                raise self._error(f"mismatched input '{self.text}' expecting {{'{{', '='}}")
+        self._expect(RCURLY)
+        return block, nested
+
+    def _section_body(self, context, name, wanted):
+        block, nested = self._block(wanted)
+        if self.type != LCURLY:
+            context[name] = block
+            return
+
+        # Same bookkeeping as ConfigJSONPrinter.visitSection for lists, including
+        # the case where the name already holds a single section.
+        if name not in context:
+            context[name] = []
+        target = context[name]
+        key = name
+        while True:
+            if isinstance(target, list):
+                target.append(block)
+            else:
+                target[key] = block
+            if nested:
+                key = None
+            if self.type != LCURLY:
+                return
+            block, nested = self._block(wanted)
+
+    def _value(self):
+        if self.type not in VALUE_TOKENS:
+            raise self._error(f"mismatched input '{self.text}' expecting value")
+        value = self._convert(self.type, self.text)
+        self._advance()
+        return value
+
+
+def parse_config_string(text, sections=None, value_converter=convert_value):
+    return ConfigFastParser(text, sections=sections, value_converter=value_converter).parse()
+
+
+@contextlib.contextmanager
+def map_config_file(path):
+    """Maps a config file into memory read-only and yields it as a bytes-like
+    object, which ConfigTokenizer and ConfigFastParser accept like a str."""
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            data = None
+        if data is None:
+            yield b''
+            return
+        with data:
+            yield data
+
+
+def parse_config_file(path, sections=None, value_converter=convert_value):
+    # The file is tokenized directly in the page cache instead of being read
+    # and decoded into a str first.
+    with map_config_file(path) as data:
+        return parse_config_string(data, sections=sections, value_converter=value_converter)
@@ -1,36 +1,36 @@
-import json
 import re
-from antlr4 import *
 from ConfigParser import ConfigParser
 from ConfigParserVisitor import ConfigParserVisitor
 
 class ConfigJSONPrinter(ConfigParserVisitor):
-    def __init__(self):
+    def __init__(self, value_converter=None):
+        # Optional value_converter(token_type, text) replacing visitValue's conversion,
+        # token_type is the symbolic name such as 'IPV4_ADDRESS'
+        self.value_converter = value_converter
         self.result = {}
         self.context_stack = [self.result]
         self.current_section_name = None
 
     def visitConfig(self, ctx:ConfigParser.ConfigContext):
         self.visitChildren(ctx)
-        return json.dumps(self.result, indent=2)
+        return self.result
 
     def visitSection(self, ctx:ConfigParser.SectionContext):
         self.current_section_name = ctx.IDENTIFIER().getText()
-        self.visitChildren(ctx)
+        blocks = ctx.sectionBlock()
+        if len(blocks) == 1:
+            self.visit(blocks[0])
+        else:
+            current_context = self.context_stack[-1]
+            if self.current_section_name not in current_context:
+                current_context[self.current_section_name] = []
+            self.context_stack.append(current_context[self.current_section_name])
+            for block in blocks:
+                self.visit(block)
+            self.context_stack.pop()
         self.current_section_name = None
 
-    def visitSectionContent(self, ctx:ConfigParser.SectionContentContext):
-        return self.visitChildren(ctx)
-
-    def visitSectionList(self, ctx:ConfigParser.SectionListContext):
-        current_context = self.context_stack[-1]
-        if self.current_section_name not in current_context:
-            current_context[self.current_section_name] = []
-        self.context_stack.append(current_context[self.current_section_name])
-        self.visitChildren(ctx)
-        self.context_stack.pop()
-
-    def visitSectionSingle(self, ctx:ConfigParser.SectionSingleContext):
+    def visitSectionBlock(self, ctx:ConfigParser.SectionBlockContext):
         new_section = {}
         if isinstance(self.context_stack[-1], list):
             self.context_stack[-1].append(new_section)
@@ -44,17 +44,14 @@ class ConfigJSONPrinter(ConfigParserVisitor):
         return self.visitChildren(ctx)
 
     def visitVariable(self, ctx:ConfigParser.VariableContext):
-        name = ctx.IDENTIFIER().getText()
-        value = self.visit(ctx.value())
-        self.context_stack[-1][name] = value
-
-    def visitVariableList(self, ctx:ConfigParser.VariableListContext):
         name = ctx.IDENTIFIER().getText()
         values = [self.visit(value) for value in ctx.value()]
-        self.context_stack[-1][name] = values
+        self.context_stack[-1][name] = values[0] if len(values) == 1 else values
 
     def visitValue(self, ctx:ConfigParser.ValueContext):
         text = ctx.getText()
+        if self.value_converter is not None:
+            return self.value_converter(ConfigParser.symbolicNames[ctx.start.type], text)
         if ctx.NUMBER():
             return float(text) if '.' in text else int(text)
         elif ctx.BOOLEAN():
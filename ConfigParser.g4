@@ -4,15 +4,15 @@ options { tokenVocab = ConfigLexer; }
 
 config: section*;
 
-section: IDENTIFIER sectionContent;
-sectionContent: sectionSingle | sectionList;
-sectionList: sectionSingle (sectionSingle)+;
-sectionSingle: LCURLY content RCURLY;
+// A section with more than one block and a variable with more than one
+// value are lists. Both are decided after the fact by counting the blocks
+// or values, so the parser never needs more than one token of lookahead.
+section: IDENTIFIER sectionBlock+;
+sectionBlock: LCURLY content RCURLY;
 
-content: (variable | variableList | section)*;
+content: (variable | section)*;
 
-variable: IDENTIFIER EQUALS value SEMICOLON;
-variableList: IDENTIFIER EQUALS value (COMMA value)+ SEMICOLON;
+variable: IDENTIFIER EQUALS value (COMMA value)* SEMICOLON;
 
 value: STRING
      | NUMBER
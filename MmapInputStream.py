@@ -0,0 +1,56 @@
+import mmap
+from antlr4 import InputStream
+
+# InputStream for the generated ConfigLexer that maps the file into memory
+# instead of reading it. The ANTLR runtime keeps the decoded text plus a list
+# with one int per character, several times the file size. This stream hands
+# the lexer the raw bytes of the mapping, ar7.cfg is essentially ASCII and
+# bytes above 0x7f only occur inside STRING tokens, whose PRINTABLE_CHAR rule
+# accepts them. Token texts are decoded as UTF-8 when they are requested.
+# Token positions and columns count bytes instead of characters.
+#
+# With data, the stream reads an existing mapping or other bytes-like object
+# instead, e.g. the one config_loader already hashed for the cache key, and
+# leaves closing it to the caller.
+
+class MmapInputStream(InputStream):
+    __slots__ = ('fileName', '_file')
+
+    def __init__(self, fileName:str=None, data=None):
+        self.name = fileName
+        self.fileName = fileName
+        self.strdata = None
+        self._index = 0
+        self._file = None
+        if data is None:
+            self._file = open(fileName, 'rb')
+            try:
+                data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files cannot be mapped
+                data = b''
+        self.data = data
+        self._size = len(self.data)
+
+    def getText(self, start:int, stop:int):
+        if stop >= self._size:
+            stop = self._size - 1
+        if start >= self._size:
+            return ""
+        return self.data[start:stop + 1].decode('utf-8', 'replace')
+
+    def close(self):
+        if self._file is None:
+            return
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __str__(self):
+        return self.data[:].decode('utf-8', 'replace')
@@ -0,0 +1,167 @@
+import os
+import atexit
+import pickle
+import hashlib
+import tempfile
+import functools
+
+from config_cache import default_cache_dir
+
+# Persistent DFA cache for the generated ConfigLexer and ConfigParser. The
+# ATN simulators build their DFAs while predicting and keep them in the class
+# attribute decisionsToDFA, so in a long running process only the first parse
+# pays for the adaptive prediction. The scripts are short lived, every run
+# starts with empty DFAs. With the cache, the DFAs are loaded before the first
+# parse and written back at exit if they grew.
+#
+# The DFA states reference the ATN states of the generated code and a few
+# singletons of the runtime that are compared by identity. They are pickled as
+# references (persistent ids) and resolved against the ATN and runtime of the
+# loading process. The file name contains a hash of the generated code and the
+# runtime version, a regenerated parser never loads DFAs of an older one.
+
+GENERATED_FILES = (
+    "ConfigLexer.py",
+    "ConfigParser.py",
+)
+
+
+@functools.lru_cache(maxsize=None)
+def generated_code_version():
+    from importlib.metadata import version, PackageNotFoundError
+    digest = hashlib.sha256()
+    try:
+        digest.update(version("antlr4-python3-runtime").encode("utf-8"))
+    except PackageNotFoundError:
+        digest.update(b"-")
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in GENERATED_FILES:
+        digest.update(b"\0" + name.encode("utf-8"))
+        with open(os.path.join(base, name), "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def _recognizers():
+    from ConfigLexer import ConfigLexer
+    from ConfigParser import ConfigParser
+    return {"lexer": ConfigLexer, "parser": ConfigParser}
+
+
+def _singletons():
+    from antlr4.PredictionContext import PredictionContext
+    from antlr4.atn.ATNSimulator import ATNSimulator
+    from antlr4.atn.LexerAction import LexerSkipAction, LexerMoreAction, LexerPopModeAction
+    from antlr4.atn.SemanticContext import SemanticContext
+    return {
+        "SemanticContext.NONE": SemanticContext.NONE,
+        "PredictionContext.EMPTY": PredictionContext.EMPTY,
+        "ATNSimulator.ERROR": ATNSimulator.ERROR,
+        "LexerSkipAction": LexerSkipAction.INSTANCE,
+        "LexerMoreAction": LexerMoreAction.INSTANCE,
+        "LexerPopModeAction": LexerPopModeAction.INSTANCE,
+    }
+
+
+class _DFAPickler(pickle.Pickler):
+    def __init__(self, file, atn_state_type, singletons):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._atn_state_type = atn_state_type
+        self._singletons = {id(value): name for name, value in singletons.items()}
+
+    def persistent_id(self, obj):
+        if isinstance(obj, self._atn_state_type):
+            return obj.stateNumber
+        return self._singletons.get(id(obj))
+
+
+class _DFAUnpickler(pickle.Unpickler):
+    def __init__(self, file, atn, singletons):
+        super().__init__(file)
+        self._atn = atn
+        self._singletons = singletons
+
+    def persistent_load(self, pid):
+        if isinstance(pid, int):
+            return self._atn.states[pid]
+        return self._singletons[pid]
+
+
+def _state_count(decisions):
+    return sum(len(dfa._states) for dfa in decisions)
+
+
+class DFACache:
+    def __init__(self, directory=None):
+        self.directory = directory or default_cache_dir()
+        self.path = os.path.join(self.directory, f"antlr-dfa-{generated_code_version()}.dfa")
+        self._loaded_states = {}
+
+    def dump(self, f):
+        from antlr4.atn.ATNState import ATNState
+        singletons = _singletons()
+        for recognizer in _recognizers().values():
+            _DFAPickler(f, ATNState, singletons).dump(recognizer.decisionsToDFA)
+
+    def load(self, f):
+        singletons = _singletons()
+        return {name: _DFAUnpickler(f, recognizer.atn, singletons).load()
+                for name, recognizer in _recognizers().items()}
+
+    def restore(self):
+        """Replaces the DFAs of ConfigLexer and ConfigParser with the saved
+        ones. Returns False if there are none or they cannot be read."""
+        try:
+            with open(self.path, "rb") as f:
+                loaded = self.load(f)
+        except FileNotFoundError:
+            return False
+        except Exception:
+            # Truncated or otherwise unreadable, the DFAs are built again
+            return False
+        for name, recognizer in _recognizers().items():
+            decisions = loaded.get(name)
+            if decisions is None or len(decisions) != len(recognizer.decisionsToDFA):
+                return False
+        for name, recognizer in _recognizers().items():
+            # The simulators of new instances share this list, it is replaced in place
+            recognizer.decisionsToDFA[:] = loaded[name]
+            self._loaded_states[name] = _state_count(loaded[name])
+        return True
+
+    def grew(self):
+        return any(_state_count(recognizer.decisionsToDFA) > self._loaded_states.get(name, 0)
+                   for name, recognizer in _recognizers().items())
+
+    def save(self):
+        """Writes the current DFAs if they have more states than the loaded ones."""
+        if not self.grew():
+            return
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                self.dump(f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Like the config cache, this is an optimization only
+            return
+        for name, recognizer in _recognizers().items():
+            self._loaded_states[name] = _state_count(recognizer.decisionsToDFA)
+
+
+_enabled = None
+
+
+def enable_dfa_cache(directory=None):
+    """Loads the saved DFAs and saves them again when the process exits.
+
+    Has to be called before the first parse, later calls return the cache
+    of the first one.
+    """
+    global _enabled
+    if _enabled is None:
+        _enabled = DFACache(directory)
+        _enabled.restore()
+        atexit.register(_enabled.save)
+    return _enabled
@@ -0,0 +1,116 @@
+import time
+
+from antlr4.error.ErrorListener import ErrorListener
+
+# Per-decision profiling for the generated ConfigParser. The ANTLR Python
+# runtime has no ProfilingATNSimulator, so adaptivePredict() and the token
+# stream are wrapped to measure, for every decision of the grammar:
+# - how often it is predicted and how much time that takes,
+# - how far the prediction looks ahead,
+# - whether the DFA cache answered it or new DFA states had to be computed,
+# - how often SLL conflicts forced a full-context (LL) prediction.
+
+
+class DecisionStats:
+    def __init__(self, decision, rule):
+        self.decision = decision
+        self.rule = rule
+        self.invocations = 0
+        self.time = 0.0
+        self.total_lookahead = 0
+        self.max_lookahead = 0
+        self.dfa_hits = 0
+        self.new_dfa_states = 0
+        self.full_context = 0
+
+    def as_dict(self):
+        return {
+            "decision": self.decision,
+            "rule": self.rule,
+            "invocations": self.invocations,
+            "time": self.time,
+            "avg_lookahead": self.total_lookahead / self.invocations if self.invocations else 0,
+            "max_lookahead": self.max_lookahead,
+            "dfa_hits": self.dfa_hits,
+            "new_dfa_states": self.new_dfa_states,
+            "full_context": self.full_context,
+        }
+
+
+class _FullContextListener(ErrorListener):
+    def __init__(self, profiler):
+        super().__init__()
+        self.profiler = profiler
+
+    def reportAttemptingFullContext(self, recognizer, dfa, startIndex, stopIndex, conflictingAlts, configs):
+        self.profiler._stats(dfa.decision).full_context += 1
+
+
+class DecisionProfiler:
+    def __init__(self):
+        self.parser = None
+        self.decisions = {}
+        self.ll_fallback = False
+
+    def _stats(self, decision):
+        stats = self.decisions.get(decision)
+        if stats is None:
+            state = self.parser.atn.decisionToState[decision]
+            stats = DecisionStats(decision, self.parser.ruleNames[state.ruleIndex])
+            self.decisions[decision] = stats
+        return stats
+
+    def attach(self, parser):
+        """Instruments parser and its token stream. Call before parsing."""
+        self.parser = parser
+        interp = parser._interp
+        token_stream = parser.getTokenStream()
+        predict = interp.adaptivePredict
+        consume = token_stream.consume
+        # Furthest token index reached by the prediction in progress, None outside of predictions
+        furthest = [None]
+
+        def tracking_consume():
+            consume()
+            if furthest[0] is not None and token_stream.index > furthest[0]:
+                furthest[0] = token_stream.index
+
+        def profiled_predict(input, decision, outerContext):
+            dfa = interp.decisionToDFA[decision]
+            states = len(dfa.states)
+            start = input.index
+            furthest[0] = start
+            began = time.perf_counter()
+            try:
+                return predict(input, decision, outerContext)
+            finally:
+                elapsed = time.perf_counter() - began
+                lookahead = furthest[0] - start + 1
+                furthest[0] = None
+                stats = self._stats(decision)
+                stats.invocations += 1
+                stats.time += elapsed
+                stats.total_lookahead += lookahead
+                stats.max_lookahead = max(stats.max_lookahead, lookahead)
+                added = len(dfa.states) - states
+                if added:
+                    stats.new_dfa_states += added
+                else:
+                    stats.dfa_hits += 1
+
+        interp.adaptivePredict = profiled_predict
+        token_stream.consume = tracking_consume
+        parser.addErrorListener(_FullContextListener(self))
+
+    def report(self):
+        lines = []
+        if self.ll_fallback:
+            lines.append("SLL prediction failed, the input was parsed again with full LL prediction")
+        lines.append(f"{'decision':>8} {'rule':<16} {'calls':>8} {'time ms':>9} {'avg LA':>7} {'max LA':>7} "
+                     f"{'DFA hits':>9} {'new DFA':>8} {'full LL':>8}")
+        for stats in sorted(self.decisions.values(), key=lambda s: s.time, reverse=True):
+            d = stats.as_dict()
+            lines.append(f"{d['decision']:>8} {d['rule']:<16} {d['invocations']:>8} {d['time'] * 1000:>9.2f} "
+                         f"{d['avg_lookahead']:>7.1f} {d['max_lookahead']:>7} {d['dfa_hits']:>9} "
+                         f"{d['new_dfa_states']:>8} {d['full_context']:>8}")
+        return "\n".join(lines)
@@ -0,0 +1,113 @@
+#!/bin/python3
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file, config_to_json
+
+def find_input_files(inputs, pattern="*.cfg"):
+    """Expands directories (recursively, files matching pattern) and glob patterns into a sorted list of files."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            files.update(glob.glob(os.path.join(item, "**", pattern), recursive=True))
+        elif os.path.isfile(item):
+            files.add(item)
+        else:
+            files.update(path for path in glob.glob(item, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+def output_paths(input_files, output_dir):
+    # Exports of many boxes usually share the file name (site1/ar7.cfg, site2/ar7.cfg),
+    # so the directory structure below the common parent is kept.
+    base = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in input_files])
+    return [os.path.join(output_dir, os.path.relpath(os.path.abspath(path), base) + ".json") for path in input_files]
+
+def convert_file(job):
+    """Parses one file in a worker process. Returns (path, size, line, error),
+    where line is the NDJSON record if no output path was given."""
+    path, output_path, backend, cache, sections = job
+    size = 0
+    try:
+        size = os.path.getsize(path)
+        config = load_config_file(path, backend=backend, cache=cache, sections=sections)
+        if output_path is None:
+            return path, size, json.dumps({"file": path, "config": config}), None
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(config_to_json(config, indent=2) + "\n")
+        return path, size, None, None
+    except Exception as e:
+        return path, size, None, str(e) or type(e).__name__
+
+def run_batch(jobs, workers):
+    """Yields the results of convert_file() in the order of jobs."""
+    if workers == 1:
+        yield from map(convert_file, jobs)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Larger chunks keep the inter-process overhead low for many small files
+        chunksize = max(1, len(jobs) // (workers * 8))
+        yield from executor.map(convert_file, jobs, chunksize=chunksize)
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Converts many FritzBox ar7.cfg/vpn.cfg files to JSON in parallel")
+    add_config_loader_arguments(parser)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes (default: number of CPUs)")
+    parser.add_argument("--pattern", default="*.cfg", help="File pattern used for directories (default: *.cfg)")
+    parser.add_argument("--section", action="append", metavar="PATH",
+                        help="Only convert this section, e.g. 'ar7cfg.targets'. Can be given multiple times")
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--output-dir", help="Write one JSON file per input file into this directory")
+    output.add_argument("--ndjson", metavar="FILE",
+                        help="Write one JSON line {\"file\": ..., \"config\": ...} per input file, '-' for stdout")
+    parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns")
+    args = parser.parse_args(argv[1:])
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    input_files = find_input_files(args.inputs, args.pattern)
+    if not input_files:
+        print("Error: no input files found", file=sys.stderr)
+        return 1
+
+    outputs = output_paths(input_files, args.output_dir) if args.output_dir else [None] * len(input_files)
+    cache = config_cache_from_args(args)
+    jobs = [(path, output_path, args.parser_backend, cache, args.section)
+            for path, output_path in zip(input_files, outputs)]
+
+    ndjson = None
+    if args.ndjson == "-":
+        ndjson = sys.stdout
+    elif args.ndjson:
+        ndjson = open(args.ndjson, "w", encoding="utf-8")
+
+    start = time.perf_counter()
+    total_size = 0
+    failed = 0
+    try:
+        for path, size, line, error in run_batch(jobs, min(args.workers, len(jobs))):
+            total_size += size
+            if error is not None:
+                failed += 1
+                print(f"Error: {path}: {error}", file=sys.stderr)
+            elif ndjson is not None:
+                ndjson.write(line + "\n")
+    finally:
+        if ndjson is not None and ndjson is not sys.stdout:
+            ndjson.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(input_files) - failed} of {len(input_files)} files converted, {failed} failed, "
+          f"{total_size / 1024 / 1024:.1f} MB in {elapsed:.2f} s "
+          f"({len(input_files) / elapsed:.1f} files/s, {total_size / 1024 / 1024 / elapsed:.2f} MB/s)",
+          file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
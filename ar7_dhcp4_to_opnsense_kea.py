@@ -1,78 +1,46 @@
 #!/bin/python3
 
-import json
 import argparse
-import requests
 import sys
 import re
+import ipaddress
 import warnings
-from requests.auth import HTTPBasicAuth
-import jsonpath_ng.ext as jsonpath_ng
-from antlr4 import *
-from ConfigLexer import ConfigLexer
-from ConfigParser import ConfigParser
-from ConfigJSONPrinter import ConfigJSONPrinter
-
-def load_config(config_file):
-    if config_file is None:
-        config_file="config.json"
-    try:
-        with open(config_file, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Config file '{config_file}' not found.")
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+from config_query import ConfigQuery
+from profiling import add_profile_arguments, profiler_from_args, phase
+from opnsense_client import (
+    OPNsenseClient, OPNsenseError, add_concurrency_argument, add_model_item, failures, flatten_model, load_config,
+    run_concurrently,
+)
+
+def get_opnsense_version(api):
+    return api.probe().version
+
+def get_kea_dhcpv4_config(api):
+    return api.get('kea/dhcpv4/get')
+
+def set_kea_dhcpv4_config(api, dhcp_config):
+    return api.post('kea/dhcpv4/set', dhcp_config)
+
+def save_kea_dhcpv4_config(api, dhcp_config):
+    result = set_kea_dhcpv4_config(api, {"dhcpv4": dhcp_config})
+    print(result)
+    if result.get("result") != "saved":
+        print("Error: OPNsense did not save the Kea configuration")
         sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in config file '{config_file}'.")
-        sys.exit(1)
-
-def make_request(config, method, endpoint, data=None):
-    url = f"{config['url']}/api/{endpoint}"
-    try:
-        if method == 'GET':
-            response = requests.get(
-                url,
-                auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
-                verify=config.get('verify_ssl', True)
-            )
-        elif method in ['POST', 'PUT']:
-            response = requests.post(
-                url,
-                auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
-                verify=config.get('verify_ssl', True),
-                json=data
-            )
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error making request to OPNsense: {e}")
-        sys.exit(1)
-
-def get_opnsense_version(config):
-    data = make_request(config, 'GET', 'core/firmware/status')
-    return data.get('product_version', 'Unknown')
-
-def get_kea_dhcpv4_config(config):
-    return make_request(config, 'GET', 'kea/dhcpv4/get')
-
-def set_kea_dhcpv4_config(config, dhcp_config):
-    return make_request(config, 'POST', 'kea/dhcpv4/set', data=dhcp_config)
 
-def search_dhcpv4_subnets(config):
-    return make_request(config, 'GET', 'kea/dhcpv4/searchSubnet')
+def search_dhcpv4_subnets(api):
+    return list(api.iter_search('kea/dhcpv4/searchSubnet'))
 
-def search_kea_dhcpv4_reservations(config):
-    return make_request(config, 'GET', 'kea/dhcpv4/searchReservation')
+def search_kea_dhcpv4_reservations(api):
+    return list(api.iter_search('kea/dhcpv4/searchReservation'))
 
-def add_kea_dhcpv4_reservation(config, reservation):
-    return make_request(config, 'POST', 'kea/dhcpv4/addReservation', data=reservation)
+def add_kea_dhcpv4_reservation(api, reservation):
+    return api.post('kea/dhcpv4/addReservation', reservation)
 
-def add_dhcpv4_subnet(config, subnet_info):
+def add_dhcpv4_subnet(api, subnet_info):
     endpoint = 'kea/dhcpv4/addSubnet'
-    return make_request(config, 'POST', endpoint, data=subnet_info)
+    return api.post(endpoint, subnet_info)
 
 def sanitize_hostname(hostname):
     """
@@ -112,12 +80,8 @@ def sanitize_hostname(hostname):
     return sanitized
 
 def map_ar7_ethinterface_to_kea_subnet_info(input_data):
-    # Calculate network address and CIDR notation
-    ip_parts = input_data['ipaddr'].split('.')
-    netmask_parts = input_data['netmask'].split('.')
-    network_parts = [str(int(ip_parts[i]) & int(netmask_parts[i])) for i in range(4)]
-    network_address = '.'.join(network_parts)
-    cidr = sum([bin(int(x)).count('1') for x in netmask_parts])
+    # Calculate network address and CIDR notation, works for strings and typed ipaddress values
+    network = ipaddress.IPv4Network((input_data['ipaddr'], str(input_data['netmask'])), strict=False)
     
     description = ""
     if input_data['name'] == "eth0":
@@ -131,7 +95,7 @@ def map_ar7_ethinterface_to_kea_subnet_info(input_data):
     
     subnet_info = {
         "subnet4": {
-            "subnet": f"{network_address}/{cidr}",
+            "subnet": str(network),
             "option_data_autocollect": "1",
             "next_server": "",
             "option_data": {
@@ -171,8 +135,8 @@ def convert_to_opnsense_reservation(input_data, subnet_uuid):
     opnsense_reservation = {
         "reservation": {
             "subnet": subnet_uuid,
-            "ip_address": input_data["ip"].lower().strip(),
-            "hw_address": input_data["mac"].lower().strip(),
+            "ip_address": str(input_data["ip"]).lower().strip(),
+            "hw_address": str(input_data["mac"]).lower().strip(),
             "hostname": sanitize_hostname(input_data["neighbour_name"]).lower().strip(),
             "description": f"Reservation for {sanitize_hostname(input_data['neighbour_name']).lower().strip()}"
         }
@@ -180,77 +144,126 @@ def convert_to_opnsense_reservation(input_data, subnet_uuid):
 
     return opnsense_reservation
 
-def main():
+def main(argv):
     parser = argparse.ArgumentParser(description="OPNsense DHCP migration tool")
     parser.add_argument("--config", default="config.json", help="Path to the config file")
+    add_config_loader_arguments(parser)
+    add_profile_arguments(parser)
+    add_concurrency_argument(parser)
+    parser.add_argument("--bulk", action="store_true",
+                        help="Read the Kea configuration once, add all subnets and reservations to it and write it back with one request")
     parser.add_argument("ar7cfg", metavar="ar7.cfg", help="Path to the ar7.cfg file")
-    args = parser.parse_args()
-
+    args = parser.parse_args(argv[1:])
+    if args.bulk and args.concurrency > 1:
+        parser.error("--bulk cannot be combined with --concurrency")
+
+    with profiler_from_args(args):
+        try:
+            run(args)
+        except OPNsenseError as e:
+            print(f"Error making request to OPNsense: {e}")
+            sys.exit(1)
+
+def run(args):
     warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
     config = load_config(args.config)
+    api = OPNsenseClient(config)
 
-    input_stream = FileStream(args.ar7cfg, encoding='utf-8')
-    lexer = ConfigLexer(input_stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = ConfigParser(token_stream)
-    tree = parser.config()
-    printer = ConfigJSONPrinter()
-    ar7cfg = json.loads(printer.visitConfig(tree))
-
-    landevices_jsonpath_expr = jsonpath_ng.parse('$.landevices.landevices[?staticlease = "yes"]')
-    landevices_matches = landevices_jsonpath_expr.find(ar7cfg)
+    ar7cfg = load_config_file(args.ar7cfg, backend=args.parser_backend, cache=config_cache_from_args(args),
+                              sections={"ar7cfg.ethinterfaces", "landevices.landevices"})
 
-    ethinterfaces_jsonpath_expr = jsonpath_ng.parse('$.ar7cfg[ethinterfaces]')
-    ethinterfaces_matches = ethinterfaces_jsonpath_expr.find(ar7cfg)
+    with phase("query"):
+        query = ConfigQuery(ar7cfg)
+        static_landevices = query.where("landevices.landevices", staticlease="yes")
+        ethinterfaces = query.records("ar7cfg.ethinterfaces")
     
 #    print(json.dumps(ar7cfg, indent=2))
 
-    version = get_opnsense_version(config)
+    version = get_opnsense_version(api)
     print(f"OPNsense Version: {version}")
 
-#    dhcp_config = get_kea_dhcpv4_config(config)
+    if args.bulk:
+        # Subnets and then reservations are added to the current
+        # configuration locally and sent with one set call each
+        dhcp_config = flatten_model(get_kea_dhcpv4_config(api)["dhcpv4"])
 #    print(json.dumps(dhcp_config, indent=2))
 
     subnet_uuids = {}
+    subnet_networks = {}
 
     print("Migrating subnets")
-    for match in ethinterfaces_matches:
-        for interface in match.value:
-            subnet_info = map_ar7_ethinterface_to_kea_subnet_info(interface)
-#            print(json.dumps(interface, indent=2))
-            result = add_dhcpv4_subnet(config, subnet_info)
-            print(result)
-            subnet_uuids[interface["name"]] = result["uuid"]
+    for interface in ethinterfaces:
+        subnet_info = map_ar7_ethinterface_to_kea_subnet_info(interface)
+#        print(json.dumps(interface, indent=2))
+        if args.bulk:
+            add_model_item(dhcp_config, "subnets.subnet4", subnet_info["subnet4"])
+            subnet_networks[interface["name"]] = subnet_info["subnet4"]["subnet"]
+            continue
+        result = add_dhcpv4_subnet(api, subnet_info)
+        print(result)
+        subnet_uuids[interface["name"]] = result["uuid"]
+
+    if args.bulk:
+        # OPNsense stores new items under uuids of its own, the reservations
+        # reference the subnets by the uuids read back after the set
+        save_kea_dhcpv4_config(api, dhcp_config)
+        dhcp_config = flatten_model(get_kea_dhcpv4_config(api)["dhcpv4"])
+        uuids_by_network = {subnet["subnet"]: subnet_uuid
+                            for subnet_uuid, subnet in (dhcp_config["subnets"]["subnet4"] or {}).items()}
+        for name, network in subnet_networks.items():
+            if network not in uuids_by_network:
+                print(f"Error: subnet {network} of {name} is missing in the Kea configuration")
+                sys.exit(1)
+            subnet_uuids[name] = uuids_by_network[network]
 
 #    print(subnet_uuids)
 
     # # Search for DHCP subnets
-    # subnets = search_dhcpv4_subnets(config)
+    # subnets = search_dhcpv4_subnets(api)
     # print("\nCurrent DHCP Subnets:")
     # print(json.dumps(subnets, indent=2))
 
-    migrated_addresses = []
+    migrated_addresses = set()
+    reservations = []
 
     print("Migrating reservations")
-    for match in landevices_matches:
-        landevice = match.value
+    for landevice in static_landevices:
 #        print(json.dumps(landevice, indent=2))
         if (landevice["ip"] in migrated_addresses):
             print("CONFLICT: lan device could not be migrated. A lan device with the same ip address has already been imported. LAN device: " + str(landevice))
             continue
 
-        migrated_addresses.append(landevice["ip"])
+        migrated_addresses.add(landevice["ip"])
         
-        reservation = convert_to_opnsense_reservation(landevice, subnet_uuids["eth0"])
-        result = add_kea_dhcpv4_reservation(config, reservation)
-        #print(json.dumps(reservation, indent=2))
-        print(result)
+        reservations.append(convert_to_opnsense_reservation(landevice, subnet_uuids["eth0"]))
+
+    if args.bulk:
+        for reservation in reservations:
+            add_model_item(dhcp_config, "reservations.reservation", reservation["reservation"])
+        save_kea_dhcpv4_config(api, dhcp_config)
+        print(f"{len(subnet_uuids)} subnets and {len(reservations)} reservations migrated")
+        return
+
+    if args.concurrency > 1:
+        # With an AsyncOPNsenseClient, add_kea_dhcpv4_reservation returns a coroutine
+        pairs = run_concurrently(config, args.concurrency, add_kea_dhcpv4_reservation, reservations)
+        for reservation, result in pairs:
+            if isinstance(result, OPNsenseError):
+                print(f"Error adding reservation {reservation['reservation']['hostname']}: {result}")
+            else:
+                print(result)
+        if failures(pairs):
+            sys.exit(1)
+    else:
+        for reservation in reservations:
+            #print(json.dumps(reservation, indent=2))
+            print(add_kea_dhcpv4_reservation(api, reservation))
 
     # Search for DHCP reservations
-    # reservations = search_kea_dhcpv4_reservations(config)
+    # reservations = search_kea_dhcpv4_reservations(api)
     # print("\nCurrent DHCP Reservations:")
     # print(json.dumps(reservations, indent=2))
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv)
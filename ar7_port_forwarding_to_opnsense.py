@@ -1,12 +1,10 @@
 #!/bin/python3
 
 import sys
-import json
-import jmespath
-from antlr4 import *
-from ConfigLexer import ConfigLexer
-from ConfigParser import ConfigParser
-from ConfigJSONPrinter import ConfigJSONPrinter
+import argparse
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+from config_query import ConfigQuery
+from profiling import add_profile_arguments, profiler_from_args, phase
 
 def parse_port_forwarding_rule(rule_string):
     # Split the rule into main components and comment
@@ -43,24 +41,27 @@ def parse_port_forwarding_rule(rule_string):
     }
 
 def main(argv):
-    if len(argv) != 2:
-        print("Usage: python ar7_port_forwarding_to_opnsense.py <input_file>")
-        return
+    parser = argparse.ArgumentParser(description="OPNsense port forwarding migration tool")
+    add_config_loader_arguments(parser)
+    add_profile_arguments(parser)
+    parser.add_argument("input_file", help="Path to the ar7.cfg file")
+    args = parser.parse_args(argv[1:])
 
-    input_file = argv[1]
-    
+    with profiler_from_args(args):
+        run(args)
+
+def run(args):
     try:
-        input_stream = FileStream(input_file, encoding='utf-8')
-        lexer = ConfigLexer(input_stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = ConfigParser(token_stream)
-        tree = parser.config()
-        printer = ConfigJSONPrinter()
-        ar7cfg = json.loads(printer.visitConfig(tree))
+        ar7cfg = load_config_file(args.input_file, backend=args.parser_backend, cache=config_cache_from_args(args),
+                                  sections={"landevices.landevices"})
 
-        jsonpath_expr = jmespath.search("landevices.landevices[?staticlease == 'yes' && ipv4forwardrules != null && type(ipv4forwardrules)  == 'array' && length(ipv4forwardrules) > `0`].ipv4forwardrules", ar7cfg)
+        with phase("query"):
+            # Only landevices with more than one rule, a single rule is no list
+            forwardrules = [landevice["ipv4forwardrules"]
+                            for landevice in ConfigQuery(ar7cfg).where("landevices.landevices", staticlease="yes")
+                            if isinstance(landevice.get("ipv4forwardrules"), list)]
 
-        for match in jsonpath_expr:            
+        for match in forwardrules:            
 #            print(json.dumps(match, indent=2))
             for rulestr in match:
                 rule = parse_port_forwarding_rule(rulestr)
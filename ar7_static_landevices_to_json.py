@@ -2,42 +2,51 @@
 
 import sys
 import json
-import jsonpath_ng.ext as jsonpath_ng
-from antlr4 import *
-from ConfigLexer import ConfigLexer
-from ConfigParser import ConfigParser
-from ConfigJSONPrinter import ConfigJSONPrinter
+import argparse
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+from ConfigEventParser import iter_config_events, iter_section_blocks
+from config_query import ConfigQuery
+
+def find_static_landevices(ar7cfg):
+#    return ConfigQuery(ar7cfg).where("landevices.landevices", staticlease="yes", url_status="eLUrlStatusNotAvailable")
+    return ConfigQuery(ar7cfg).where("landevices.landevices", staticlease="yes")
+
+def stream_static_landevices(input_file):
+    # Handles one landevice at a time while the parser reaches it, without
+    # building the whole config in memory.
+    events = iter_config_events(input_file)
+    for landevice in iter_section_blocks(events, ('landevices', 'landevices')):
+        if landevice.get("staticlease") == "yes":
+            yield landevice
+
+def print_json_list(items, indent=4):
+    # Same output as print(json.dumps(list(items), indent=indent)), written item by item
+    prefix = ' ' * indent
+    separator = "[\n"
+    for item in items:
+        text = json.dumps(item, indent=indent).replace("\n", "\n" + prefix)
+        sys.stdout.write(separator + prefix + text)
+        separator = ",\n"
+    sys.stdout.write("[]\n" if separator == "[\n" else "\n]\n")
 
 def main(argv):
-    if len(argv) != 2:
-        print("Usage: python ar_to_json.py <input_file>")
-        return
+    parser = argparse.ArgumentParser(description="Extracts the landevices with a static DHCP lease from a FritzBox ar7.cfg file")
+    add_config_loader_arguments(parser)
+    parser.add_argument("input_file", help="Path to the ar7.cfg file")
+    args = parser.parse_args(argv[1:])
 
-    input_file = argv[1]
-    
     try:
-        input_stream = FileStream(input_file, encoding='utf-8')
-        lexer = ConfigLexer(input_stream)
-        token_stream = CommonTokenStream(lexer)
-        parser = ConfigParser(token_stream)
-        tree = parser.config()
-        printer = ConfigJSONPrinter()
-        ar7cfg = json.loads(printer.visitConfig(tree))
+        if args.parser_backend == "fast":
+            landevices = stream_static_landevices(args.input_file)
+        else:
+            ar7cfg = load_config_file(args.input_file, backend=args.parser_backend, cache=config_cache_from_args(args),
+                                      sections={"landevices.landevices"})
+            landevices = find_static_landevices(ar7cfg)
 
-#        jsonpath_expr = jsonpath_ng.parse('$.landevices.landevices[?staticlease = "yes" & url_status ="eLUrlStatusNotAvailable"]')
-        jsonpath_expr = jsonpath_ng.parse('$.landevices.landevices[?staticlease = "yes"]')
-        matches = jsonpath_expr.find(ar7cfg)
-
-        json_list = []
-        for match in matches:
-            json_list.append(match.value)
-
-        print(json.dumps(json_list, indent=4))
+        print_json_list(landevices, indent=4)
 
     except Exception as e:
         print(f"Error: {str(e)}")
 
 if __name__ == '__main__':
     main(sys.argv)
-
-
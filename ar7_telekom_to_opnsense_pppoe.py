@@ -1,84 +1,33 @@
 #!/bin/python3
 
-import json
 import argparse
-import requests
 import sys
-import re
 import warnings
-from requests.auth import HTTPBasicAuth
-import jsonpath_ng.ext as jsonpath_ng
-from antlr4 import *
-from ConfigLexer import ConfigLexer
-from ConfigParser import ConfigParser
-from ConfigJSONPrinter import ConfigJSONPrinter
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+from config_query import ConfigQuery
+from profiling import add_profile_arguments, profiler_from_args, phase
+from opnsense_client import OPNsenseClient, OPNsenseError, load_config
 
 
-def load_config(config_file):
-    if config_file is None:
-        config_file="config.json"
-    try:
-        with open(config_file, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Config file '{config_file}' not found.")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in config file '{config_file}'.")
-        sys.exit(1)
-
-def make_request(config, method, endpoint, data=None):
-    url = f"{config['url']}/api/{endpoint}"
-    try:
-        if method == 'GET':
-            response = requests.get(
-                url,
-                auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
-                verify=config.get('verify_ssl', True)
-            )
-        elif method in ['POST', 'PUT']:
-            response = requests.post(
-                url,
-                auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
-                verify=config.get('verify_ssl', True),
-                json=data
-            )
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error making request to OPNsense: {e}")
-        sys.exit(1)
-
-def get_opnsense_version(config):
-    data = make_request(config, 'GET', 'core/firmware/status')
-    return data.get('product_version', 'Unknown')
-
-def add_wan_vlan(config, vlan_config):
+def get_opnsense_version(api):
+    return api.probe().version
+
+def add_wan_vlan(api, vlan_config):
     endpoint = 'interfaces/vlan_settings/addItem'
-    return make_request(config, 'POST', endpoint, data=vlan_config)
+    return api.post(endpoint, vlan_config)
 
-def reconfigure_vlan_settings(config):
+def reconfigure_vlan_settings(api):
     endpoint = 'interfaces/vlan_settings/reconfigure'
-    return make_request(config, 'POST', endpoint, data="")
+    return api.post(endpoint, "")
 
-def find_interface_by_name(config, interface_name):
+def find_interface_by_name(api, interface_name):
     # Endpoint to get interfaces info
     endpoint = 'interfaces/overview/interfacesInfo'
 
     try:
-        # Make API request to get all interfaces
-        response = make_request(config, 'GET', endpoint)
-
-        # Check if the request was successful
-        if not isinstance(response, dict):
-            print("Error: Unable to fetch interface list")
-            return None
-
-        # Iterate through interfaces
-        for interface in response["rows"]:
+        # OPNsense only returns the interfaces with a column containing the
+        # name, searchPhrase also matches parts of other names
+        for interface in api.iter_search(endpoint, phrase=interface_name):
             if interface["description"] == interface_name:
                 return interface
 
@@ -86,46 +35,54 @@ def find_interface_by_name(config, interface_name):
         print(f"Interface '{interface_name}' not found")
         return None
 
+    except OPNsenseError:
+        # Failed requests end the script in main()
+        raise
     except Exception as e:
         print(f"Error occurred while fetching interface details: {str(e)}")
         return None
 
-def main():
+def main(argv):
     parser = argparse.ArgumentParser(description="OPNsense Telekom PPPOE login migration tool")
     parser.add_argument("--config", default="config.json", help="Path to the config file")
+    add_config_loader_arguments(parser)
+    add_profile_arguments(parser)
     parser.add_argument("ar7cfg", metavar="ar7.cfg", help="Path to the ar7.cfg file")
     parser.add_argument("wan_interface_name", help="OPNsense interface name of the WAN interface (usually 'WAN')")
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv[1:])
+
+    with profiler_from_args(args):
+        try:
+            run(args)
+        except OPNsenseError as e:
+            print(f"Error making request to OPNsense: {e}")
+            sys.exit(1)
 
+def run(args):
     warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
-    config = load_config(args.config)
+    api = OPNsenseClient(load_config(args.config))
 
-    input_stream = FileStream(args.ar7cfg, encoding='utf-8')
-    lexer = ConfigLexer(input_stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = ConfigParser(token_stream)
-    tree = parser.config()
-    printer = ConfigJSONPrinter()
-    ar7cfg = json.loads(printer.visitConfig(tree))
+    ar7cfg = load_config_file(args.ar7cfg, backend=args.parser_backend, cache=config_cache_from_args(args),
+                              sections={"ar7cfg.targets"})
 
-    targets_jsonpath_expr = jsonpath_ng.parse('$.ar7cfg.targets[?name == "internet"]')
-    targets_matches = targets_jsonpath_expr.find(ar7cfg)
+    with phase("query"):
+        targets_matches = ConfigQuery(ar7cfg).where("ar7cfg.targets", name="internet")
 
     if (len(targets_matches)) != 1:
         print("Unerwartete Anzahl an internet targets in ar7.cfg")
         sys.exit()
 
-    pppoe_username = targets_matches[0].value['local']['username']
-    pppoe_password = targets_matches[0].value['local']['passwd']
+    pppoe_username = targets_matches[0]['local']['username']
+    pppoe_password = targets_matches[0]['local']['passwd']
 
-    version = get_opnsense_version(config)
+    version = get_opnsense_version(api)
     print(f"OPNsense Version: {version}")
 
     ## Step 1: add vlan 7 to WAN interface
     print("Adding VLAN 7 to the WAN interface...")
-    interface = find_interface_by_name(config, args.wan_interface_name)
+    interface = find_interface_by_name(api, args.wan_interface_name)
     device = interface["device"]
     print("WAN interface [" + args.wan_interface_name + "] is " + device)
 
@@ -140,14 +97,14 @@ def main():
         }
     }
     print(vlan_config)
-    result = add_wan_vlan(config, vlan_config)
+    result = add_wan_vlan(api, vlan_config)
     print(result)
-    result = reconfigure_vlan_settings(config)
+    result = reconfigure_vlan_settings(api)
     print(result)
 
     # # Step 2: configure WAN interface
     # print("Configuring WAN interface for Telekom PPPOE...")
-    # interface = find_interface_by_name(config, args.wan_interface_name)
+    # interface = find_interface_by_name(api, args.wan_interface_name)
     # interface_identifier = interface["identifier"]
     # print(json.dumps(interface, indent=2))
     
@@ -155,12 +112,12 @@ def main():
     # interface["link_type"]="pppoe"
     # #interface["pppoe_username"] = pppoe_username
     # #interface["pppoe_password"] = pppoe_password
-    # update_interface(config, interface_identifier, interface)
-    # reload_interface(config, interface_identifier)
+    # update_interface(api, interface_identifier, interface)
+    # reload_interface(api, interface_identifier)
 
     print("-----")
     print("PPPoE Username: " + pppoe_username)
     print("PPPoE Passwort: " + pppoe_password)
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv)
@@ -1,13 +1,15 @@
 #!/bin/python3
 
 import sys
-import json
-from antlr4 import *
-from ConfigLexer import ConfigLexer
-from ConfigParser import ConfigParser
-from ConfigJSONPrinter import ConfigJSONPrinter
+import argparse
+import contextlib
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+from config_json_writer import OUTPUT_FORMATS, write_config, stream_config_file
+from profiling import add_profile_arguments, profiler_from_args, phase
 
 def print_tokenstream(token_stream, lexer):
+    from antlr4 import Token
+
     token_stream.fill()
 
     for token in token_stream.tokens:
@@ -15,6 +17,8 @@ def print_tokenstream(token_stream, lexer):
             print(f"Token Type: {lexer.symbolicNames[token.type]}, Text: '{token.text}'")
 
 def print_nodestream(tree, parser, indent=""):
+    from antlr4 import TerminalNode
+
     if isinstance(tree, TerminalNode):
         print(f"{indent}Terminal: {tree.getText()}")
     else:
@@ -24,22 +28,63 @@ def print_nodestream(tree, parser, indent=""):
             print_nodestream(child, parser, indent + "  ")
 
 def main(argv):
-    if len(argv) != 2:
-        print("Usage: python ar_to_json.py <input_file>")
-        return
+    parser = argparse.ArgumentParser(description="Converts a FritzBox ar7.cfg/vpn.cfg file to JSON")
+    add_config_loader_arguments(parser)
+    add_profile_arguments(parser)
+    parser.add_argument("--section", action="append", metavar="PATH",
+                        help="Only convert this section, e.g. 'ar7cfg.targets'. Can be given multiple times")
+    parser.add_argument("--profile-decisions", action="store_true",
+                        help="Print per-decision prediction statistics of the antlr parser to stderr")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS + ("binary",), default="json",
+                        help="Output format: indented 'json', 'compact' JSON, 'ndjson' with one line per "
+                             "landevice, ethinterface or connection or the 'binary' format of config_binary.py (default: json)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Write the output while parsing, with constant memory (fast backend without --section only)")
+    parser.add_argument("-o", "--output", metavar="FILE", help="Output file, stdout if omitted")
+    parser.add_argument("input_file", help="Path to the ar7.cfg or vpn.cfg file")
+    args = parser.parse_args(argv[1:])
+    if args.profile_decisions and args.parser_backend != "antlr":
+        parser.error("--profile-decisions requires --parser-backend antlr")
+    if args.stream and (args.parser_backend != "fast" or args.section):
+        parser.error("--stream requires --parser-backend fast and cannot be combined with --section")
+    if args.stream and args.format == "binary":
+        parser.error("--stream cannot write the binary format")
+
+    with profiler_from_args(args):
+        run(args)
 
-    input_file = argv[1]
-    
+def open_output(args):
+    if args.format == "binary":
+        return open(args.output, 'wb') if args.output else contextlib.nullcontext(sys.stdout.buffer)
+    return open(args.output, 'w', encoding='utf-8') if args.output else contextlib.nullcontext(sys.stdout)
+
+def run(args):
     try:
-        input_stream = FileStream(input_file, encoding='utf-8')
-        lexer = ConfigLexer(input_stream)
-        token_stream = CommonTokenStream(lexer)
-#        print_tokenstream(token_stream, lexer)
-        parser = ConfigParser(token_stream)
-        tree = parser.config()
-#        print_nodestream(tree, parser)
-        printer = ConfigJSONPrinter()
-        print(printer.visitConfig(tree))
+        if args.stream:
+            try:
+                with phase("stream"), open_output(args) as out:
+                    stream_config_file(args.input_file, out, args.format)
+            except Exception as e:
+                # Part of the document may already be out, the error must
+                # not end up in it and the exit status has to show it
+                print(f"Error: {str(e)}", file=sys.stderr)
+                sys.exit(1)
+            return
+
+        profiler = None
+        if args.profile_decisions:
+            from antlr_profiler import DecisionProfiler
+            profiler = DecisionProfiler()
+        ar7cfg = load_config_file(args.input_file, backend=args.parser_backend, cache=config_cache_from_args(args),
+                                  sections=args.section, profiler=profiler)
+        with phase("output"), open_output(args) as out:
+            if args.format == "binary":
+                from config_binary import write_binary_config
+                write_binary_config(ar7cfg, out)
+            else:
+                write_config(ar7cfg, out, args.format)
+        if profiler is not None:
+            print(profiler.report(), file=sys.stderr)
 
     except Exception as e:
         print(f"Error: {str(e)}")
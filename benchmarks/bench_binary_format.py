@@ -0,0 +1,69 @@
+#!/bin/python3
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ConfigFastParser import parse_config_string
+from config_binary import BinaryConfig, write_binary_config
+from synthetic_config import generate_ar7_cfg
+
+# Compares the size and the load time of the output formats of ar7_to_json.py:
+# the indented JSON, compact JSON and the binary format. 'load' reads the
+# whole config, 'ar7cfg' only the ar7cfg section, which the binary format
+# reads without decoding the landevices.
+
+
+def best_of(repeat, function):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Compares size and load time of JSON and the binary config format")
+    parser.add_argument("--landevices", type=int, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="Numbers of landevices of the generated ar7.cfg (default: 100 1000 10000 100000)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement, the best is reported (default: 5)")
+    args = parser.parse_args(argv[1:])
+
+    print(f"{'landevices':>10} {'format':<8} {'size KB':>10} {'load ms':>10} {'ar7cfg ms':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for landevices in args.landevices:
+            config = parse_config_string(generate_ar7_cfg(landevices=landevices))
+            paths = {name: os.path.join(directory, f"ar7.{name}") for name in ("json", "compact", "binary")}
+            with open(paths["json"], 'w', encoding='utf-8') as f:
+                json.dump(config, f, indent=2)
+            with open(paths["compact"], 'w', encoding='utf-8') as f:
+                json.dump(config, f, separators=(',', ':'))
+            with open(paths["binary"], 'wb') as f:
+                write_binary_config(config, f)
+            assert BinaryConfig(paths["binary"]).to_dict() == config
+
+            for name, path in paths.items():
+                if name == "binary":
+                    load = lambda: BinaryConfig(path).to_dict()
+                    section = lambda: BinaryConfig(path)["ar7cfg"]
+                else:
+                    load = lambda: load_json(path)
+                    section = lambda: load_json(path)["ar7cfg"]
+                print(f"{landevices:>10} {name:<8} {os.path.getsize(path) / 1024:>10.0f} "
+                      f"{best_of(args.repeat, load) * 1000:>10.1f} {best_of(args.repeat, section) * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
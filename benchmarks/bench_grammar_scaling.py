@@ -0,0 +1,44 @@
+#!/bin/python3
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_loader import PARSER_BACKENDS, load_config_string
+from synthetic_config import generate_ar7_cfg
+
+
+def time_parse(text, backend, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        load_config_string(text, backend=backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Shows how the parse time grows with the number of landevices. "
+                                                 "With bounded lookahead the time per section stays constant.")
+    parser.add_argument("--parser-backend", choices=PARSER_BACKENDS, default="antlr", help="Backend to measure (default: antlr)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[250, 500, 1000, 2000, 4000],
+                        help="Numbers of landevices to generate")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per size, the best one is reported")
+    args = parser.parse_args(argv[1:])
+
+    baseline = None
+    print(f"{'landevices':>10} {'time s':>9} {'us/section':>11} {'vs. first':>10}")
+    for size in args.sizes:
+        text = generate_ar7_cfg(landevices=size)
+        per_section = time_parse(text, args.parser_backend, args.repeat) / size
+        if baseline is None:
+            baseline = per_section
+        print(f"{size:>10} {per_section * size:>9.3f} {per_section * 1e6:>11.1f} {per_section / baseline:>9.2f}x")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,138 @@
+#!/bin/python3
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_config import generate_ar7_cfg
+
+# Compares the memory needed to get a config into the lexers: the ANTLR
+# FileStream against MmapInputStream, and the fast tokenizer on a decoded str
+# against the mmap. Every variant runs in its own process. Pages of a mapped
+# file belong to the page cache and can be dropped by the kernel at any time,
+# so the private (anonymous) memory is measured, sampled from /proc.
+
+MODES = ("antlr-filestream", "antlr-mmap", "fast-str", "fast-mmap")
+
+# Bytes per generated landevice, to hit the requested file size
+LANDEVICE_SIZE = 250
+
+
+def rss_anon():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakSampler(threading.Thread):
+    def __init__(self, interval=0.01):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = rss_anon()
+        self._done = threading.Event()
+
+    def run(self):
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, rss_anon())
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        self.peak = max(self.peak, rss_anon())
+        return self.peak
+
+
+def run_mode(mode, path, antlr_tokens):
+    if mode.startswith("antlr"):
+        from antlr4 import FileStream
+        from ConfigLexer import ConfigLexer
+        from MmapInputStream import MmapInputStream
+    else:
+        from ConfigFastParser import ConfigTokenizer, map_config_file
+
+    baseline = rss_anon()
+    sampler = PeakSampler()
+    sampler.start()
+    start = time.perf_counter()
+    tokens = 0
+    if mode.startswith("antlr"):
+        # The ANTLR lexer is far too slow for hundreds of MB, the stream itself is what costs the memory
+        stream = FileStream(path, encoding='utf-8') if mode == "antlr-filestream" else MmapInputStream(path)
+        lexer = ConfigLexer(stream)
+        while tokens < antlr_tokens and lexer.nextToken().type != -1:
+            tokens += 1
+    elif mode == "fast-str":
+        with open(path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        for _ in ConfigTokenizer(text).tokens():
+            tokens += 1
+    else:
+        with map_config_file(path) as data:
+            for _ in ConfigTokenizer(data).tokens():
+                tokens += 1
+    elapsed = time.perf_counter() - start
+    peak = sampler.stop()
+    return {"mode": mode, "tokens": tokens, "time": elapsed, "peak": peak - baseline}
+
+
+def write_config(path, size_mb):
+    landevices = max(1, size_mb * 1024 * 1024 // LANDEVICE_SIZE)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(generate_ar7_cfg(landevices=landevices))
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Compares the memory used by the config input streams")
+    parser.add_argument("--size-mb", type=int, default=300, help="Size of the generated ar7.cfg in MB (default: 300)")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--antlr-tokens", type=int, default=100000,
+                        help="Number of tokens the ANTLR lexer reads (default: 100000)")
+    parser.add_argument("--run", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("input_file", nargs="?", help="Measure this ar7.cfg instead of a generated one")
+    args = parser.parse_args(argv[1:])
+
+    if args.run:
+        print(json.dumps(run_mode(args.run, args.input_file, args.antlr_tokens)))
+        return
+
+    path = args.input_file
+    if path is None:
+        fd, path = tempfile.mkstemp(suffix='.cfg')
+        os.close(fd)
+        print(f"Generating {args.size_mb} MB config ...")
+        write_config(path, args.size_mb)
+
+    try:
+        size = os.path.getsize(path)
+        print(f"Input: {path} ({size / 1024 / 1024:.0f} MB)")
+        print(f"{'mode':<18} {'tokens':>10} {'time s':>8} {'peak MB':>9} {'x file size':>12}")
+        for mode in args.modes:
+            result = subprocess.run([sys.executable, os.path.abspath(__file__), "--run", mode,
+                                     "--antlr-tokens", str(args.antlr_tokens), path],
+                                    capture_output=True, text=True)
+            if result.returncode != 0:
+                print(f"{mode:<18} failed: {result.stderr.strip().splitlines()[-1]}")
+                continue
+            r = json.loads(result.stdout)
+            print(f"{r['mode']:<18} {r['tokens']:>10} {r['time']:>8.2f} {r['peak'] / 1024 / 1024:>9.1f} "
+                  f"{r['peak'] / size:>12.2f}")
+    finally:
+        if args.input_file is None:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,79 @@
+#!/bin/python3
+
+import os
+import sys
+import time
+import argparse
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from requests.auth import HTTPBasicAuth
+from opnsense_client import OPNsenseClient, failures, run_concurrently
+from opnsense_standin import OPNsenseStandin
+
+# Compares the API calls of the migration scripts before and after
+# OPNsenseClient against the local stand-in: 'bare' opens a new connection
+# for every call like the former make_request(), 'session' reuses the
+# connections of one requests.Session and 'async' sends --concurrency calls
+# at a time with AsyncOPNsenseClient. Each call adds a reservation. Run with
+# --latency to see the effect of a firewall behind a slow link, add
+# --capacity to see how the adaptive limit of 'async' and the retries cope
+# with an appliance that cannot handle --concurrency calls at a time.
+
+
+def reservation(i):
+    return {"reservation": {"subnet": "", "ip_address": f"10.0.{i // 250}.{i % 250 + 1}",
+                            "hw_address": f"02:00:00:00:{i // 256:02x}:{i % 256:02x}", "hostname": f"host-{i}"}}
+
+
+def run_bare(config, calls):
+    url = f"{config['url']}/api/kea/dhcpv4/addReservation"
+    for i in range(calls):
+        response = requests.post(url, auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
+                                 verify=config['verify_ssl'], json=reservation(i))
+        response.raise_for_status()
+
+
+def run_session(config, calls):
+    with OPNsenseClient(config) as api:
+        for i in range(calls):
+            api.post('kea/dhcpv4/addReservation', reservation(i))
+
+
+def run_async(config, calls, concurrency):
+    def add(api, i):
+        return api.post('kea/dhcpv4/addReservation', reservation(i))
+    for _, error in failures(run_concurrently(config, concurrency, add, range(calls))):
+        # Like the other clients, a call that failed after all retries ends the run
+        raise error
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Compares a new connection per API call with a pooled session")
+    parser.add_argument("--calls", type=int, default=200, help="API calls per run (default: 200)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated response latency in seconds (default: 0)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel calls of 'async' (default: 8)")
+    parser.add_argument("--capacity", type=int, help="Requests the stand-in handles at a time without slowing down")
+    parser.add_argument("--no-tls", action="store_true", help="Use plain HTTP instead of HTTPS")
+    args = parser.parse_args(argv[1:])
+    warnings.filterwarnings('ignore', message='Unverified HTTPS request')
+
+    print(f"{'client':<8} {'calls':>6} {'connections':>12} {'failures':>9} {'seconds':>8} {'calls/s':>8}")
+    runs = (
+        ("bare", run_bare),
+        ("session", run_session),
+        ("async", lambda config, calls: run_async(config, calls, args.concurrency)),
+    )
+    for name, run in runs:
+        with OPNsenseStandin(latency=args.latency, tls=not args.no_tls, capacity=args.capacity) as standin:
+            start = time.perf_counter()
+            run(standin.config(), args.calls)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<8} {args.calls:>6} {standin.connections:>12} {len(standin.failures):>9} "
+                  f"{elapsed:>8.2f} {args.calls / elapsed:>8.0f}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
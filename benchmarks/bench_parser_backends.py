@@ -0,0 +1,61 @@
+#!/bin/python3
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config_loader import PARSER_BACKENDS, load_config_file
+from synthetic_config import generate_ar7_cfg
+
+
+def time_backend(path, backend, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = load_config_file(path, backend=backend)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Compares the fast and the ANTLR config parser backends")
+    parser.add_argument("--landevices", type=int, default=2000, help="Number of landevices in the generated ar7.cfg")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per backend, the best one is reported")
+    parser.add_argument("input_file", nargs="?", help="Benchmark this ar7.cfg instead of a generated one")
+    args = parser.parse_args(argv[1:])
+
+    path = args.input_file
+    if path is None:
+        tmp = tempfile.NamedTemporaryFile('w', suffix='.cfg', delete=False, encoding='utf-8')
+        tmp.write(generate_ar7_cfg(landevices=args.landevices))
+        tmp.close()
+        path = tmp.name
+
+    try:
+        size = os.path.getsize(path)
+        print(f"Input: {path} ({size / 1024:.0f} KiB)")
+        timings = {}
+        results = {}
+        for backend in PARSER_BACKENDS:
+            try:
+                timings[backend], results[backend] = time_backend(path, backend, args.repeat)
+            except ImportError as e:
+                print(f"{backend:>6}: not available ({e})")
+                continue
+            print(f"{backend:>6}: {timings[backend]:.3f} s ({size / timings[backend] / 1024 / 1024:.2f} MB/s)")
+
+        if len(timings) == len(PARSER_BACKENDS):
+            print(f"speedup: {timings['antlr'] / timings['fast']:.1f}x")
+            print(f"identical result: {results['fast'] == results['antlr']}")
+    finally:
+        if args.input_file is None:
+            os.unlink(path)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,101 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ConfigFastParser import ConfigTokenizer, parse_config_string
+from config_loader import config_to_json, _parse_antlr
+from synthetic_config import generate_ar7_cfg, generate_vpn_cfg
+
+# pytest-benchmark suite for the config pipeline, measuring each phase on its
+# own at 1x, 10x and 100x scale. The input of a phase is prepared outside of
+# the measurement. The fast backend has no separate tree, its parse includes
+# lexing and building the result. See README.md for storing and comparing
+# baselines.
+
+try:
+    from antlr4 import CommonTokenStream, InputStream
+    from ConfigLexer import ConfigLexer
+    from ConfigJSONPrinter import ConfigJSONPrinter
+    ANTLR_AVAILABLE = True
+except ImportError:
+    ANTLR_AVAILABLE = False
+
+requires_antlr = pytest.mark.skipif(not ANTLR_AVAILABLE, reason="ANTLR runtime or generated parser not available")
+
+# 1x is a typical home network
+BASE_LANDEVICES = 100
+BASE_ETHINTERFACES = 2
+BASE_CONNECTIONS = 5
+
+SCALES = [1, 10, 100]
+ROUNDS = {1: 20, 10: 5, 100: 3}
+
+_configs = {}
+
+
+def config_text(kind, scale):
+    key = (kind, scale)
+    if key not in _configs:
+        if kind == "ar7":
+            _configs[key] = generate_ar7_cfg(landevices=BASE_LANDEVICES * scale,
+                                             ethinterfaces=BASE_ETHINTERFACES * scale, seed=scale)
+        else:
+            _configs[key] = generate_vpn_cfg(connections=BASE_CONNECTIONS * scale, seed=scale)
+    return _configs[key]
+
+
+def run(benchmark, scale, function, setup=None):
+    benchmark.extra_info["scale"] = scale
+    if setup is None:
+        return benchmark.pedantic(function, rounds=ROUNDS[scale], warmup_rounds=1)
+    return benchmark.pedantic(function, setup=lambda: ((setup(),), {}), rounds=ROUNDS[scale], warmup_rounds=1)
+
+
+def antlr_tokens(text):
+    token_stream = CommonTokenStream(ConfigLexer(InputStream(text)))
+    token_stream.fill()
+    return token_stream
+
+
+@pytest.fixture(params=["ar7", "vpn"])
+def kind(request):
+    return request.param
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_fast_lex(benchmark, kind, scale):
+    text = config_text(kind, scale)
+    run(benchmark, scale, lambda: sum(1 for _ in ConfigTokenizer(text).tokens()))
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_fast_parse(benchmark, kind, scale):
+    text = config_text(kind, scale)
+    assert run(benchmark, scale, lambda: parse_config_string(text))
+
+
+@requires_antlr
+@pytest.mark.parametrize("scale", SCALES)
+def test_antlr_lex(benchmark, kind, scale):
+    text = config_text(kind, scale)
+    run(benchmark, scale, lambda: antlr_tokens(text))
+
+
+@requires_antlr
+@pytest.mark.parametrize("scale", SCALES)
+def test_antlr_parse(benchmark, kind, scale):
+    text = config_text(kind, scale)
+    run(benchmark, scale, _parse_antlr, setup=lambda: antlr_tokens(text))
+
+
+@requires_antlr
+@pytest.mark.parametrize("scale", SCALES)
+def test_antlr_visit(benchmark, kind, scale):
+    tree = _parse_antlr(antlr_tokens(config_text(kind, scale)))
+    assert run(benchmark, scale, lambda: ConfigJSONPrinter().visitConfig(tree))
+
+
+@pytest.mark.parametrize("scale", SCALES)
+def test_json_emit(benchmark, kind, scale):
+    config = parse_config_string(config_text(kind, scale))
+    run(benchmark, scale, lambda: config_to_json(config))
@@ -0,0 +1,217 @@
+#!/bin/python3
+
+import sys
+import json
+import hashlib
+import argparse
+from operator import itemgetter
+from collections import Counter
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+
+# Lists whose entries are matched by a natural key instead of their position,
+# so an inserted landevice shows up as one added entry and not as a change of
+# every following one. Sections with a single block are dicts and are
+# treated as a list with one entry.
+NATURAL_KEYS = {
+    ("landevices", "landevices"): "mac",
+    ("ar7cfg", "ethinterfaces"): "name",
+    ("vpncfg", "connections"): "name",
+}
+
+ADDED = "added"
+REMOVED = "removed"
+CHANGED = "changed"
+
+
+def subtree_hashes(config):
+    """Returns a dict mapping id() of every dict and list in config to a hash of its content.
+
+    Like a Merkle tree, the hash of a node is computed from the hashes of its
+    children, so hashing is linear in the size of the config and two subtrees
+    are compared in O(1).
+    """
+    hashes = {}
+    blake2b = hashlib.blake2b
+
+    def visit(node):
+        # Scalars go into their parent's hash input directly, repr() keeps 1, 1.0, '1' and True apart
+        if type(node) is dict:
+            items = sorted([(str(key), visit(value) if type(value) in (dict, list) else value)
+                            for key, value in node.items()], key=itemgetter(0))
+            digest = blake2b(repr(items).encode("utf-8"), digest_size=16, person=b"dict").digest()
+        else:
+            children = [visit(value) if type(value) in (dict, list) else value for value in node]
+            digest = blake2b(repr(children).encode("utf-8"), digest_size=16, person=b"list").digest()
+        hashes[id(node)] = digest
+        return digest
+
+    if type(config) in (dict, list):
+        visit(config)
+    return hashes
+
+
+def format_path(path):
+    text = ""
+    for part in path:
+        if isinstance(part, tuple):
+            text += f"[{part[0]}={part[1]}]"
+        elif isinstance(part, int):
+            text += f"[{part}]"
+        else:
+            text += ("." if text else "") + str(part)
+    return text
+
+
+class ConfigDiff:
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+        self.old_hashes = subtree_hashes(old)
+        self.new_hashes = subtree_hashes(new)
+        self.changes = []
+
+    def _same(self, old, new):
+        if isinstance(old, (dict, list)) and type(old) is type(new):
+            old_hash = self.old_hashes.get(id(old))
+            new_hash = self.new_hashes.get(id(new))
+            if old_hash is not None and new_hash is not None:
+                return old_hash == new_hash
+        return type(old) is type(new) and old == new
+
+    def _add(self, op, path, old=None, new=None):
+        change = {"op": op, "path": format_path(path)}
+        if op != ADDED:
+            change["old"] = old
+        if op != REMOVED:
+            change["new"] = new
+        self.changes.append(change)
+
+    def compare(self):
+        self._compare(self.old, self.new, [], ())
+        return self.changes
+
+    def _compare(self, old, new, path, names, entry=False):
+        """Compares two values found at names. entry is set for the entries of a
+        list, which share the names of the list itself."""
+        if self._same(old, new):
+            return
+        key = None if entry else NATURAL_KEYS.get(names)
+        if key is not None and isinstance(old, (dict, list)) and isinstance(new, (dict, list)):
+            self._compare_keyed(old if isinstance(old, list) else [old],
+                                new if isinstance(new, list) else [new], key, path, names)
+        elif isinstance(old, dict) and isinstance(new, dict):
+            self._compare_dicts(old, new, path, names)
+        elif isinstance(old, list) and isinstance(new, list):
+            self._compare_lists(old, new, path, names)
+        else:
+            self._add(CHANGED, path, old, new)
+
+    def _compare_dicts(self, old, new, path, names):
+        for name, value in old.items():
+            if name not in new:
+                self._add(REMOVED, path + [name], old=value)
+        for name, value in new.items():
+            if name not in old:
+                self._add(ADDED, path + [name], new=value)
+            else:
+                self._compare(old[name], value, path + [name], names + (name,))
+
+    def _compare_keyed(self, old, new, key, path, names):
+        old_entries = _index_by(old, key)
+        new_entries = _index_by(new, key)
+        if old_entries is None or new_entries is None:
+            # Missing or duplicate keys, fall back to positions
+            self._compare_lists(old, new, path, names)
+            return
+        for value, entry in old_entries.items():
+            if value not in new_entries:
+                self._add(REMOVED, path + [(key, value)], old=entry)
+        for value, entry in new_entries.items():
+            if value not in old_entries:
+                self._add(ADDED, path + [(key, value)], new=entry)
+            else:
+                self._compare(old_entries[value], entry, path + [(key, value)], names, entry=True)
+
+    def _compare_lists(self, old, new, path, names):
+        if not any(isinstance(value, (dict, list)) for value in old + new):
+            # Lists of values such as forwardrules: report the entries that were added or removed
+            removed = Counter(map(repr, old)) - Counter(map(repr, new))
+            added = Counter(map(repr, new)) - Counter(map(repr, old))
+            if not removed and not added:
+                self._add(CHANGED, path, old, new)
+                return
+            for index, value in enumerate(old):
+                if removed[repr(value)] > 0:
+                    removed[repr(value)] -= 1
+                    self._add(REMOVED, path + [index], old=value)
+            for index, value in enumerate(new):
+                if added[repr(value)] > 0:
+                    added[repr(value)] -= 1
+                    self._add(ADDED, path + [index], new=value)
+            return
+        for index, (old_value, new_value) in enumerate(zip(old, new)):
+            self._compare(old_value, new_value, path + [index], names, entry=True)
+        for index in range(len(new), len(old)):
+            self._add(REMOVED, path + [index], old=old[index])
+        for index in range(len(old), len(new)):
+            self._add(ADDED, path + [index], new=new[index])
+
+
+def _index_by(entries, key):
+    index = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or key not in entry:
+            return None
+        value = entry[key]
+        if isinstance(value, (dict, list)) or value in index:
+            return None
+        index[value] = entry
+    return index
+
+
+def diff_configs(old, new):
+    """Returns the differences between two parsed configs as a list of
+    {"op": "added"|"removed"|"changed", "path": ..., "old": ..., "new": ...} dicts."""
+    return ConfigDiff(old, new).compare()
+
+
+def format_change(change):
+    def value(v):
+        return json.dumps(v, separators=(",", ":"))
+
+    if change["op"] == ADDED:
+        return f"+ {change['path']}: {value(change['new'])}"
+    elif change["op"] == REMOVED:
+        return f"- {change['path']}: {value(change['old'])}"
+    else:
+        return f"~ {change['path']}: {value(change['old'])} -> {value(change['new'])}"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Shows the differences between two ar7.cfg/vpn.cfg exports")
+    add_config_loader_arguments(parser)
+    parser.add_argument("--section", action="append", metavar="PATH",
+                        help="Only compare this section, e.g. 'landevices.landevices'. Can be given multiple times")
+    parser.add_argument("--json", action="store_true", help="Print the differences as a JSON list")
+    parser.add_argument("old_file", help="Path to the older ar7.cfg or vpn.cfg file")
+    parser.add_argument("new_file", help="Path to the newer ar7.cfg or vpn.cfg file")
+    args = parser.parse_args(argv[1:])
+
+    try:
+        cache = config_cache_from_args(args)
+        old = load_config_file(args.old_file, backend=args.parser_backend, cache=cache, sections=args.section)
+        new = load_config_file(args.new_file, backend=args.parser_backend, cache=cache, sections=args.section)
+        changes = diff_configs(old, new)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return 2
+
+    if args.json:
+        print(json.dumps(changes, indent=2))
+    else:
+        for change in changes:
+            print(format_change(change))
+    return 1 if changes else 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,117 @@
+import sys
+import struct
+import marshal
+from collections.abc import Mapping
+
+# Compact binary form of a parsed config, for tools that read the result of
+# ar7_to_json.py again. Every top-level section is stored on its own with
+# marshal, behind an index of the sections, so a reader only decodes the
+# sections it accesses. Keys are interned before writing, marshal then stores
+# every distinct key once and the loaded dicts share the key strings.
+#
+# Layout:
+#   MAGIC
+#   header   format version, marshal version, length of the index (HEADER)
+#   index    marshal of a tuple of (name, offset, length), offsets relative
+#            to the end of the index
+#   sections marshal of each top-level section value
+#
+# marshal is specific to Python, other languages should read the JSON output.
+
+MAGIC = b"FB2OCFG\0"
+FORMAT_VERSION = 1
+MARSHAL_VERSION = 4
+HEADER = struct.Struct("<HHI")
+
+
+class BinaryConfigError(Exception):
+    pass
+
+
+def _intern_keys(value):
+    if isinstance(value, Mapping):
+        return {sys.intern(key) if type(key) is str else key: _intern_keys(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_intern_keys(item) for item in value]
+    return value
+
+
+def encode_binary_config(config):
+    """Returns the binary form of a parsed config as bytes."""
+    index = []
+    sections = []
+    offset = 0
+    for name, value in config.items():
+        data = marshal.dumps(_intern_keys(value), MARSHAL_VERSION)
+        index.append((name, offset, len(data)))
+        sections.append(data)
+        offset += len(data)
+    index = marshal.dumps(tuple(index), MARSHAL_VERSION)
+    return b''.join([MAGIC, HEADER.pack(FORMAT_VERSION, MARSHAL_VERSION, len(index)), index] + sections)
+
+
+def write_binary_config(config, out):
+    """Writes the binary form of a parsed config to a binary file object."""
+    out.write(encode_binary_config(config))
+
+
+class BinaryConfig(Mapping):
+    """Read-only mapping of the top-level sections of a binary config file.
+
+    Only the index is read when it is created, a section is read and decoded
+    on its first access.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic = f.read(len(MAGIC))
+            if magic != MAGIC:
+                raise BinaryConfigError(f"{path} is not a binary config file")
+            header = f.read(HEADER.size)
+            if len(header) != HEADER.size:
+                raise BinaryConfigError(f"{path} is truncated")
+            version, marshal_version, index_length = HEADER.unpack(header)
+            if version != FORMAT_VERSION:
+                raise BinaryConfigError(f"{path} has unsupported format version {version}")
+            self._index = {name: (offset, length) for name, offset, length in marshal.loads(f.read(index_length))}
+        self._data_start = len(MAGIC) + HEADER.size + index_length
+        self._sections = {}
+
+    def __getitem__(self, name):
+        section = self._sections.get(name)
+        if section is None:
+            offset, length = self._index[name]
+            with open(self.path, 'rb') as f:
+                f.seek(self._data_start + offset)
+                data = f.read(length)
+            if len(data) != length:
+                raise BinaryConfigError(f"{self.path} is truncated")
+            section = self._sections[name] = marshal.loads(data)
+        return section
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def section(self, path):
+        """Returns the value at a dotted path like 'ar7cfg.targets', decoding
+        only its top-level section. Raises KeyError if it does not exist."""
+        name, _, rest = path.partition('.')
+        value = self[name]
+        for part in rest.split('.') if rest else ():
+            value = value[part]
+        return value
+
+    def to_dict(self):
+        """Decodes all sections, the result equals the config that was written."""
+        return {name: self[name] for name in self._index}
+
+
+def load_binary_config(path):
+    return BinaryConfig(path).to_dict()
@@ -0,0 +1,135 @@
+import os
+import pickle
+import hashlib
+import tempfile
+import functools
+
+# On-disk cache for parsed configs. Entries are keyed by the SHA-256 of the
+# file content, the parser backend and the grammar version, so a changed
+# ar7.cfg, ConfigLexer.g4/ConfigParser.g4 or parser implementation never
+# returns a stale result. Values are stored as pickles, which load much
+# faster than parsing the config again.
+#
+# The parsed configs contain secrets such as the PPPoE password and the
+# WireGuard keys, so the directory is only accessible by the user (0700)
+# and the entries only readable by them (0600, as created by mkstemp).
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+# Files whose content determines the parse result
+GRAMMAR_FILES = (
+    "ConfigLexer.g4",
+    "ConfigParser.g4",
+    "ConfigFastParser.py",
+    "ConfigJSONPrinter.py",
+    "config_types.py",
+)
+
+
+def default_cache_dir():
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "fritzbox_to_opnsense")
+
+
+def make_private_dir(directory):
+    """Creates directory, or restricts an existing one, to the user."""
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if os.stat(directory).st_mode & 0o077:
+        os.chmod(directory, 0o700)
+
+
+@functools.lru_cache(maxsize=None)
+def grammar_version():
+    digest = hashlib.sha256()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in GRAMMAR_FILES:
+        digest.update(name.encode("utf-8"))
+        try:
+            with open(os.path.join(base, name), "rb") as f:
+                digest.update(f.read())
+        except FileNotFoundError:
+            digest.update(b"-")
+    return digest.hexdigest()[:16]
+
+
+class ConfigCache:
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory or default_cache_dir()
+        self.max_size = max_size
+
+    def key(self, data, *parts):
+        digest = hashlib.sha256(data)
+        digest.update(grammar_version().encode("ascii"))
+        for part in parts:
+            digest.update(b"\0" + str(part).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ".pickle")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Truncated or otherwise unreadable entry, parse again
+            self._remove(path)
+            return None
+        # Recently used entries are the last to be evicted
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        try:
+            make_private_dir(self.directory)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        except OSError:
+            # The cache is an optimization only, a read-only home must not break the scripts
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except OSError:
+            self._remove(tmp_path)
+            return
+        except BaseException:
+            # e.g. a value that cannot be pickled, no *.tmp file is left behind
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Removes the least recently used entries until the cache fits into max_size."""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".pickle"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        if os.path.isdir(self.directory):
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pickle"):
+                    self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,172 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+from ConfigEventParser import (
+    ConfigEventParser, iter_dict_events, BlockBuilder, ENTER_SECTION, EXIT_SECTION, VARIABLE, LIST_ITEM,
+)
+from ConfigFastParser import ConfigTokenizer, map_config_file
+
+# Writes parsed configs as JSON from the events of ConfigEventParser, while
+# the config is being parsed. The output starts right away and the memory
+# needed does not grow with the size of the config. Formats:
+#   json     indented exactly like json.dumps(config, indent=2)
+#   compact  JSON without whitespace
+#   ndjson   one JSON object per line and record, see write_ndjson_events()
+
+OUTPUT_FORMATS = ("json", "compact", "ndjson")
+
+# Sections whose blocks are written as one NDJSON line each
+RECORD_SECTIONS = ("landevices.landevices", "ar7cfg.ethinterfaces", "vpncfg.connections")
+
+# Number of output parts collected before they are written
+_FLUSH_PARTS = 4096
+
+
+def _repeated_name(name, path):
+    return ValueError(f"'{name}' occurs more than once in {'.'.join(path) or 'the config'}, "
+                      "which cannot be written while parsing")
+
+
+def write_json_events(events, out, indent=2):
+    """Writes the events of a ConfigEventParser with lookahead as a JSON
+    document, indented by indent or compact if indent is None.
+
+    A name that occurs more than once in a block raises a ValueError: the
+    parsers keep it where it occurs first, with the last value, or add the
+    following sections to the one written before, which is already out.
+    """
+    key_separator = ': ' if indent is not None else ':'
+    separators = (',', key_separator)
+    dumps = json.dumps
+    encode = encode_basestring_ascii
+    parts = ['{']
+    # Open containers, a list per container: [is_array, has_items, names],
+    # names is the set of names written to an object
+    stack = [[False, False, set()]]
+
+    def item():
+        container = stack[-1]
+        separator = ',' if container[1] else ''
+        container[1] = True
+        if indent is None:
+            return separator
+        return separator + '\n' + ' ' * (indent * len(stack))
+
+    def close():
+        is_array, has_items, _ = stack.pop()
+        bracket = ']' if is_array else '}'
+        if indent is None or not has_items:
+            return bracket
+        return '\n' + ' ' * (indent * len(stack)) + bracket
+
+    for kind, path, name, value, index in events:
+        # A list of sections ends with anything but its next block
+        if stack[-1][0] and kind != LIST_ITEM and not (kind == ENTER_SECTION and index):
+            parts.append(close())
+        if kind == VARIABLE:
+            # Strings and ints are by far the most common values, encoded
+            # directly they are much faster than with json.dumps()
+            value_type = type(value)
+            if value_type is str:
+                text = encode(value)
+            elif value_type is int:
+                text = int.__repr__(value)
+            else:
+                text = dumps(value, indent=indent, separators=separators)
+                if indent is not None and value_type is list:
+                    text = text.replace('\n', '\n' + ' ' * (indent * len(stack)))
+            names = stack[-1][2]
+            if name in names:
+                raise _repeated_name(name, path)
+            names.add(name)
+            parts.append(item() + encode(name) + key_separator + text)
+        elif kind == ENTER_SECTION:
+            if index == 0:
+                if value is None:
+                    raise ValueError("write_json_events() needs the events of a ConfigEventParser with lookahead")
+                names = stack[-1][2]
+                if path[-1] in names:
+                    raise _repeated_name(path[-1], path[:-1])
+                names.add(path[-1])
+                parts.append(item() + encode(path[-1]) + key_separator)
+                if value:
+                    parts.append('[')
+                    stack.append([True, False, None])
+            parts.append(item() + '{' if stack[-1][0] else '{')
+            stack.append([False, False, set()])
+        elif kind == EXIT_SECTION:
+            parts.append(close())
+        if len(parts) > _FLUSH_PARTS:
+            out.write(''.join(parts))
+            parts.clear()
+    while stack:
+        parts.append(close())
+    out.write(''.join(parts))
+
+
+def write_ndjson_events(events, out, records=RECORD_SECTIONS):
+    """Writes one JSON object per line for every block of the sections in
+    records, e.g. one per landevice, as soon as the block has been parsed:
+
+        {"path": "landevices.landevices", "index": 0, "value": {...}}
+
+    Everything else is written as one line per top-level section block,
+    {"path": "ar7cfg", "index": 0, "value": {...}}, without the records.
+    This line follows the records of the section.
+    """
+    records = {tuple(record.split('.')) for record in records}
+    dumps = json.dumps
+    # Builds the current record or the rest of the current top-level block
+    record = None
+    record_depth = None
+    rest = None
+    for event in events:
+        kind = event.kind
+        path = event.path
+        if record is not None:
+            if kind == EXIT_SECTION and len(path) == record_depth:
+                out.write(dumps({"path": '.'.join(path), "index": event.index, "value": record.root}) + '\n')
+                record = None
+            else:
+                record.feed(event)
+        elif kind == ENTER_SECTION and path in records:
+            record = BlockBuilder()
+            record_depth = len(path)
+        elif len(path) == 1 and kind == ENTER_SECTION:
+            rest = BlockBuilder()
+        elif len(path) == 1 and kind == EXIT_SECTION:
+            out.write(dumps({"path": path[0], "index": event.index, "value": rest.root}) + '\n')
+            rest = None
+        elif kind != LIST_ITEM:
+            rest.feed(event)
+
+
+def write_config_events(events, out, output_format="json"):
+    """Writes the events of a ConfigEventParser in one of the OUTPUT_FORMATS.
+    json and compact need a parser with lookahead."""
+    if output_format == "ndjson":
+        write_ndjson_events(events, out)
+    else:
+        write_json_events(events, out, indent=2 if output_format == "json" else None)
+        out.write('\n')
+
+
+def write_config(config, out, output_format="json"):
+    """Writes an already parsed config in one of the OUTPUT_FORMATS."""
+    if output_format == "ndjson":
+        write_ndjson_events(iter_dict_events(config), out)
+    elif output_format == "compact":
+        json.dump(config, out, separators=(',', ':'))
+        out.write('\n')
+    else:
+        json.dump(config, out, indent=2)
+        out.write('\n')
+
+
+def stream_config_file(path, out, output_format="json"):
+    """Parses a config file with the fast tokenizer and writes it in one of
+    the OUTPUT_FORMATS while parsing. The file is mapped into memory, which
+    the lookahead for lists of sections needs."""
+    with map_config_file(path) as data:
+        parser = ConfigEventParser(ConfigTokenizer(data), lookahead=output_format != "ndjson")
+        write_config_events(parser.events(), out, output_format)
@@ -0,0 +1,175 @@
+import json
+from profiling import phase
+
+PARSER_BACKENDS = ("fast", "antlr")
+
+
+def add_config_loader_arguments(parser):
+    parser.add_argument("--parser-backend", choices=PARSER_BACKENDS, default="fast",
+                        help="Config parser implementation: hand-written 'fast' parser or the generated 'antlr' parser (default: fast)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Do not use the on-disk cache of parsed configs")
+    parser.add_argument("--dfa-cache", action="store_true",
+                        help="Keep the prediction DFAs of the antlr backend on disk, so they are not rebuilt on every run")
+
+
+def config_cache_from_args(args):
+    """Returns the ConfigCache selected by the arguments. Also enables the
+    DFA cache of the antlr backend if it was requested."""
+    if getattr(args, "dfa_cache", False) and args.parser_backend == "antlr":
+        from antlr_dfa_cache import enable_dfa_cache
+        enable_dfa_cache()
+    if args.no_cache:
+        return None
+    from config_cache import ConfigCache
+    return ConfigCache()
+
+
+def _parse_antlr(token_stream, profiler=None):
+    from antlr4.atn.PredictionMode import PredictionMode
+    from antlr4.error.ErrorListener import ConsoleErrorListener
+    from antlr4.error.ErrorStrategy import BailErrorStrategy, DefaultErrorStrategy
+    from antlr4.error.Errors import ParseCancellationException
+    from ConfigParser import ConfigParser
+
+    parser = ConfigParser(token_stream)
+
+    # Two-stage parsing: SLL prediction is much cheaper than full LL and
+    # sufficient for valid configs. Only if it fails, either because of a
+    # syntax error or an SLL conflict, the input is parsed again with full
+    # LL prediction and the default error reporting and recovery.
+    parser._interp.predictionMode = PredictionMode.SLL
+    parser.removeErrorListeners()
+    parser._errHandler = BailErrorStrategy()
+    if profiler is not None:
+        profiler.attach(parser)
+    try:
+        return parser.config()
+    except ParseCancellationException:
+        if profiler is not None:
+            profiler.ll_fallback = True
+        parser.reset()
+        parser.addErrorListener(ConsoleErrorListener.INSTANCE)
+        parser._errHandler = DefaultErrorStrategy()
+        parser._interp.predictionMode = PredictionMode.LL
+        return parser.config()
+
+
+def _load_antlr(input_stream, profiler=None, value_converter=None):
+    from antlr4 import CommonTokenStream
+    from ConfigLexer import ConfigLexer
+    from ConfigJSONPrinter import ConfigJSONPrinter
+
+    # The token stream keeps all tokens anyway, filling it up front only
+    # separates the lexing from the parsing time
+    with phase("lex"):
+        token_stream = CommonTokenStream(ConfigLexer(input_stream))
+        token_stream.fill()
+    with phase("parse"):
+        tree = _parse_antlr(token_stream, profiler=profiler)
+    with phase("visit"):
+        printer = ConfigJSONPrinter(value_converter=value_converter)
+        return printer.visitConfig(tree)
+
+
+def select_sections(config, tree):
+    """Keeps only the paths of a section_tree() in a parsed config."""
+    if tree is None:
+        return config
+    if isinstance(config, list):
+        return [select_sections(item, tree) for item in config]
+    if not isinstance(config, dict):
+        return None
+    selected = {}
+    for name, subtree in tree.items():
+        if name in config:
+            value = select_sections(config[name], subtree)
+            if value is not None:
+                selected[name] = value
+    return selected
+
+
+def load_config_string(text, backend="fast", sections=None, profiler=None, typed=False):
+    """Parses an ar7.cfg/vpn.cfg document and returns it as dicts and lists.
+
+    text is a str or a bytes-like object such as the mapping of
+    ConfigFastParser.map_config_file(), which both backends lex in place.
+
+    sections is an optional iterable of dotted paths such as
+    'ar7cfg.targets'. Only those parts of the config are returned, and
+    the fast backend skips everything else without parsing it.
+
+    profiler is an optional antlr_profiler.DecisionProfiler that records
+    the prediction statistics of the antlr backend.
+
+    With typed, values are converted into ipaddress objects, MAC addresses,
+    durations and booleans and sections into Records, see config_types.
+    """
+    if typed:
+        from config_types import convert_typed_value, to_records
+        config = _load_config_string(text, backend, sections, profiler, convert_typed_value)
+        with phase("records"):
+            return to_records(config)
+    return _load_config_string(text, backend, sections, profiler, None)
+
+
+def _load_config_string(text, backend, sections, profiler, value_converter):
+    if backend == "fast":
+        from ConfigFastParser import parse_config_string, convert_value
+        with phase("parse"):
+            return parse_config_string(text, sections=sections, value_converter=value_converter or convert_value)
+    elif backend == "antlr":
+        if sections is None:
+            return _load_antlr(_antlr_input_stream(text), profiler=profiler, value_converter=value_converter)
+        from ConfigFastParser import filter_top_level_sections, section_tree
+        tree = section_tree(sections)
+        with phase("filter"):
+            text = filter_top_level_sections(text, tree)
+        return select_sections(_load_antlr(_antlr_input_stream(text), profiler=profiler,
+                                           value_converter=value_converter), tree)
+    else:
+        raise ValueError(f"Unsupported parser backend: {backend}")
+
+
+def _antlr_input_stream(text):
+    if isinstance(text, str):
+        from antlr4 import InputStream
+        return InputStream(text)
+    from MmapInputStream import MmapInputStream
+    return MmapInputStream(data=text)
+
+
+def load_config_file(path, backend="fast", cache=None, sections=None, profiler=None, typed=False):
+    """Parses an ar7.cfg/vpn.cfg file and returns it as dicts and lists.
+
+    With a ConfigCache, a file that has been parsed before is loaded from
+    the cache instead of being parsed again. A profiler disables the cache,
+    the config has to be parsed to be profiled.
+    """
+    with phase("load"):
+        return _load_config_file(path, backend, cache, sections, profiler, typed)
+
+
+def _load_config_file(path, backend, cache, sections, profiler, typed):
+    from ConfigFastParser import map_config_file
+
+    # The file is mapped once, the cache key is the hash of the mapping and
+    # a cache miss lexes the same mapping instead of a decoded copy
+    with map_config_file(path) as data:
+        key = None
+        if cache is not None and profiler is None:
+            with phase("cache"):
+                key = cache.key(data, backend, sorted(sections) if sections is not None else None, typed)
+                config = cache.get(key)
+            if config is not None:
+                return config
+        config = load_config_string(data, backend=backend, sections=sections, profiler=profiler, typed=typed)
+    if key is not None:
+        with phase("cache"):
+            cache.put(key, config)
+    return config
+
+
+def config_to_json(config, indent=2):
+    with phase("json"):
+        return json.dumps(config, indent=indent)
@@ -0,0 +1,114 @@
+import functools
+from collections.abc import Mapping
+
+# Queries over parsed configs. ConfigQuery answers the filters the scripts
+# need, e.g. the landevices with staticlease = yes, from hash indexes that are
+# built on first use, so every further lookup on the same fields is a dict
+# access instead of a scan. jsonpath and jmespath expressions are compiled
+# once per process and their results are cached per config.
+#
+# A config is treated as read-only once a ConfigQuery has been created for it,
+# the indexes are not updated when it changes.
+
+
+@functools.lru_cache(maxsize=None)
+def compile_jsonpath(expression):
+    import jsonpath_ng.ext
+    return jsonpath_ng.ext.parse(expression)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_jmespath(expression):
+    import jmespath
+    return jmespath.compile(expression)
+
+
+def _index_key(value):
+    # Variables with several values are lists, which cannot be dict keys
+    return tuple(value) if isinstance(value, list) else value
+
+
+class ConfigQuery:
+    def __init__(self, config):
+        self.config = config
+        self._records = {}
+        self._indexes = {}
+        self._results = {}
+
+    def section(self, path):
+        """Returns the value at a dotted path like 'vpncfg.global', or None."""
+        value = self.config
+        for name in path.split('.'):
+            if not isinstance(value, Mapping) or name not in value:
+                return None
+            value = value[name]
+        return value
+
+    def records(self, path):
+        """Returns the blocks of the section at path as a list.
+
+        A section with one block is a dict in the parsed config and a list
+        with more blocks, here it is always a list, empty if it is missing.
+        """
+        records = self._records.get(path)
+        if records is None:
+            value = self.section(path)
+            if value is None:
+                records = []
+            elif isinstance(value, Mapping):
+                records = [value]
+            else:
+                records = [record for record in value if isinstance(record, Mapping)]
+            self._records[path] = records
+        return records
+
+    def index(self, path, *fields):
+        """Returns a dict from the values of fields to the list of blocks of
+        the section at path with these values, built on the first call.
+        Blocks without a field are indexed under None for it."""
+        key = (path, fields)
+        index = self._indexes.get(key)
+        if index is None:
+            index = {}
+            if len(fields) == 1:
+                field = fields[0]
+                for record in self.records(path):
+                    index.setdefault(_index_key(record.get(field)), []).append(record)
+            else:
+                for record in self.records(path):
+                    values = tuple(_index_key(record.get(field)) for field in fields)
+                    index.setdefault(values, []).append(record)
+            self._indexes[key] = index
+        return index
+
+    def where(self, path, **criteria):
+        """Returns the blocks of the section at path whose fields equal the
+        keyword arguments, in config order, e.g.
+        where('landevices.landevices', staticlease='yes')."""
+        if not criteria:
+            return self.records(path)
+        fields = tuple(sorted(criteria))
+        if len(fields) == 1:
+            key = _index_key(criteria[fields[0]])
+        else:
+            key = tuple(_index_key(criteria[field]) for field in fields)
+        return self.index(path, *fields).get(key, [])
+
+    def first(self, path, **criteria):
+        """Returns the first block matching where(), or None."""
+        matches = self.where(path, **criteria)
+        return matches[0] if matches else None
+
+    def jsonpath(self, expression):
+        """Returns the values matched by a jsonpath_ng.ext expression."""
+        key = ('jsonpath', expression)
+        if key not in self._results:
+            self._results[key] = [match.value for match in compile_jsonpath(expression).find(self.config)]
+        return self._results[key]
+
+    def jmespath(self, expression):
+        """Returns the result of a jmespath expression."""
+        key = ('jmespath', expression)
+        if key not in self._results:
+            self._results[key] = compile_jmespath(expression).search(self.config)
+        return self._results[key]
@@ -0,0 +1,243 @@
+import re
+import socket
+import keyword
+import ipaddress
+from collections.abc import Mapping
+
+from ConfigFastParser import convert_value
+
+# Typed value model for parsed configs. In typed mode the parser converts
+# value tokens directly into Python objects instead of strings:
+# - IPV4_ADDRESS/IPV6_ADDRESS become ipaddress.IPv4Address/IPv6Address
+# - MAC_ADDRESS becomes a MacAddress, an int that is formatted on demand
+# - TIME_* becomes a Duration, an int holding seconds that remembers its unit
+# - the identifiers yes and no become True and False
+# and every section block becomes a Record with __slots__ instead of a dict.
+# to_plain() converts a typed config back into the structure and strings
+# ConfigJSONPrinter produces. Values written differently than str() formats
+# them, like a lowercase MAC address, 05m or an uncompressed IPv6 address,
+# keep their original text in the attribute text for it.
+
+
+class MacAddress(int):
+    # No __slots__, int subclasses cannot have any. The __dict__ is only
+    # created for the values that keep their text.
+
+    def __new__(cls, value):
+        text = value if isinstance(value, str) else None
+        if text is not None:
+            value = int(value.replace(':', '').replace('-', ''), 16)
+        if not 0 <= value < 1 << 48:
+            raise ValueError(f"{value!r} is not a 48-bit MAC address")
+        self = super().__new__(cls, value)
+        if text is not None and text != str(self):
+            self.text = text
+        return self
+
+    def __str__(self):
+        text = f"{int(self):012X}"
+        return ':'.join(text[i:i + 2] for i in range(0, 12, 2))
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+    def __repr__(self):
+        return f"MacAddress('{self}')"
+
+
+class Duration(int):
+    """A duration in seconds that is formatted in the unit it was written with."""
+    unit = 's'
+    factor = 1
+
+    @staticmethod
+    def from_text(text):
+        cls = _DURATION_UNITS[text[-1]]
+        value = cls(int(text[:-1]) * cls.factor)
+        if text != str(value):
+            value.text = text
+        return value
+
+    def __str__(self):
+        return f"{int(self) // self.factor}{self.unit}"
+
+    def __format__(self, spec):
+        return format(str(self), spec)
+
+    def __repr__(self):
+        return f"{type(self).__name__}('{self}')"
+
+
+class Seconds(Duration):
+    pass
+
+
+class Minutes(Duration):
+    unit = 'm'
+    factor = 60
+
+
+class Hours(Duration):
+    unit = 'h'
+    factor = 60 * 60
+
+
+class Days(Duration):
+    unit = 'd'
+    factor = 24 * 60 * 60
+
+
+class Weeks(Duration):
+    unit = 'w'
+    factor = 7 * 24 * 60 * 60
+
+
+_DURATION_UNITS = {cls.unit: cls for cls in (Seconds, Minutes, Hours, Days, Weeks)}
+
+
+# The lexer already validated the syntax, so inet_pton is used instead of
+# the much slower string parsing of the ipaddress constructors.
+def _ipv4_address(text):
+    return ipaddress.IPv4Address(int.from_bytes(socket.inet_pton(socket.AF_INET, text), 'big'))
+
+
+class _IPv6AddressText(ipaddress.IPv6Address):
+    """An IPv6Address that keeps the text it was written with."""
+    __slots__ = ('text',)
+
+    def __init__(self, address, text):
+        super().__init__(address)
+        self.text = text
+
+    def __reduce__(self):
+        return type(self), (self._ip, self.text)
+
+    def __repr__(self):
+        return f"IPv6Address('{self}')"
+
+
+def _ipv6_address(text):
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, text), 'big')
+    except OSError:
+        # IPV6_ADDRESS also matches things like 10:30 that are no complete address
+        return text
+    address = ipaddress.IPv6Address(value)
+    if str(address) != text:
+        return _IPv6AddressText(value, text)
+    return address
+
+
+_TYPED_CONVERTERS = {
+    'IPV4_ADDRESS': _ipv4_address,
+    'IPV6_ADDRESS': _ipv6_address,
+    'MAC_ADDRESS': MacAddress,
+    'TIME_SECONDS': Duration.from_text,
+    'TIME_MINUTES': Duration.from_text,
+    'TIME_HOURS': Duration.from_text,
+    'TIME_DAYS': Duration.from_text,
+    'TIME_WEEKS': Duration.from_text,
+}
+
+_BOOLEANS = {'yes': True, 'no': False}
+
+
+def convert_typed_value(token_type, text):
+    """Value converter for ConfigFastParser and ConfigJSONPrinter in typed mode."""
+    converter = _TYPED_CONVERTERS.get(token_type)
+    if converter is not None:
+        return converter(text)
+    if token_type == 'IDENTIFIER' or token_type == 'BOOLEAN':
+        return _BOOLEANS.get(text, text)
+    return convert_value(token_type, text)
+
+
+class Record(Mapping):
+    """Read-only mapping for a section block, with the values stored in
+    __slots__. Keys that are valid identifiers are also attributes, e.g.
+    landevice.ip. One class is created per distinct key set."""
+    __slots__ = ()
+    _keys = ()
+    _slot_of = {}
+
+    def __getitem__(self, key):
+        try:
+            slot = self._slot_of[key]
+        except (KeyError, TypeError):
+            raise KeyError(key) from None
+        return getattr(self, slot)
+
+    def __contains__(self, key):
+        try:
+            return key in self._slot_of
+        except TypeError:
+            return False
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __repr__(self):
+        return "Record({" + ", ".join(f"{key!r}: {value!r}" for key, value in self.items()) + "})"
+
+    def __reduce__(self):
+        return _make_record, (self._keys, tuple(getattr(self, slot) for slot in self.__slots__))
+
+
+_RECORD_CLASSES = {}
+_RESERVED = frozenset(dir(Record))
+_IDENTIFIER_RE = re.compile(r'[a-zA-Z][a-zA-Z0-9_]*\Z')
+
+
+def record_class(keys):
+    """Returns the Record class for a tuple of keys."""
+    cls = _RECORD_CLASSES.get(keys)
+    if cls is None:
+        slots = []
+        for index, key in enumerate(keys):
+            if isinstance(key, str) and _IDENTIFIER_RE.match(key) and not keyword.iskeyword(key) and key not in _RESERVED:
+                slots.append(key)
+            else:
+                slots.append(f"_field{index}")
+        cls = type("Record", (Record,), {
+            "__slots__": tuple(slots),
+            "_keys": keys,
+            "_slot_of": dict(zip(keys, slots)),
+        })
+        _RECORD_CLASSES[keys] = cls
+    return cls
+
+
+def _make_record(keys, values):
+    cls = record_class(keys)
+    record = cls.__new__(cls)
+    for slot, value in zip(record.__slots__, values):
+        setattr(record, slot, value)
+    return record
+
+
+def to_records(config):
+    """Replaces the dicts of a parsed config with Records."""
+    if isinstance(config, dict):
+        return _make_record(tuple(config), [to_records(value) for value in config.values()])
+    if isinstance(config, list):
+        return [to_records(value) for value in config]
+    return config
+
+
+def to_plain(config):
+    """Converts a typed config into plain dicts, lists, strings and numbers,
+    exactly as produced without typed mode."""
+    if isinstance(config, Mapping):
+        return {key: to_plain(value) for key, value in config.items()}
+    if isinstance(config, list):
+        return [to_plain(value) for value in config]
+    if config is True:
+        return 'yes'
+    if config is False:
+        return 'no'
+    if isinstance(config, (MacAddress, Duration, ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        return getattr(config, 'text', None) or str(config)
+    return config
@@ -0,0 +1,38 @@
+#!/bin/python3
+
+import sys
+import argparse
+import importlib
+
+# Single entry point for the migration scripts. The script of a command is
+# only imported when the command is run, so listing the commands does not
+# load the parsers, the ANTLR runtime or requests.
+
+COMMANDS = {
+    "to-json": ("ar7_to_json", "Convert an ar7.cfg/vpn.cfg file to JSON"),
+    "dhcp": ("ar7_dhcp4_to_opnsense_kea", "Migrate DHCP subnets and static leases to OPNsense Kea"),
+    "pppoe": ("ar7_telekom_to_opnsense_pppoe", "Configure the OPNsense WAN interface for Telekom PPPoE"),
+    "wireguard": ("vpn_wireguard_to_opnsense", "Migrate WireGuard connections to OPNsense"),
+    "portforward": ("ar7_port_forwarding_to_opnsense", "Convert port forwarding rules for OPNsense"),
+    "clean-kea": ("clean_opnsense_kea_dhcpv4", "Delete all Kea DHCPv4 reservations and subnets in OPNsense"),
+}
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(
+        description="Migrates a FritzBox configuration to OPNsense",
+        epilog="Run '%(prog)s COMMAND --help' for the options of a command.")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND", required=True)
+    for name, (_, description) in COMMANDS.items():
+        # The options are parsed by the script of the command
+        commands.add_parser(name, help=description, add_help=False)
+    args = parser.parse_args(argv[1:2])
+    module = importlib.import_module(COMMANDS[args.command][0])
+
+    # The usage of the script then shows the command, e.g. 'fritzbox2opnsense.py dhcp'
+    sys.argv = [f"{argv[0]} {args.command}"] + argv[2:]
+    return module.main(sys.argv)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,114 @@
+import os
+import copy
+import json
+import time
+import hashlib
+import tempfile
+
+from config_cache import default_cache_dir, make_private_dir
+
+# Cache for the responses of read-only OPNsense GET endpoints. Only endpoints
+# with a TTL are cached, the TTL of an endpoint is the one of the longest
+# matching prefix in DEFAULT_TTLS or the cache_ttl setting of config.json,
+# e.g. {"interfaces/overview/": 300} (0 disables caching). A write to an API
+# module (the first part of the endpoint, e.g. interfaces in
+# interfaces/vlan_settings/addItem) removes all cached responses of that
+# module, the next GET asks the firewall again.
+#
+# With "response_cache": true in config.json, the responses are also kept
+# in a file in the cache directory of the parsed configs, one per firewall
+# and API key, so the next script run does not ask for them again while
+# their TTL lasts.
+
+DEFAULT_TTLS = {
+    # Changes with a firmware update only
+    'core/firmware/status': 3600,
+    'interfaces/overview/interfacesInfo': 60,
+}
+
+
+def _module(endpoint):
+    return endpoint.split('/', 1)[0] + '/'
+
+
+class ResponseCache:
+    def __init__(self, ttls=None, path=None):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.path = path
+        # endpoint: (expiry as time.time(), response)
+        self._entries = {}
+        self._dirty = False
+        if path is not None:
+            self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        path = None
+        if config.get('response_cache'):
+            key = hashlib.sha256(f"{config['url']}\0{config['api_key']}".encode("utf-8")).hexdigest()[:16]
+            path = os.path.join(default_cache_dir(), f"opnsense-{key}.json")
+        return cls(config.get('cache_ttl'), path)
+
+    def ttl(self, endpoint):
+        prefixes = [prefix for prefix in self.ttls if endpoint.startswith(prefix)]
+        return self.ttls[max(prefixes, key=len)] if prefixes else 0
+
+    def get(self, endpoint):
+        """Returns a copy of the cached response or None."""
+        entry = self._entries.get(endpoint)
+        if entry is None:
+            return None
+        expiry, response = entry
+        if expiry <= time.time():
+            self.invalidate(endpoint)
+            return None
+        # Callers may modify the response
+        return copy.deepcopy(response)
+
+    def put(self, endpoint, response):
+        ttl = self.ttl(endpoint)
+        if ttl > 0:
+            self._entries[endpoint] = (time.time() + ttl, copy.deepcopy(response))
+            self._dirty = True
+
+    def invalidate(self, prefix=''):
+        """Removes the cached responses of all endpoints starting with prefix."""
+        for endpoint in [endpoint for endpoint in self._entries if endpoint.startswith(prefix)]:
+            del self._entries[endpoint]
+            self._dirty = True
+
+    def invalidate_module(self, endpoint):
+        """Removes the cached responses of the API module of endpoint, called
+        after a write to it."""
+        self.invalidate(_module(endpoint))
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+            now = time.time()
+            self._entries = {endpoint: (expiry, response) for endpoint, (expiry, response) in entries.items()
+                             if expiry > now}
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, TypeError, AttributeError):
+            # Unreadable, the responses are requested again
+            self._entries = {}
+
+    def save(self):
+        if self.path is None or not self._dirty:
+            return
+        now = time.time()
+        entries = {endpoint: [expiry, response] for endpoint, (expiry, response) in self._entries.items()
+                   if expiry > now}
+        try:
+            directory = os.path.dirname(self.path)
+            make_private_dir(directory)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            # Like the config cache, this is an optimization only
+            return
+        self._dirty = False
@@ -0,0 +1,534 @@
+import re
+import sys
+import atexit
+import json
+import time
+import uuid
+import random
+import asyncio
+from urllib.parse import urlencode
+from email.utils import parsedate_to_datetime
+from concurrent.futures import Future, ThreadPoolExecutor
+from profiling import phase
+from progress import Progress
+from opnsense_cache import ResponseCache
+
+# Client for the OPNsense REST API shared by the migration scripts. All calls
+# go through one requests.Session, which authenticates every request with the
+# API key and secret and keeps the connections to the firewall open, so only
+# the first call pays for the TCP and TLS handshake.
+#
+# Optional settings in config.json:
+#   timeout    seconds to wait for a connection and for a response, either
+#              one number or [connect, read] (default: [5, 60])
+#   pool_size  number of connections kept open (default: 10)
+#   retries    how often a failed request is repeated (default: 4)
+#   backoff    seconds to wait before the first retry, doubled for every
+#              further one up to max_backoff (default: 0.5)
+#   max_backoff  longest wait between two retries (default: 30)
+#   cache_ttl, response_cache  see opnsense_cache.py
+#
+# iter_search() reads the rows of a searchX endpoint page by page with the
+# current, rowCount and searchPhrase parameters of the OPNsense grids and
+# requests the next page while the caller processes the current one.
+#
+# Responses of GET endpoints that rarely change, like the firmware status
+# and the interface list, are cached for the lifetime of the client. probe()
+# reads the firmware status once and is what the scripts print as version.
+#
+# A busy firewall answers with 502, 503 or 504 or not at all, an API rate
+# limit with 429. Such requests are repeated after a random part of the
+# backoff, or after the time in the Retry-After header if the firewall sends
+# one. Only idempotent requests are repeated after the firewall may have
+# processed them, an addX that timed out could otherwise create its item
+# twice. Requests the firewall refused (429, 503) or never received (no
+# connection) are always repeated. When all retries fail, OPNsenseError is
+# raised.
+#
+# AsyncOPNsenseClient is the asyncio variant on httpx, which is only needed
+# for --concurrency. It sends independent creates such as the reservations
+# of all landevices in parallel. --concurrency is the upper limit, the
+# AdaptiveLimiter lowers it when responses get slower or fail and raises it
+# again while the firewall keeps up.
+
+DEFAULT_TIMEOUT = (5, 60)
+DEFAULT_POOL_SIZE = 10
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 0.5
+DEFAULT_MAX_BACKOFF = 30
+DEFAULT_PAGE_SIZE = 500
+
+# Responses of an overloaded firewall or a rate limit
+RETRY_STATUS = (429, 502, 503, 504)
+# Responses that mean the request was refused without being processed
+REFUSED_STATUS = (429, 503)
+# POST actions that can be repeated without changing the result, the action
+# is the third part of the endpoint, e.g. delReservation in
+# kea/dhcpv4/delReservation/<uuid>
+IDEMPOTENT_ACTIONS = re.compile(r"^(get|search|del)\w*$|^(reconfigure|apply)$")
+# Edits of one item, e.g. kea/dhcpv4/setReservation/<uuid>. The set of a
+# whole model is not repeated, OPNsense stores the items it adds under new
+# uuids each time.
+ITEM_EDIT_ACTIONS = re.compile(r"^set\w+$")
+
+
+class OPNsenseError(Exception):
+    """A request to OPNsense failed, status is the HTTP status of the last
+    response or None if there was none."""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def is_idempotent(method, endpoint):
+    if method == 'GET':
+        return True
+    parts = endpoint.split('/')
+    if len(parts) < 3:
+        return False
+    if ITEM_EDIT_ACTIONS.match(parts[2]) is not None:
+        return len(parts) > 3 and parts[3] != ''
+    return IDEMPOTENT_ACTIONS.match(parts[2]) is not None
+
+
+def search_endpoint(endpoint, page, page_size, phrase=None):
+    """Returns endpoint with the paging parameters of an OPNsense search."""
+    parameters = {"current": page, "rowCount": page_size}
+    if phrase:
+        parameters["searchPhrase"] = phrase
+    return f"{endpoint}?{urlencode(parameters)}"
+
+
+def parse_retry_after(value):
+    """Returns the seconds to wait from a Retry-After header, which is either
+    a number of seconds or an HTTP date, or None."""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    def __init__(self, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=DEFAULT_MAX_BACKOFF):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.get('retries', DEFAULT_RETRIES),
+                   config.get('backoff', DEFAULT_BACKOFF),
+                   config.get('max_backoff', DEFAULT_MAX_BACKOFF))
+
+    def should_retry(self, attempt, idempotent, status=None, sent=True):
+        """Whether to repeat a request that failed with the HTTP status, or
+        without a response if status is None. sent is False if the
+        connection could not be established."""
+        if attempt >= self.retries:
+            return False
+        if status is None:
+            return idempotent or not sent
+        return status in REFUSED_STATUS or (idempotent and status in RETRY_STATUS)
+
+    def delay(self, attempt, retry_after=None):
+        # Full jitter, clients that failed together do not retry together
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class AdaptiveLimiter:
+    """Concurrency limit with additive increase and multiplicative decrease.
+
+    Every successful response below twice the lowest latency seen raises the
+    limit by 1/limit, about one more request in flight per round trip, up to
+    max_limit. A slower response, a retryable error or a timeout halves it, at
+    most once per round trip since the requests in flight report the same
+    congestion.
+    """
+
+    LATENCY_TOLERANCE = 2.0
+
+    def __init__(self, max_limit, min_limit=1):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self.min_latency = None
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency=None, overloaded=False):
+        async with self._condition:
+            self.in_flight -= 1
+            self.update(latency, overloaded)
+            self._condition.notify_all()
+
+    def update(self, latency=None, overloaded=False):
+        if latency is not None and not overloaded:
+            if self.min_latency is None or latency < self.min_latency:
+                self.min_latency = latency
+            overloaded = latency > self.LATENCY_TOLERANCE * self.min_latency
+        if overloaded:
+            now = time.monotonic()
+            if now - self._last_decrease > (self.min_latency or 0):
+                self.limit = max(self.min_limit, self.limit / 2)
+                self._last_decrease = now
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+
+def load_config(config_file):
+    if config_file is None:
+        config_file = "config.json"
+    try:
+        with open(config_file, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Error: Config file '{config_file}' not found.")
+        sys.exit(1)
+    except json.JSONDecodeError:
+        print(f"Error: Invalid JSON in config file '{config_file}'.")
+        sys.exit(1)
+
+
+def add_concurrency_argument(parser):
+    parser.add_argument("--concurrency", type=int, default=1, metavar="N",
+                        help="Send up to N create or delete requests in parallel, requires httpx (default: 1)")
+
+
+def flatten_model(value):
+    """Converts a model returned by a get endpoint into the form its set
+    endpoint accepts. Option lists like {"lan": {"value": "LAN", "selected": 1}}
+    become the comma separated keys of the selected options."""
+    if isinstance(value, dict):
+        if value and all(isinstance(option, dict) and "selected" in option for option in value.values()):
+            return ",".join(key for key, option in value.items() if option["selected"])
+        return {key: flatten_model(item) for key, item in value.items()}
+    return value
+
+
+def add_model_item(model, path, item):
+    """Adds item to the item list at the dotted path of a flattened model,
+    e.g. 'reservations.reservation', under a new uuid and returns the uuid.
+    The item is created when the model is sent to the set endpoint, which
+    stores it under a uuid of its own. The returned uuid is only a key in
+    the payload, other items must not reference it."""
+    items = model
+    for name in path.split('.'):
+        if not isinstance(items.get(name), dict):
+            # Empty lists are [] in the JSON of OPNsense
+            items[name] = {}
+        items = items[name]
+    item_uuid = str(uuid.uuid4())
+    items[item_uuid] = item
+    return item_uuid
+
+
+def _timeout(config, timeout):
+    timeout = timeout or config.get('timeout', DEFAULT_TIMEOUT)
+    return tuple(timeout) if isinstance(timeout, list) else timeout
+
+
+class Capabilities:
+    """What the firewall reports in core/firmware/status. Current releases
+    return the product fields in a 'product' object, older ones at the top
+    level, nested_product records which one this firewall uses."""
+
+    def __init__(self, status):
+        product = status.get('product')
+        self.nested_product = isinstance(product, dict)
+        fields = product if self.nested_product else status
+        self.version = fields.get('product_version') or status.get('product_version') or 'Unknown'
+        self.name = fields.get('product_name', 'OPNsense')
+
+
+class OPNsenseClient:
+    def __init__(self, config, timeout=None, pool_size=None, retry=None, cache=None):
+        # requests is only imported by the commands that talk to OPNsense
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.base_url = f"{config['url']}/api/"
+        self.timeout = _timeout(config, timeout)
+        pool_size = pool_size or config.get('pool_size', DEFAULT_POOL_SIZE)
+        self.retry = retry or RetryPolicy.from_config(config)
+        self.cache = cache or ResponseCache.from_config(config)
+        if self.cache.path is not None:
+            # The scripts do not close their client
+            atexit.register(self.cache.save)
+        self._capabilities = None
+
+        self.session = requests.Session()
+        self.session.auth = (config['api_key'], config['api_secret'])
+        # Passed with every request, a session wide verify = False would be
+        # overridden by REQUESTS_CA_BUNDLE or CURL_CA_BUNDLE
+        self.verify = config.get('verify_ssl', True)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def request(self, method, endpoint, data=None, idempotent=None):
+        """Sends the request and returns the decoded JSON response. Raises
+        OPNsenseError when it fails after all retries. idempotent defaults to
+        is_idempotent(method, endpoint)."""
+        if method == 'GET':
+            response = self.cache.get(endpoint)
+            if response is not None:
+                return response
+        if idempotent is None:
+            idempotent = is_idempotent(method, endpoint)
+        with phase("http"):
+            response = self._request(method, self.base_url + endpoint, data, idempotent)
+        if method == 'GET':
+            self.cache.put(endpoint, response)
+        else:
+            self.cache.invalidate_module(endpoint)
+        return response
+
+    def _request(self, method, url, data, idempotent):
+        import requests
+        from urllib3.exceptions import NewConnectionError
+
+        if method not in ['GET', 'POST', 'PUT']:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        attempt = 0
+        while True:
+            status = retry_after = None
+            sent = True
+            try:
+                if method == 'GET':
+                    response = self.session.get(url, verify=self.verify, timeout=self.timeout)
+                else:
+                    response = self.session.request(method, url, json=data, verify=self.verify, timeout=self.timeout)
+                if response.ok:
+                    return response.json()
+                status = response.status_code
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                error = f"{status} {response.reason} for url: {url}"
+            except requests.JSONDecodeError as e:
+                raise OPNsenseError(f"Invalid JSON in response from {url}: {e}") from e
+            except requests.RequestException as e:
+                sent = not (isinstance(e, requests.ConnectTimeout)
+                            or isinstance(getattr(e.args[0] if e.args else None, 'reason', None), NewConnectionError))
+                error = str(e)
+            if not self.retry.should_retry(attempt, idempotent, status, sent):
+                raise OPNsenseError(error, status)
+            time.sleep(self.retry.delay(attempt, retry_after))
+            attempt += 1
+
+    def get(self, endpoint):
+        return self.request('GET', endpoint)
+
+    def post(self, endpoint, data=None):
+        return self.request('POST', endpoint, data)
+
+    def iter_search(self, endpoint, phrase=None, page_size=DEFAULT_PAGE_SIZE):
+        """Yields the rows of a searchX endpoint, e.g. kea/dhcpv4/searchReservation.
+        With phrase, OPNsense only returns the rows with a column containing
+        it. The next page is requested in the background while the rows of
+        the current one are processed.
+
+        The pages are read by offset, deleting rows while iterating moves
+        later rows to pages that were already read. Collect the rows with
+        list() before deleting them.
+        """
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            def fetch(page):
+                page_endpoint = search_endpoint(endpoint, page, page_size, phrase)
+                response = self.cache.get(page_endpoint)
+                if response is not None:
+                    future = Future()
+                    future.set_result(response)
+                else:
+                    # Not timed in the worker, the phases of the profiler are not thread safe
+                    future = executor.submit(self._request, 'GET', self.base_url + page_endpoint, None, True)
+                return page_endpoint, future
+
+            page = 1
+            seen = 0
+            page_endpoint, future = fetch(page)
+            while True:
+                with phase("http"):
+                    response = future.result()
+                self.cache.put(page_endpoint, response)
+                rows = response.get('rows', [])
+                seen += len(rows)
+                # A firewall that ignores rowCount returns all rows at once
+                last = not rows or seen >= response.get('total', seen)
+                if not last:
+                    page += 1
+                    page_endpoint, future = fetch(page)
+                yield from rows
+                if last:
+                    return
+
+    def invalidate(self, prefix=''):
+        """Forgets the cached responses of the endpoints starting with prefix."""
+        self.cache.invalidate(prefix)
+
+    def probe(self):
+        """Returns the Capabilities of the firewall, requested once per client."""
+        if self._capabilities is None:
+            self._capabilities = Capabilities(self.get('core/firmware/status'))
+        return self._capabilities
+
+    def close(self):
+        self.cache.save()
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class AsyncOPNsenseClient:
+    def __init__(self, config, concurrency, timeout=None, retry=None):
+        import httpx
+
+        timeout = _timeout(config, timeout)
+        connect, read = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        self.client = httpx.AsyncClient(
+            base_url=f"{config['url']}/api/",
+            auth=(config['api_key'], config['api_secret']),
+            verify=config.get('verify_ssl', True),
+            timeout=httpx.Timeout(read, connect=connect),
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self.retry = retry or RetryPolicy.from_config(config)
+        self.limiter = AdaptiveLimiter(concurrency)
+
+    async def request(self, method, endpoint, data=None, idempotent=None):
+        """Like OPNsenseClient.request(), the requests in flight at the same
+        time are limited by self.limiter."""
+        import httpx
+
+        if method not in ['GET', 'POST', 'PUT']:
+            raise ValueError(f"Unsupported HTTP method: {method}")
+        if idempotent is None:
+            idempotent = is_idempotent(method, endpoint)
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                if method == 'GET':
+                    response = await self.client.get(endpoint)
+                else:
+                    response = await self.client.request(method, endpoint, json=data)
+            except httpx.TransportError as e:
+                await self.limiter.release(overloaded=True)
+                status = retry_after = None
+                sent = not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                error = f"{type(e).__name__} for url: {self.client.base_url.join(endpoint)}: {e}"
+            except BaseException:
+                await self.limiter.release()
+                raise
+            else:
+                status = response.status_code
+                # Only the errors of a busy firewall lower the limit, not a 404 or 401
+                await self.limiter.release(time.monotonic() - start, overloaded=status in RETRY_STATUS)
+                if response.is_success:
+                    try:
+                        return response.json()
+                    except ValueError as e:
+                        raise OPNsenseError(f"Invalid JSON in response from {response.url}: {e}") from e
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                sent = True
+                error = f"{status} {response.reason_phrase} for url: {response.url}"
+            if not self.retry.should_retry(attempt, idempotent, status, sent):
+                raise OPNsenseError(error, status)
+            await asyncio.sleep(self.retry.delay(attempt, retry_after))
+            attempt += 1
+
+    async def get(self, endpoint):
+        return await self.request('GET', endpoint)
+
+    async def post(self, endpoint, data=None):
+        return await self.request('POST', endpoint, data)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.aclose()
+
+
+def run_concurrently(config, concurrency, function, items, callback=None):
+    """Awaits function(api, item) for all items with an AsyncOPNsenseClient,
+    at most concurrency requests at a time. Returns (item, result) pairs in
+    the order of items, result is the OPNsenseError for a failed request, so
+    one failure does not lose the results of the others. callback(item,
+    result) is called for every item as soon as its result is there."""
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        print("Error: --concurrency requires httpx (pip install httpx)")
+        sys.exit(1)
+
+    async def run():
+        async def call(api, item):
+            try:
+                result = await function(api, item)
+            except OPNsenseError as e:
+                result = e
+            if callback is not None:
+                callback(item, result)
+            return item, result
+
+        async with AsyncOPNsenseClient(config, concurrency) as api:
+            return await asyncio.gather(*(call(api, item) for item in items))
+
+    # The requests overlap, so they are timed as one phase
+    with phase("http"):
+        return asyncio.run(run())
+
+
+def failures(pairs):
+    """Returns the (item, error) pairs of the failed requests of
+    run_concurrently()."""
+    return [(item, result) for item, result in pairs if isinstance(result, OPNsenseError)]
+
+
+def delete_all(api, config, concurrency, delete, rows, label):
+    """Calls delete(api, uuid) for the uuids of the rows of a search and
+    reports the progress as label, e.g. 'reservations'. With concurrency > 1,
+    the deletes are sent with run_concurrently() and the failed ones are
+    printed before an OPNsenseError is raised. Returns the responses in the
+    order of rows."""
+    progress = Progress(label, len(rows), "deleted")
+    uuids = [row['uuid'] for row in rows]
+    if concurrency > 1:
+        # With an AsyncOPNsenseClient, delete returns a coroutine
+        pairs = run_concurrently(config, concurrency, delete, uuids, lambda item_uuid, response: progress.update())
+        progress.finish()
+        failed = failures(pairs)
+        for item_uuid, error in failed:
+            print(f"Error deleting {item_uuid}: {error}")
+        if failed:
+            raise OPNsenseError(f"{len(failed)} of {len(rows)} {label} not deleted")
+        return [response for _, response in pairs]
+    responses = []
+    for item_uuid in uuids:
+        responses.append(delete(api, item_uuid))
+        progress.update()
+    progress.finish()
+    return responses
@@ -0,0 +1,303 @@
+import os
+import re
+import ssl
+import json
+import time
+import uuid
+import base64
+import shutil
+import tempfile
+import threading
+import subprocess
+from urllib.parse import parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Stand-in for the OPNsense REST API, used by the tests and benchmarks of the
+# migration scripts where no firewall is available. It implements the
+# endpoints the scripts call with an in-memory model per module: addX stores
+# the posted item under a new uuid, searchX lists the items and delX/uuid
+# removes one. For the modules in MODELS, get returns the whole model with
+# the items and set updates and adds them, new items get a uuid of the
+# stand-in like on OPNsense. Like there, set never removes items. Everything else answers {"status": "ok"}.
+#
+# latency delays every response like a firewall at the other end of a WAN
+# link. With capacity, the stand-in behaves like an appliance that handles
+# that many requests at a time: with more in flight, every response is
+# delayed proportionally longer, with more than twice as many it answers
+# 503. fail() makes the next requests fail like a busy firewall or a rate
+# limit would. With tls, it serves HTTPS with a self-signed certificate
+# created by the openssl command.
+
+API_KEY = "standin_key"
+API_SECRET = "standin_secret"
+PRODUCT_VERSION = "24.7.1"
+
+# module: (root of the model, {path of an item list in the model: kind})
+MODELS = {
+    "kea/dhcpv4": ("dhcpv4", {"subnets.subnet4": "Subnet", "reservations.reservation": "Reservation"}),
+}
+
+# Rows of interfaces/overview/interfacesInfo
+INTERFACES = [
+    {"identifier": "wan", "description": "WAN", "device": "vtnet0"},
+    {"identifier": "lan", "description": "LAN", "device": "vtnet1"},
+]
+
+# Settings of a model as get returns them, with an option list
+_GENERAL = {"enabled": "1", "interfaces": {"lan": {"value": "LAN", "selected": 1}, "opt1": {"value": "OPT1", "selected": 0}}}
+
+
+def _search(rows, parameters):
+    phrase = str(parameters.get("searchPhrase", "")).lower()
+    if phrase:
+        rows = [row for row in rows if any(phrase in str(value).lower() for value in row.values())]
+    current = int(parameters.get("current", 1))
+    row_count = int(parameters.get("rowCount", -1))
+    page = rows if row_count < 0 else rows[(current - 1) * row_count:current * row_count]
+    return {"rows": page, "rowCount": len(page), "total": len(rows), "current": current}
+
+
+_MODEL_PATH = re.compile(r"^(?P<module>\w+/\w+)/(?P<action>get|set)$")
+_ITEM_PATH = re.compile(r"^(?P<module>\w+/\w+)/(?P<action>add|search|del)(?P<kind>[A-Z]\w*)(?:/(?P<uuid>[\w-]+))?$")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, with Nagle's algorithm every
+    # response on a kept-alive connection would wait for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def _handle(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        standin = self.server.standin
+        with self.server.lock:
+            self.server.in_flight += 1
+            in_flight = self.server.in_flight
+        try:
+            self._respond(method, body, standin, in_flight)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+    def _respond(self, method, body, standin, in_flight):
+        capacity = standin.capacity
+        latency = self.server.latency
+        if capacity is not None:
+            latency *= max(1.0, in_flight / capacity)
+        if latency:
+            time.sleep(latency)
+        fault = standin._next_fault(self.path[len("/api/"):])
+        if fault is None and capacity is not None and in_flight > 2 * capacity:
+            fault = (503, None, False)
+        if fault is not None:
+            status, retry_after, applied = fault
+            if applied and self.headers.get("Authorization") == self.server.authorization:
+                standin.handle(method, self.path[len("/api/"):], json.loads(body) if body else None)
+            with standin._lock:
+                standin.failures.append((method, self.path[len("/api/"):]))
+            headers = None if retry_after is None else {"Retry-After": str(retry_after)}
+            return self._send(status, {"status": status}, headers)
+        if self.headers.get("Authorization") != self.server.authorization:
+            return self._send(401, {"status": 401, "message": "Authentication Failed"})
+        if not self.path.startswith("/api/"):
+            return self._send(404, {"status": 404})
+        data = json.loads(body) if body else None
+        status, result = standin.handle(method, self.path[len("/api/"):], data)
+        self._send(status, result)
+
+    def _send(self, status, result, headers=None):
+        body = json.dumps(result).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 resets connections when many clients connect at once
+    request_queue_size = 128
+
+
+class OPNsenseStandin:
+    def __init__(self, latency=0.0, tls=False, capacity=None):
+        self.latency = latency
+        self.tls = tls
+        self.capacity = capacity
+        self.models = {}
+        self.requests = []
+        # (method, path) of the requests answered with an error by fail() or capacity
+        self.failures = []
+        self._faults = []
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._cert_dir = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"{'https' if self.tls else 'http'}://{host}:{port}"
+
+    @property
+    def connections(self):
+        """Number of TCP connections accepted so far."""
+        return self._server.connections
+
+    def config(self, **settings):
+        """Returns a config.json dict for this stand-in."""
+        return dict({"url": self.url, "api_key": API_KEY, "api_secret": API_SECRET, "verify_ssl": False}, **settings)
+
+    def fail(self, count=1, status=503, retry_after=None, path=None, skip=0, applied=False):
+        """Answers the next count requests, or the next ones for path if
+        given, with status, with a Retry-After header if retry_after is
+        given. The first skip of these requests are answered as usual. With
+        applied, the requests are processed before, like by a firewall whose
+        answer is lost behind a timed out proxy."""
+        with self._lock:
+            self._faults.append([path, skip, count, status, retry_after, applied])
+
+    def _next_fault(self, path):
+        with self._lock:
+            for fault in self._faults:
+                fault_path, skip, count, status, retry_after, applied = fault
+                if fault_path is not None and fault_path != path:
+                    continue
+                if skip:
+                    fault[1] -= 1
+                    return None
+                if count == 1:
+                    self._faults.remove(fault)
+                else:
+                    fault[2] -= 1
+                return status, retry_after, applied
+            return None
+
+    def items(self, module, kind):
+        """Returns the items stored with module/addKind, e.g. items('kea/dhcpv4', 'Reservation')."""
+        return list(self.models.get((module, kind), {}).values())
+
+    def handle(self, method, path, data):
+        with self._lock:
+            self.requests.append((method, path))
+            path, _, query = path.partition("?")
+            parameters = dict(parse_qsl(query))
+            if method == "POST" and isinstance(data, dict):
+                parameters.update(data)
+            if path == "core/firmware/status":
+                return 200, {"product_version": PRODUCT_VERSION, "product": {"product_version": PRODUCT_VERSION}}
+            if path == "interfaces/overview/interfacesInfo":
+                return 200, _search(INTERFACES, parameters)
+            match = _MODEL_PATH.match(path)
+            if match is not None and match["module"] in MODELS:
+                if match["action"] == "get" and method == "GET":
+                    return 200, self._get_model(match["module"])
+                if match["action"] == "set" and method == "POST":
+                    return 200, self._set_model(match["module"], data)
+            match = _ITEM_PATH.match(path)
+            if match is None:
+                return 200, {"status": "ok"}
+            items = self.models.setdefault((match["module"], match["kind"]), {})
+            if match["action"] == "add" and method == "POST":
+                item_uuid = str(uuid.uuid4())
+                item = next(iter(data.values())) if isinstance(data, dict) and len(data) == 1 else data
+                items[item_uuid] = dict(item, uuid=item_uuid)
+                return 200, {"result": "saved", "uuid": item_uuid}
+            if match["action"] == "search":
+                return 200, _search(list(items.values()), parameters)
+            if match["action"] == "del" and method == "POST":
+                if items.pop(match["uuid"], None) is None:
+                    return 200, {"result": "not found"}
+                return 200, {"result": "deleted"}
+            return 404, {"status": 404}
+
+    def _get_model(self, module):
+        root, lists = MODELS[module]
+        model = {"general": _GENERAL}
+        for path, kind in lists.items():
+            container, _, name = path.partition(".")
+            items = {item_uuid: {key: value for key, value in item.items() if key != "uuid"}
+                     for item_uuid, item in self.models.get((module, kind), {}).items()}
+            # PHP encodes an empty list as []
+            model[container] = {name: items or []}
+        return {root: model}
+
+    def _set_model(self, module, data):
+        root, lists = MODELS[module]
+        model = data[root]
+        if model.get("general", {}).get("interfaces") != "lan":
+            return {"result": "failed", "validations": {f"{root}.general.interfaces": "option lists must be sent as selected keys"}}
+        updated = {}
+        for path, kind in lists.items():
+            container, _, name = path.partition(".")
+            existing = self.models.get((module, kind), {})
+            items = model.get(container, {}).get(name) or {}
+            # Like BaseField::setNodes(), items missing in the payload are kept
+            updated[kind] = dict(existing)
+            for key, item in items.items():
+                # Like ArrayField::add(), keys that are no item yet get a new uuid
+                item_uuid = key if key in existing else str(uuid.uuid4())
+                updated[kind][item_uuid] = dict(item, uuid=item_uuid)
+        if module == "kea/dhcpv4":
+            for item_uuid, reservation in updated["Reservation"].items():
+                if reservation.get("subnet") not in updated["Subnet"]:
+                    return {"result": "failed", "validations": {f"{root}.reservations.reservation.{item_uuid}.subnet": "unknown subnet"}}
+        for kind, items in updated.items():
+            self.models[(module, kind)] = items
+        return {"result": "saved"}
+
+    def _ssl_context(self):
+        self._cert_dir = tempfile.mkdtemp()
+        cert = os.path.join(self._cert_dir, "cert.pem")
+        key = os.path.join(self._cert_dir, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-subj", "/CN=localhost",
+                        "-days", "1", "-keyout", key, "-out", cert], check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        return context
+
+    def start(self):
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.standin = self
+        self._server.latency = self.latency
+        self._server.lock = threading.Lock()
+        self._server.connections = 0
+        self._server.in_flight = 0
+        credentials = base64.b64encode(f"{API_KEY}:{API_SECRET}".encode("utf-8")).decode("ascii")
+        self._server.authorization = f"Basic {credentials}"
+        if self.tls:
+            self._server.socket = self._ssl_context().wrap_socket(self._server.socket, server_side=True)
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        if self._cert_dir is not None:
+            shutil.rmtree(self._cert_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
@@ -0,0 +1,155 @@
+import sys
+import json
+import time
+import contextlib
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Per-phase timing for the scripts. A PhaseProfiler collects wall time, CPU
+# time and the growth of the peak memory of named phases such as lexing,
+# parsing, queries or HTTP calls. Phases with the same name are summed up,
+# nested phases are reported as 'outer/inner'. Library code marks its phases
+# with phase(), which does nothing unless a profiler is active, so the
+# scripts only pay for the timing when --profile is given.
+
+_active = None
+
+
+def peak_memory():
+    """Returns the peak resident memory of the process in bytes, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PhaseStats:
+    __slots__ = ("name", "calls", "wall", "cpu", "peak_growth")
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak_growth = 0
+
+    def to_dict(self):
+        return {"name": self.name, "calls": self.calls, "wall": self.wall, "cpu": self.cpu,
+                "peak_growth": self.peak_growth}
+
+
+class PhaseProfiler:
+    """Collects timings of named phases, see phase().
+
+    With a pstats_path, the whole run is also recorded with cProfile and
+    written there, for analysis with python -m pstats or snakeviz. With a
+    json_path, the timings are written there as JSON to compare runs.
+    """
+
+    def __init__(self, pstats_path=None, json_path=None, output=None):
+        self.pstats_path = pstats_path
+        self.json_path = json_path
+        self.output = output
+        self.phases = {}
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.peak = None
+        self._stack = []
+        self._previous = None
+        self._cprofile = None
+        self._start = None
+
+    def __enter__(self):
+        global _active
+        self._previous = _active
+        _active = self
+        if self.pstats_path is not None:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+        self._start = (time.perf_counter(), time.process_time())
+        if self._cprofile is not None:
+            self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        global _active
+        if self._cprofile is not None:
+            self._cprofile.disable()
+        self.wall = time.perf_counter() - self._start[0]
+        self.cpu = time.process_time() - self._start[1]
+        self.peak = peak_memory()
+        _active = self._previous
+        if self._cprofile is not None:
+            self._cprofile.dump_stats(self.pstats_path)
+        if self.json_path is not None:
+            with open(self.json_path, 'w') as f:
+                json.dump(self.to_dict(), f, indent=2)
+        print(self.report(), file=self.output or sys.stderr)
+        return False
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        self._stack.append(name)
+        path = '/'.join(self._stack)
+        stats = self.phases.get(path)
+        if stats is None:
+            stats = self.phases[path] = PhaseStats(path)
+        peak = peak_memory()
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield stats
+        finally:
+            stats.wall += time.perf_counter() - wall
+            stats.cpu += time.process_time() - cpu
+            stats.calls += 1
+            if peak is not None:
+                stats.peak_growth += peak_memory() - peak
+            self._stack.pop()
+
+    def to_dict(self):
+        return {
+            "argv": sys.argv,
+            "wall": self.wall,
+            "cpu": self.cpu,
+            "peak_memory": self.peak,
+            "phases": [stats.to_dict() for stats in self.phases.values()],
+        }
+
+    def report(self):
+        lines = [f"{'phase':<32} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'peak +MB':>9}"]
+        for stats in self.phases.values():
+            name = "  " * stats.name.count('/') + stats.name.rpartition('/')[2]
+            lines.append(f"{name:<32} {stats.calls:>6} {stats.wall:>9.3f} {stats.cpu:>9.3f} "
+                         f"{stats.peak_growth / 1024 / 1024:>9.1f}")
+        peak = "unknown" if self.peak is None else f"{self.peak / 1024 / 1024:.1f} MB"
+        lines.append(f"{'total':<32} {'':>6} {self.wall:>9.3f} {self.cpu:>9.3f}   peak memory {peak}")
+        return '\n'.join(lines)
+
+
+def phase(name):
+    """Context manager that adds the time spent in it to the phase name of
+    the active PhaseProfiler. Does nothing if no profiler is active."""
+    if _active is None:
+        return contextlib.nullcontext()
+    return _active.phase(name)
+
+
+def add_profile_arguments(parser):
+    parser.add_argument("--profile", action="store_true",
+                        help="Print wall time, CPU time and memory per phase to stderr")
+    parser.add_argument("--profile-pstats", metavar="FILE",
+                        help="Also record the run with cProfile and write the stats to FILE (implies --profile)")
+    parser.add_argument("--profile-json", metavar="FILE",
+                        help="Also write the phase timings as JSON to FILE (implies --profile)")
+
+
+def profiler_from_args(args):
+    """Returns a PhaseProfiler for the --profile arguments, or a context manager that does nothing."""
+    if not (args.profile or args.profile_pstats or args.profile_json):
+        return contextlib.nullcontext()
+    return PhaseProfiler(pstats_path=args.profile_pstats, json_path=args.profile_json)
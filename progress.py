@@ -0,0 +1,33 @@
+import sys
+import time
+
+# Progress and throughput of long running loops over API calls, e.g. the
+# deletes of the cleanup scripts. update() prints the count at most once per
+# interval, finish() the total and the rate.
+
+
+class Progress:
+    def __init__(self, label, total, verb="done", interval=1.0, output=None):
+        self.label = label
+        self.total = total
+        self.verb = verb
+        self.interval = interval
+        self.output = output
+        self.done = 0
+        self.start = time.perf_counter()
+        self._printed = self.start
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.start
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def update(self, count=1):
+        self.done += count
+        now = time.perf_counter()
+        if now - self._printed >= self.interval and self.done < self.total:
+            self._printed = now
+            print(f"{self.label}: {self.done}/{self.total} {self.verb} ({self.rate():.0f}/s)", file=self.output or sys.stdout)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.start
+        print(f"{self.done} {self.label} {self.verb} in {elapsed:.2f} s ({self.rate():.0f}/s)", file=self.output or sys.stdout)
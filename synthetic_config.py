@@ -0,0 +1,163 @@
+#!/bin/python3
+
+import sys
+import base64
+import random
+import argparse
+
+# Generates ar7.cfg and vpn.cfg files in the FRITZ!Box format, used by the
+# tests and the benchmarks where no real export can be checked in.
+
+HEADER = """/*
+ * /var/flash/{name}
+ * Sat Jan  1 00:00:00 2000
+ */
+
+meta {{ encoding = "utf-8"; }}
+
+"""
+
+# Neighbour names with the escapes found in real exports
+_NAMES = [
+    'device-{i}',
+    'Drucker \\"Büro\\" {i}',
+    'nas\\\\backup-{i}',
+    '\\101ndroid-{i}',
+]
+
+_SERVICES = [("tcp", 443, "HTTPS"), ("tcp", 22, "SSH"), ("udp", 51820, "WireGuard"), ("tcp", 8080, "")]
+
+
+def _mac(rng):
+    return ':'.join(f"{rng.randrange(256):02X}" for _ in range(6))
+
+
+def _wg_key(rng):
+    return base64.b64encode(bytes(rng.randrange(256) for _ in range(32))).decode('ascii')
+
+
+def _forward_rule(rng, ip):
+    protocol, port, comment = rng.choice(_SERVICES)
+    rule = f"{protocol} 0.0.0.0:{port} {ip}:{port} 0 mark 0"
+    return f"{rule} # {comment}" if comment else rule
+
+
+def generate_ar7_cfg(landevices=100, ethinterfaces=2, seed=0):
+    """Returns an ar7.cfg with the given number of landevices and ethinterfaces.
+
+    About half of the landevices have a static lease, some of those have
+    ipv4forwardrules. Comments are spread over all nesting levels.
+    """
+    rng = random.Random(seed)
+    lines = [HEADER.format(name="ar7.cfg"), "ar7cfg {\n", "        mode = dsldmode_router;\n",
+             "        igddenabled = yes;\n"]
+
+    lines.append("        ethinterfaces ")
+    for i in range(ethinterfaces):
+        name = "eth0" if i == 0 else f"eth0:{i - 1}"
+        lines.append("{\n")
+        lines.append(f"                name = \"{name}\";\n")
+        lines.append("                dhcp = no;\n")
+        lines.append(f"                ipaddr = 192.168.{(178 + i) % 256}.1;\n")
+        lines.append("                netmask = 255.255.255.0;\n")
+        lines.append("                /* DHCP server\n                   for this interface */\n")
+        lines.append("                dhcpenabled = yes;\n")
+        lines.append(f"                dhcpstart = 192.168.{(178 + i) % 256}.20;\n")
+        lines.append(f"                dhcpend = 192.168.{(178 + i) % 256}.200;\n")
+        lines.append("                ipv6_prefix = fd00::;\n")
+        lines.append("        } ")
+    lines.append("\n")
+
+    lines.append("""        targets {
+                type = tt_pppoe;
+                name = "internet";
+                local {
+                        // PPPoE credentials
+                        username = "002201234567891234567890#0001@t-online.de";
+                        passwd = "secret\\"pass";
+                        leasetime = 30d;
+                        idle = 5m;
+                }
+        }
+}
+""")
+
+    lines.append("landevices {\n")
+    if landevices:
+        lines.append("        landevices ")
+    for i in range(landevices):
+        static = rng.random() < 0.5
+        ip = f"192.168.178.{20 + i % 230}"
+        name = _NAMES[i % len(_NAMES)].format(i=i)
+        lines.append("{\n")
+        lines.append(f"                ip = {ip};\n")
+        lines.append(f"                mac = {_mac(rng)};\n")
+        lines.append(f"                neighbour_name = \"{name}\";\n")
+        lines.append(f"                staticlease = {'yes' if static else 'no'}; // set by the user\n")
+        lines.append(f"                ipv6_ifid = ::{rng.randrange(1, 0xffff):x}:{rng.randrange(1, 0xffff):x};\n")
+        lines.append(f"                last_seen = {rng.randrange(1, 10 ** 9)};\n")
+        if static and rng.random() < 0.3:
+            rules = [_forward_rule(rng, ip) for _ in range(rng.randrange(1, 4))]
+            lines.append("                ipv4forwardrules = " + ", ".join(f'"{rule}"' for rule in rules) + ";\n")
+        lines.append("        } ")
+    lines.append("\n}\n")
+
+    return ''.join(lines)
+
+
+def generate_vpn_cfg(connections=5, seed=0):
+    """Returns a vpn.cfg with the given number of WireGuard connections,
+    alternating between site to site connections and clients."""
+    rng = random.Random(seed)
+    lines = [HEADER.format(name="vpn.cfg"), "vpncfg {\n"]
+    if connections:
+        lines.append("        connections ")
+    for i in range(connections):
+        site_to_site = i % 2 == 0
+        lines.append("{\n")
+        lines.append("                enabled = yes;\n")
+        lines.append("                conn_type = conntype_wg;\n")
+        lines.append(f"                name = \"{'site' if site_to_site else 'client'}-{i}\";\n")
+        lines.append(f"                wg_public_key = \"{_wg_key(rng)}\";\n")
+        lines.append(f"                wg_preshared_key = \"{_wg_key(rng)}\";\n")
+        lines.append(f"                wg_allowed_ips = \"10.{i // 256}.{i % 256}.0/24\";\n")
+        lines.append(f"                wg_dyndns = \"site{i}.example.myfritz.net\";\n")
+        lines.append("                wg_persistent_keepalive = 25; /* seconds */\n")
+        lines.append("                wg_dnsserver = \"192.168.178.1\";\n")
+        lines.append(f"                wg_hide_network = {'no' if site_to_site else 'yes'};\n")
+        lines.append("        } ")
+    lines.append("\n")
+    lines.append(f"""        global {{
+                // Key pair of this box
+                wg_public_key = "{_wg_key(rng)}";
+                wg_private_key = "{_wg_key(rng)}";
+                wg_listen_port = 51820;
+        }}
+}}
+""")
+    return ''.join(lines)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Generates a synthetic ar7.cfg or vpn.cfg for tests and benchmarks")
+    parser.add_argument("--vpn", action="store_true", help="Generate a vpn.cfg instead of an ar7.cfg")
+    parser.add_argument("--landevices", type=int, default=100, help="Number of landevices (default: 100)")
+    parser.add_argument("--ethinterfaces", type=int, default=2, help="Number of ethinterfaces (default: 2)")
+    parser.add_argument("--connections", type=int, default=5, help="Number of WireGuard connections (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("-o", "--output", help="Output file, stdout if omitted")
+    args = parser.parse_args(argv[1:])
+
+    if args.vpn:
+        text = generate_vpn_cfg(connections=args.connections, seed=args.seed)
+    else:
+        text = generate_ar7_cfg(landevices=args.landevices, ethinterfaces=args.ethinterfaces, seed=args.seed)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,55 @@
+import pytest
+
+from config_loader import load_config_string
+from synthetic_config import generate_ar7_cfg
+
+antlr_dfa_cache = pytest.importorskip("antlr_dfa_cache")
+ConfigLexer = pytest.importorskip("ConfigLexer").ConfigLexer
+ConfigParser = pytest.importorskip("ConfigParser").ConfigParser
+
+
+@pytest.fixture
+def empty_dfas():
+    from antlr4.dfa.DFA import DFA
+    saved = {recognizer: list(recognizer.decisionsToDFA) for recognizer in (ConfigLexer, ConfigParser)}
+
+    def reset():
+        for recognizer in saved:
+            recognizer.decisionsToDFA[:] = [DFA(state, i) for i, state in enumerate(recognizer.atn.decisionToState)]
+
+    reset()
+    yield reset
+    for recognizer, decisions in saved.items():
+        recognizer.decisionsToDFA[:] = decisions
+
+
+def state_counts():
+    return [len(dfa._states) for recognizer in (ConfigLexer, ConfigParser) for dfa in recognizer.decisionsToDFA]
+
+
+def test_restored_dfas_parse_identically(tmp_path, empty_dfas):
+    text = generate_ar7_cfg(landevices=10)
+    expected = load_config_string(text, backend="antlr")
+    assert expected == load_config_string(text)
+
+    cache = antlr_dfa_cache.DFACache(directory=str(tmp_path))
+    assert not cache.restore()
+    cache.save()
+    counts = state_counts()
+    assert sum(counts) > 0
+
+    empty_dfas()
+    cache = antlr_dfa_cache.DFACache(directory=str(tmp_path))
+    assert cache.restore()
+    assert state_counts() == counts
+    assert not cache.grew()
+    assert load_config_string(text, backend="antlr") == expected
+    assert state_counts() == counts
+
+
+def test_unreadable_cache_is_ignored(tmp_path, empty_dfas):
+    cache = antlr_dfa_cache.DFACache(directory=str(tmp_path))
+    with open(cache.path, "wb") as f:
+        f.write(b"garbage")
+    assert not cache.restore()
+    assert sum(state_counts()) == 0
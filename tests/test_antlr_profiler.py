@@ -0,0 +1,26 @@
+import pytest
+
+from config_loader import load_config_string
+from synthetic_config import generate_ar7_cfg
+
+antlr_profiler = pytest.importorskip("antlr_profiler")
+pytest.importorskip("ConfigParser")
+
+
+def test_profiler_records_decisions():
+    profiler = antlr_profiler.DecisionProfiler()
+    text = generate_ar7_cfg(landevices=10)
+    assert load_config_string(text, backend="antlr", profiler=profiler) == load_config_string(text)
+    assert not profiler.ll_fallback
+    assert profiler.decisions
+    for stats in profiler.decisions.values():
+        assert stats.dfa_hits <= stats.invocations
+        assert stats.max_lookahead >= 1
+    assert "rule" in profiler.report()
+
+
+def test_syntax_error_falls_back_to_ll(capsys):
+    profiler = antlr_profiler.DecisionProfiler()
+    load_config_string("a { b = 1 c = 2; }", backend="antlr", profiler=profiler)
+    assert profiler.ll_fallback
+    assert "line 1" in capsys.readouterr().err
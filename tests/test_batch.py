@@ -0,0 +1,34 @@
+import json
+
+import ar7_batch_to_json
+from synthetic_config import generate_ar7_cfg
+
+
+def make_fleet(tmp_path):
+    for i in range(3):
+        site = tmp_path / "fleet" / f"site{i}"
+        site.mkdir(parents=True)
+        (site / "ar7.cfg").write_text(generate_ar7_cfg(landevices=5, seed=i), encoding="utf-8")
+    (tmp_path / "fleet" / "site1" / "broken.cfg").write_text("a { b = ; }", encoding="utf-8")
+    return str(tmp_path / "fleet")
+
+
+def test_output_dir_keeps_structure_and_reports_errors(tmp_path, capsys):
+    fleet = make_fleet(tmp_path)
+    out = tmp_path / "out"
+    assert ar7_batch_to_json.main(["", "--no-cache", "--workers", "2", "--output-dir", str(out), fleet]) == 1
+    assert sorted(p.relative_to(out).as_posix() for p in out.rglob("*.json")) == [
+        "site0/ar7.cfg.json", "site1/ar7.cfg.json", "site2/ar7.cfg.json"]
+    assert json.loads((out / "site2" / "ar7.cfg.json").read_text())["landevices"]["landevices"]
+    err = capsys.readouterr().err
+    assert "broken.cfg" in err
+    assert "3 of 4 files converted, 1 failed" in err
+
+
+def test_ndjson(tmp_path):
+    fleet = make_fleet(tmp_path)
+    out = tmp_path / "fleet.ndjson"
+    ar7_batch_to_json.main(["", "--no-cache", "--workers", "2", "--ndjson", str(out), fleet + "/*/ar7.cfg"])
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["file"].rsplit("/", 2)[1] for r in records] == ["site0", "site1", "site2"]
+    assert all("ar7cfg" in r["config"] for r in records)
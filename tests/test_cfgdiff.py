@@ -0,0 +1,73 @@
+from cfgdiff import diff_configs, subtree_hashes
+from config_loader import load_config_string
+
+OLD = '''
+landevices {
+    landevices {
+        ip = 192.168.178.20;
+        mac = 00:11:22:33:44:01;
+        name = "nas";
+        forwardrules = "tcp 0.0.0.0:443 0.0.0.0:443 0", "udp 0.0.0.0:51820 0.0.0.0:51820 0";
+    } {
+        ip = 192.168.178.21;
+        mac = 00:11:22:33:44:02;
+        name = "printer";
+    }
+}
+vpncfg {
+    connections {
+        name = "office";
+        wg_public_key = "old";
+    }
+}
+'''
+
+
+def diff(old, new):
+    return diff_configs(load_config_string(old), load_config_string(new))
+
+
+def test_identical_configs():
+    assert diff(OLD, OLD) == []
+
+
+def test_equal_subtrees_have_equal_hashes():
+    old = load_config_string(OLD)
+    new = load_config_string(OLD)
+    old_hashes = subtree_hashes(old)
+    new_hashes = subtree_hashes(new)
+    assert old_hashes[id(old["vpncfg"])] == new_hashes[id(new["vpncfg"])]
+    assert old_hashes[id(old["vpncfg"])] != old_hashes[id(old["landevices"])]
+
+
+def test_entries_are_matched_by_natural_key():
+    new = OLD.replace('''    } {
+        ip = 192.168.178.21;''', '''    } {
+        ip = 192.168.178.30;
+        mac = 00:11:22:33:44:03;
+        name = "laptop";
+    } {
+        ip = 192.168.178.21;''')
+    changes = diff(OLD, new)
+    assert len(changes) == 1
+    assert changes[0]["op"] == "added"
+    assert changes[0]["path"] == "landevices.landevices[mac=00:11:22:33:44:03]"
+    assert changes[0]["new"]["name"] == "laptop"
+
+
+def test_changed_values():
+    new = OLD.replace('wg_public_key = "old"', 'wg_public_key = "new"').replace("192.168.178.21", "192.168.178.22")
+    assert diff(OLD, new) == [
+        {"op": "changed", "path": "landevices.landevices[mac=00:11:22:33:44:02].ip",
+         "old": "192.168.178.21", "new": "192.168.178.22"},
+        {"op": "changed", "path": "vpncfg.connections[name=office].wg_public_key", "old": "old", "new": "new"},
+    ]
+
+
+def test_value_lists_report_added_and_removed_entries():
+    new = OLD.replace('"udp 0.0.0.0:51820 0.0.0.0:51820 0"', '"tcp 0.0.0.0:22 0.0.0.0:22 0"')
+    changes = diff(OLD, new)
+    assert [(c["op"], c["path"]) for c in changes] == [
+        ("removed", "landevices.landevices[mac=00:11:22:33:44:01].forwardrules[1]"),
+        ("added", "landevices.landevices[mac=00:11:22:33:44:01].forwardrules[1]"),
+    ]
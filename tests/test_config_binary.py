@@ -0,0 +1,48 @@
+import pytest
+
+from ConfigFastParser import parse_config_string
+from config_binary import BinaryConfig, BinaryConfigError, encode_binary_config, load_binary_config, write_binary_config
+from synthetic_config import generate_ar7_cfg, generate_vpn_cfg
+
+
+def write(tmp_path, config):
+    path = tmp_path / "ar7.bin"
+    with open(path, "wb") as f:
+        write_binary_config(config, f)
+    return str(path)
+
+
+@pytest.mark.parametrize("text", [
+    generate_ar7_cfg(landevices=50),
+    generate_vpn_cfg(connections=3),
+    "",
+    'a { x = 1.5, -2, "\\344\\"", ::1; b { } { c { } } }',
+])
+def test_round_trip(tmp_path, text):
+    config = parse_config_string(text)
+    loaded = load_binary_config(write(tmp_path, config))
+    assert loaded == config
+    assert list(loaded) == list(config)
+
+
+def test_lazy_sections(tmp_path):
+    config = parse_config_string(generate_ar7_cfg(landevices=20))
+    binary = BinaryConfig(write(tmp_path, config))
+    assert list(binary) == ["meta", "ar7cfg", "landevices"]
+    assert "landevices" in binary and "vpncfg" not in binary
+    assert binary.section("ar7cfg.targets.name") == "internet"
+    assert list(binary._sections) == ["ar7cfg"]
+    with pytest.raises(KeyError):
+        binary.section("ar7cfg.missing")
+
+
+def test_invalid_files(tmp_path):
+    path = tmp_path / "ar7.json"
+    path.write_bytes(b'{"ar7cfg": {}}')
+    with pytest.raises(BinaryConfigError):
+        BinaryConfig(str(path))
+
+    data = encode_binary_config(parse_config_string(generate_ar7_cfg(landevices=5)))
+    path.write_bytes(data[:-10])
+    with pytest.raises(BinaryConfigError):
+        BinaryConfig(str(path))["landevices"]
@@ -0,0 +1,103 @@
+import os
+import mmap
+import importlib.util
+
+import pytest
+
+from config_cache import ConfigCache
+from config_loader import load_config_file, load_config_string
+from config_types import to_plain
+from synthetic_config import generate_ar7_cfg
+
+requires_antlr = pytest.mark.skipif(
+    importlib.util.find_spec("antlr4") is None or importlib.util.find_spec("ConfigParser") is None,
+    reason="ANTLR runtime or generated parser not available")
+
+
+def write(path, text):
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_repeat_load_uses_cache(tmp_path, monkeypatch):
+    cache = ConfigCache(directory=str(tmp_path / "cache"))
+    cfg = write(tmp_path / "ar7.cfg", 'ar7cfg { name = "x"; }')
+
+    assert load_config_file(cfg, cache=cache) == {"ar7cfg": {"name": "x"}}
+    assert len(os.listdir(cache.directory)) == 1
+
+    import ConfigFastParser
+    def fail(text):
+        raise AssertionError("config parsed again")
+    monkeypatch.setattr(ConfigFastParser, "parse_config_string", fail)
+    assert load_config_file(cfg, cache=cache) == {"ar7cfg": {"name": "x"}}
+
+
+@pytest.mark.parametrize("backend", ["fast", pytest.param("antlr", marks=requires_antlr)])
+@pytest.mark.parametrize("sections", [None, ["ar7cfg.targets", "landevices"]], ids=["all", "sections"])
+@pytest.mark.parametrize("typed", [False, True], ids=["plain", "typed"])
+def test_cache_miss_parses_mapped_file(tmp_path, monkeypatch, backend, sections, typed):
+    text = generate_ar7_cfg(landevices=5) + '/* \u00e4 */ extra { name = "\u00e4\u00f6"; }\n'
+    cfg = write(tmp_path / "ar7.cfg", text)
+
+    import config_loader
+    parsed = []
+
+    def load_mapped(text, **kwargs):
+        parsed.append(type(text))
+        return load_config_string(text, **kwargs)
+    monkeypatch.setattr(config_loader, "load_config_string", load_mapped)
+    cache = ConfigCache(directory=str(tmp_path / "cache"))
+    config = load_config_file(cfg, backend=backend, cache=cache, sections=sections, typed=typed)
+    # The cache miss parses the mapping that was hashed, not a str or bytes copy of the file
+    assert parsed == [mmap.mmap]
+    expected = load_config_string(text, backend=backend, sections=sections, typed=typed)
+    assert to_plain(config) == to_plain(expected)
+    assert to_plain(load_config_file(cfg, backend=backend, cache=cache, sections=sections, typed=typed)) == to_plain(expected)
+
+
+def test_changed_content_is_parsed_again(tmp_path):
+    cache = ConfigCache(directory=str(tmp_path / "cache"))
+    cfg = tmp_path / "ar7.cfg"
+    assert load_config_file(write(cfg, 'a { b = 1; }'), cache=cache) == {"a": {"b": 1}}
+    assert load_config_file(write(cfg, 'a { b = 2; }'), cache=cache) == {"a": {"b": 2}}
+
+
+def test_grammar_version_is_part_of_the_key(monkeypatch):
+    import config_cache
+    cache = ConfigCache(directory="unused")
+    key = cache.key(b"a { b = 1; }", "fast")
+    monkeypatch.setattr(config_cache, "grammar_version", lambda: "changed")
+    assert cache.key(b"a { b = 1; }", "fast") != key
+
+
+def test_eviction_keeps_recent_entries(tmp_path):
+    cache = ConfigCache(directory=str(tmp_path), max_size=2500)
+    for i in range(5):
+        cache.put(f"key{i}", "x" * 1000)
+        os.utime(cache._path(f"key{i}"), (i, i))
+    cache.evict()
+    assert sorted(os.listdir(tmp_path)) == ["key3.pickle", "key4.pickle"]
+
+
+def test_corrupt_entry_is_ignored(tmp_path):
+    cache = ConfigCache(directory=str(tmp_path))
+    (tmp_path / "broken.pickle").write_bytes(b"not a pickle")
+    assert cache.get("broken") is None
+    assert not (tmp_path / "broken.pickle").exists()
+
+
+def test_unpicklable_value_leaves_no_temp_file(tmp_path):
+    cache = ConfigCache(directory=str(tmp_path))
+    with pytest.raises(Exception):
+        cache.put("key", lambda: None)
+    assert os.listdir(tmp_path) == []
+
+
+def test_entries_are_private(tmp_path):
+    directory = tmp_path / "cache"
+    directory.mkdir(mode=0o755)
+    cache = ConfigCache(directory=str(directory))
+    cache.put("key", {"passwd": "secret"})
+    assert directory.stat().st_mode & 0o777 == 0o700
+    assert (directory / "key.pickle").stat().st_mode & 0o777 == 0o600
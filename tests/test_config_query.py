@@ -0,0 +1,63 @@
+import pytest
+
+from config_query import ConfigQuery
+from config_loader import load_config_string
+from synthetic_config import generate_ar7_cfg, generate_vpn_cfg
+
+
+@pytest.fixture(scope="module")
+def ar7cfg():
+    return load_config_string(generate_ar7_cfg(landevices=40))
+
+
+def test_where_matches_scan(ar7cfg):
+    query = ConfigQuery(ar7cfg)
+    landevices = ar7cfg["landevices"]["landevices"]
+    static = query.where("landevices.landevices", staticlease="yes")
+    assert static == [device for device in landevices if device["staticlease"] == "yes"]
+    assert query.where("landevices.landevices", staticlease="yes") is static
+
+    device = landevices[7]
+    assert query.first("landevices.landevices", ip=device["ip"], mac=device["mac"]) is device
+    assert query.first("landevices.landevices", mac="00:00:00:00:00:00") is None
+    assert query.where("landevices.landevices") == landevices
+
+
+def test_single_block_and_missing_sections(ar7cfg):
+    query = ConfigQuery(ar7cfg)
+    assert query.where("ar7cfg.targets", name="internet") == [ar7cfg["ar7cfg"]["targets"]]
+    assert query.records("vpncfg.connections") == []
+    assert query.section("ar7cfg.mode") == "dsldmode_router"
+    assert query.section("ar7cfg.mode.x") is None
+
+
+def test_list_values_and_missing_fields():
+    config = load_config_string(generate_vpn_cfg(connections=4))
+    query = ConfigQuery(config)
+    assert [c["name"] for c in query.where("vpncfg.connections", conn_type="conntype_wg", wg_hide_network="yes")] == \
+        ["client-1", "client-3"]
+    assert query.where("vpncfg.connections", missing=None) == config["vpncfg"]["connections"]
+
+    query = ConfigQuery({"a": {"b": [{"x": [1, 2]}, {"x": 3}]}})
+    assert query.where("a.b", x=[1, 2]) == [{"x": [1, 2]}]
+
+
+def test_typed_records():
+    config = load_config_string(generate_ar7_cfg(landevices=10), typed=True)
+    assert all(device["staticlease"] is True
+               for device in ConfigQuery(config).where("landevices.landevices", staticlease=True))
+
+
+def test_jmespath(ar7cfg):
+    pytest.importorskip("jmespath")
+    query = ConfigQuery(ar7cfg)
+    result = query.jmespath("landevices.landevices[?staticlease == 'yes'].ip")
+    assert result == [device["ip"] for device in query.where("landevices.landevices", staticlease="yes")]
+    assert query.jmespath("landevices.landevices[?staticlease == 'yes'].ip") is result
+
+
+def test_jsonpath(ar7cfg):
+    pytest.importorskip("jsonpath_ng")
+    query = ConfigQuery(ar7cfg)
+    assert query.jsonpath('$.landevices.landevices[?staticlease = "yes"]') == \
+        query.where("landevices.landevices", staticlease="yes")
@@ -0,0 +1,92 @@
+import pickle
+import ipaddress
+import importlib.util
+
+import pytest
+
+from config_loader import load_config_string
+from config_types import MacAddress, Days, Minutes, Record, to_plain
+from synthetic_config import generate_ar7_cfg
+
+requires_antlr = pytest.mark.skipif(
+    importlib.util.find_spec("antlr4") is None or importlib.util.find_spec("ConfigParser") is None,
+    reason="ANTLR runtime or generated parser not available")
+
+TYPED_CONFIG = '''
+ar7cfg {
+    ethinterfaces {
+        name = "eth0";
+        ipaddr = 192.168.178.1;
+        dhcpenabled = yes;
+        leasetime = 30d;
+        idle = 5m;
+        ipv6 = fd00::1;
+        time = 10:30;
+        mtu = 1500;
+    }
+}
+landevices {
+    landevices {
+        mac = 00:1a:2B:3c:4D:5e;
+        servers = 192.168.178.2, 192.168.178.3;
+    }
+}
+'''
+
+
+@pytest.mark.parametrize("backend", ["fast", pytest.param("antlr", marks=requires_antlr)])
+def test_typed_values(backend):
+    cfg = load_config_string(TYPED_CONFIG, backend=backend, typed=True)
+    eth = cfg["ar7cfg"]["ethinterfaces"]
+    assert isinstance(eth, Record)
+    assert eth.ipaddr == ipaddress.IPv4Address("192.168.178.1")
+    assert eth["ipv6"] == ipaddress.IPv6Address("fd00::1")
+    assert eth["time"] == "10:30"
+    assert eth["dhcpenabled"] is True
+    assert eth["leasetime"] == 30 * 24 * 3600 and isinstance(eth["leasetime"], Days)
+    assert eth["idle"] == 300 and str(eth["idle"]) == "5m"
+    assert eth["mtu"] == 1500
+    device = cfg["landevices"]["landevices"]
+    assert device["mac"] == 0x001A2B3C4D5E and str(device["mac"]) == "00:1A:2B:3C:4D:5E"
+    assert device["servers"] == [ipaddress.IPv4Address("192.168.178.2"), ipaddress.IPv4Address("192.168.178.3")]
+
+
+def test_to_plain_matches_untyped_result():
+    text = generate_ar7_cfg(landevices=20)
+    assert to_plain(load_config_string(text, typed=True)) == load_config_string(text)
+
+
+@pytest.mark.parametrize("backend", ["fast", pytest.param("antlr", marks=requires_antlr)])
+def test_to_plain_keeps_original_text(backend):
+    text = 'a { mac = 00:1a:2b:3c:4d:5e; ipv6 = fd00:0000:0000::0001; idle = 05m; }'
+    typed = load_config_string(text, backend=backend, typed=True)
+    assert str(typed["a"]["mac"]) == "00:1A:2B:3C:4D:5E"
+    assert typed["a"]["ipv6"] == ipaddress.IPv6Address("fd00::1")
+    assert typed["a"]["idle"] == 300 and str(typed["a"]["idle"]) == "5m"
+    assert to_plain(typed) == load_config_string(text, backend=backend)
+    assert to_plain(pickle.loads(pickle.dumps(typed))) == to_plain(typed)
+
+
+def test_records_behave_like_read_only_mappings():
+    cfg = load_config_string('a { b { name = "x"; class = 1; items = 2; } }', typed=True)
+    record = cfg["a"]["b"]
+    assert dict(record) == {"name": "x", "class": 1, "items": 2}
+    assert record.get("missing") is None and "name" in record
+    assert record.name == "x"
+    assert not hasattr(record, "__dict__")
+    assert type(cfg["a"]["b"]) is type(load_config_string('c { d { name = "y"; class = 3; items = 4; } }', typed=True)["c"]["d"])
+    with pytest.raises(AttributeError):
+        record.other = 1
+
+
+def test_typed_config_pickles():
+    cfg = load_config_string(generate_ar7_cfg(landevices=3), typed=True)
+    assert pickle.loads(pickle.dumps(cfg)) == cfg
+
+
+def test_mac_address():
+    assert MacAddress("aa:bb:cc:dd:ee:ff") == 0xAABBCCDDEEFF
+    assert f"{MacAddress(1)}" == "00:00:00:00:00:01"
+    assert Minutes(120) + 0 == 120
+    with pytest.raises(ValueError):
+        MacAddress(1 << 48)
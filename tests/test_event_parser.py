@@ -0,0 +1,59 @@
+import io
+import pytest
+
+from ConfigFastParser import ConfigSyntaxError, ConfigTokenizer, parse_config_string
+from ConfigEventParser import (
+    ConfigEventParser, ConfigEvent, build_config, iter_config_string_events, iter_section_blocks,
+    ENTER_SECTION, EXIT_SECTION, VARIABLE, LIST_ITEM,
+)
+from synthetic_config import generate_ar7_cfg
+
+
+def stream_events(text, chunk_size):
+    return ConfigEventParser(ConfigTokenizer(stream=io.StringIO(text), chunk_size=chunk_size)).events()
+
+
+def test_events():
+    events = list(iter_config_string_events("a { x = 1; b { y = 2; } { y = 3, 4; } }"))
+    assert events == [
+        ConfigEvent(ENTER_SECTION, ('a',), None, None, 0),
+        ConfigEvent(VARIABLE, ('a',), 'x', 1, None),
+        ConfigEvent(ENTER_SECTION, ('a', 'b'), None, None, 0),
+        ConfigEvent(VARIABLE, ('a', 'b'), 'y', 2, None),
+        ConfigEvent(EXIT_SECTION, ('a', 'b'), None, None, 0),
+        ConfigEvent(LIST_ITEM, ('a', 'b'), None, None, 1),
+        ConfigEvent(ENTER_SECTION, ('a', 'b'), None, None, 1),
+        ConfigEvent(VARIABLE, ('a', 'b'), 'y', [3, 4], None),
+        ConfigEvent(EXIT_SECTION, ('a', 'b'), None, None, 1),
+        ConfigEvent(EXIT_SECTION, ('a',), None, None, 0),
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 16])
+def test_chunked_stream_matches_in_memory_parse(chunk_size):
+    text = generate_ar7_cfg(landevices=40, ethinterfaces=2)
+    assert build_config(stream_events(text, chunk_size)) == parse_config_string(text)
+
+
+@pytest.mark.parametrize("text", [
+    "a { x = 1; } a { y = 2; } { z = 3; }",
+    "a { x = 1; } { y = 2; } a { z = 3; } { w = 4; }",
+    "r { a { x = 1; } a { q { } } { p = 1; } { o = 2; } }",
+])
+def test_repeated_sections_match_in_memory_parse(text):
+    assert build_config(stream_events(text, 4)) == parse_config_string(text)
+
+
+def test_section_blocks():
+    text = generate_ar7_cfg(landevices=30)
+    expected = parse_config_string(text)["landevices"]["landevices"]
+    blocks = iter_section_blocks(stream_events(text, 256), ('landevices', 'landevices'))
+    assert list(blocks) == expected
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 1 << 16])
+def test_error_position_in_stream(chunk_size):
+    text = "/* comment\n */\na {\n  x = 1;\n  y = ;\n}\n"
+    with pytest.raises(ConfigSyntaxError) as e:
+        list(stream_events(text, chunk_size))
+    assert (e.value.line, e.value.column) == (5, 6)
@@ -0,0 +1,269 @@
+import pytest
+
+from ConfigFastParser import ConfigSyntaxError, ConfigTokenizer, parse_config_file, parse_config_string, section_tree
+from config_loader import config_to_json, load_config_string, select_sections
+from synthetic_config import generate_ar7_cfg, generate_vpn_cfg
+
+try:
+    from antlr4 import InputStream, CommonTokenStream
+    from antlr4.error.ErrorListener import ErrorListener
+    from ConfigLexer import ConfigLexer
+    from ConfigParser import ConfigParser
+    from ConfigJSONPrinter import ConfigJSONPrinter
+    ANTLR_AVAILABLE = True
+except ImportError:
+    ANTLR_AVAILABLE = False
+
+requires_antlr = pytest.mark.skipif(not ANTLR_AVAILABLE, reason="ANTLR runtime or generated parser not available")
+
+
+def load_test_data(file_path):
+    with open(file_path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+test_addresses = load_test_data('tests/testdata_ipv6/ipv6_addresses.txt')
+test_networks = load_test_data('tests/testdata_ipv6/ipv6_networks.txt')
+
+
+def generate_config_string(value):
+    return f"""/*
+                * /var/tmp.cfg
+                */
+
+                meta {{ encoding = "utf-8"; }}
+
+                ar7cfg {{
+                    ipv6 = {value};
+                }}
+            """
+
+
+if ANTLR_AVAILABLE:
+    class CollectingErrorListener(ErrorListener):
+        def __init__(self):
+            super().__init__()
+            self.errors = []
+
+        def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+            self.errors.append(f"line {line}:{column} {msg}")
+
+
+def parse_antlr(text):
+    lexer = ConfigLexer(InputStream(text))
+    listener = CollectingErrorListener()
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(listener)
+    parser = ConfigParser(CommonTokenStream(lexer))
+    parser.removeErrorListeners()
+    parser.addErrorListener(listener)
+    tree = parser.config()
+    if listener.errors:
+        return None
+    return ConfigJSONPrinter().visitConfig(tree)
+
+
+def parse_fast(text):
+    try:
+        return parse_config_string(text)
+    except ConfigSyntaxError:
+        return None
+
+
+def token_types(text):
+    return [token[0] for token in ConfigTokenizer(text).tokens()][:-1]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("yes", ["IDENTIFIER"]),
+    ("30d 5m 10s 2h 1w", ["TIME_DAYS", "TIME_MINUTES", "TIME_SECONDS", "TIME_HOURS", "TIME_WEEKS"]),
+    ("-1 0 3.14", ["NUMBER", "NUMBER", "NUMBER"]),
+    ("192.168.178.1", ["IPV4_ADDRESS"]),
+    ("00:1A:2b:3C:4d:5E", ["MAC_ADDRESS"]),
+    ("fe80::1 :: ::1 10:30", ["IPV6_ADDRESS"] * 4),
+    ("1:2:3", ["IPV6_ADDRESS", "COLON", "NUMBER"]),
+    ("cafe", ["IDENTIFIER"]),
+    ("g:h", ["IDENTIFIER", "COLON", "IDENTIFIER"]),
+    ("::ffff:192", ["IPV6_ADDRESS"]),
+    ("1.2.3.256", ["IPV4_ADDRESS", "NUMBER"]),
+    ('"a\\"b\\101"', ["STRING"]),
+    ("// comment\n/* multi\nline */ x", ["IDENTIFIER"]),
+])
+def test_token_types(text, expected):
+    assert token_types(text) == expected
+    assert token_types(text.encode()) == expected
+
+
+def test_values_match_config_json_printer():
+    cfg = parse_config_string("""
+        ar7cfg {
+            enabled = yes;
+            count = 3;
+            ratio = 0.5;
+            name = "a\\"b\\101";
+            lease = 30d;
+            ip = 10.0.0.1;
+            mac = 00:11:22:33:44:55;
+            dns = 10.0.0.1, 10.0.0.2;
+        }
+    """)
+    assert cfg == {"ar7cfg": {
+        "enabled": "yes",
+        "count": 3,
+        "ratio": 0.5,
+        "name": 'a"b101',
+        "lease": "30d",
+        "ip": "10.0.0.1",
+        "mac": "00:11:22:33:44:55",
+        "dns": ["10.0.0.1", "10.0.0.2"],
+    }}
+
+
+def test_single_and_list_sections():
+    cfg = parse_config_string("""
+        landevices {
+            landevices { ip = 10.0.0.1; } { ip = 10.0.0.2; }
+            single { ip = 10.0.0.3; }
+        }
+    """)
+    assert cfg == {"landevices": {
+        "landevices": [{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}],
+        "single": {"ip": "10.0.0.3"},
+    }}
+
+
+@pytest.mark.parametrize("text", [
+    "ar7cfg { a = ; }",
+    "ar7cfg { a = 1 }",
+    "ar7cfg { a = \"unterminated; }",
+    "ar7cfg { a = 1; ",
+    "ar7cfg { a = 1; } }",
+    "ar7cfg { a = 1.2.3; }",
+])
+def test_syntax_errors(text):
+    with pytest.raises(ConfigSyntaxError):
+        parse_config_string(text)
+    with pytest.raises(ConfigSyntaxError):
+        parse_config_string(text.encode())
+
+
+def test_mapped_file(tmp_path):
+    text = generate_ar7_cfg(landevices=20) + 'extra { name = "Grüße \\"aus\\" Köln"; }\n'
+    path = tmp_path / "ar7.cfg"
+    path.write_text(text, encoding="utf-8")
+    assert parse_config_file(str(path)) == parse_config_string(text)
+    assert parse_config_file(str(path))["extra"]["name"] == 'Grüße "aus" Köln'
+    sections = {"ar7cfg.targets", "extra"}
+    assert parse_config_file(str(path), sections=sections) == parse_config_string(text, sections=sections)
+    (tmp_path / "empty.cfg").write_bytes(b"")
+    assert parse_config_file(str(tmp_path / "empty.cfg")) == {}
+
+
+@requires_antlr
+def test_mmap_input_stream(tmp_path):
+    from MmapInputStream import MmapInputStream
+    from config_loader import _load_antlr
+    text = generate_ar7_cfg(landevices=20) + 'extra { name = "Grüße"; }\n'
+    path = tmp_path / "ar7.cfg"
+    path.write_text(text, encoding="utf-8")
+    with MmapInputStream(str(path)) as stream:
+        assert _load_antlr(stream) == parse_antlr(text)
+
+
+def test_generated_config():
+    cfg = parse_config_string(generate_ar7_cfg(landevices=50, ethinterfaces=2))
+    assert len(cfg["landevices"]["landevices"]) == 50
+    assert [i["name"] for i in cfg["ar7cfg"]["ethinterfaces"]] == ["eth0", "eth0:0"]
+    assert cfg["ar7cfg"]["targets"]["local"]["passwd"] == 'secret"pass'
+    assert cfg["landevices"]["landevices"][1]["neighbour_name"] == 'Drucker "Büro" 1'
+    assert any("ipv4forwardrules" in device for device in cfg["landevices"]["landevices"])
+
+
+def test_generated_vpn_config():
+    cfg = parse_config_string(generate_vpn_cfg(connections=3))
+    assert [c["name"] for c in cfg["vpncfg"]["connections"]] == ["site-0", "client-1", "site-2"]
+    assert cfg["vpncfg"]["global"]["wg_listen_port"] == 51820
+
+
+@requires_antlr
+@pytest.mark.parametrize("value", test_addresses + test_networks)
+def test_parity_ipv6(value):
+    text = generate_config_string(value)
+    assert parse_fast(text) == parse_antlr(text)
+
+
+@requires_antlr
+@pytest.mark.parametrize("landevices, ethinterfaces, seed", [(0, 1, 0), (1, 1, 1), (25, 2, 2), (300, 3, 3)])
+def test_parity_generated(landevices, ethinterfaces, seed):
+    text = generate_ar7_cfg(landevices=landevices, ethinterfaces=ethinterfaces, seed=seed)
+    result = parse_fast(text)
+    assert result is not None
+    assert result == parse_antlr(text)
+
+
+@requires_antlr
+def test_parity_generated_vpn():
+    text = generate_vpn_cfg(connections=7)
+    assert parse_fast(text) == parse_antlr(text)
+
+
+# Same bookkeeping as ConfigJSONPrinter.visitSection when a section name
+# occurs again in a block
+REPEATED_SECTIONS = [
+    ("a { x = 1; } a { y = 2; } { z = 3; }", {"a": {"x": 1, "a": {"z": 3}}}),
+    ("a { x = 1; } { y = 2; } a { z = 3; }", {"a": {"z": 3}}),
+    ("a { x = 1; } { y = 2; } a { z = 3; } { w = 4; }", {"a": [{"x": 1}, {"y": 2}, {"z": 3}, {"w": 4}]}),
+    ("r { a { x = 1; } a { q { } } { p = 1; } { o = 2; } }", {"r": {"a": {"x": 1, "a": {"q": {}}, None: {"o": 2}}}}),
+]
+
+
+@pytest.mark.parametrize("text, expected", REPEATED_SECTIONS)
+def test_repeated_sections(text, expected):
+    assert parse_fast(text) == expected
+
+
+@requires_antlr
+@pytest.mark.parametrize("text, expected", REPEATED_SECTIONS)
+def test_parity_repeated_sections(text, expected):
+    assert parse_antlr(text) == expected
+
+
+@pytest.mark.parametrize("backend", ["fast", pytest.param("antlr", marks=requires_antlr)])
+def test_load_config_string(backend):
+    cfg = load_config_string('ar7cfg { name = "x"; count = 2; }', backend=backend)
+    assert cfg == {"ar7cfg": {"name": "x", "count": 2}}
+    assert config_to_json(cfg, indent=None) == '{"ar7cfg": {"name": "x", "count": 2}}'
+
+
+SELECTIVE_CONFIG = """
+    /* skipped { */
+    meta { encoding = "utf-8"; }
+    ar7cfg {
+        note = "braces } { and ; in strings";
+        // comment with }
+        targets { name = "internet"; local { username = "u"; } }
+        ethinterfaces { name = "eth0"; } { name = "eth1"; }
+    }
+    landevices { landevices { ip = 10.0.0.1; mac = 00:11:22:33:44:55; } { ip = 10.0.0.2; } }
+"""
+
+
+@pytest.mark.parametrize("sections", [
+    {"ar7cfg.targets"},
+    {"ar7cfg.ethinterfaces", "landevices.landevices"},
+    {"ar7cfg.note", "meta"},
+    {"landevices.landevices.ip"},
+    {"ar7cfg", "ar7cfg.targets"},
+    {"missing"},
+])
+@pytest.mark.parametrize("backend", ["fast", pytest.param("antlr", marks=requires_antlr)])
+def test_selected_sections(sections, backend):
+    expected = select_sections(parse_config_string(SELECTIVE_CONFIG), section_tree(sections))
+    assert load_config_string(SELECTIVE_CONFIG, backend=backend, sections=sections) == expected
+
+
+def test_selected_sections_example():
+    cfg = parse_config_string(SELECTIVE_CONFIG, sections={"ar7cfg.targets.local", "landevices.landevices.ip"})
+    assert cfg == {
+        "ar7cfg": {"targets": {"local": {"username": "u"}}},
+        "landevices": {"landevices": [{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}]},
+    }
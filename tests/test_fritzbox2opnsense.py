@@ -0,0 +1,38 @@
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+import fritzbox2opnsense
+from synthetic_config import generate_ar7_cfg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_help_does_not_import_commands():
+    code = ("import sys, fritzbox2opnsense\n"
+            "try:\n"
+            "    fritzbox2opnsense.main(['fritzbox2opnsense.py', '--help'])\n"
+            "except SystemExit:\n"
+            "    pass\n"
+            "print(sorted(m for m in ('ar7_to_json', 'config_loader', 'ConfigFastParser', 'antlr4', 'requests')"
+            " if m in sys.modules), file=sys.stderr)\n")
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    for name in fritzbox2opnsense.COMMANDS:
+        assert name in result.stdout
+    assert result.stderr.strip() == "[]"
+
+
+def test_runs_command(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", list(sys.argv))
+    cfg = tmp_path / "ar7.cfg"
+    cfg.write_text(generate_ar7_cfg(landevices=3), encoding="utf-8")
+    fritzbox2opnsense.main(["fritzbox2opnsense.py", "to-json", "--no-cache", str(cfg)])
+    assert len(json.loads(capsys.readouterr().out)["landevices"]["landevices"]) == 3
+
+
+def test_unknown_command():
+    with pytest.raises(SystemExit):
+        fritzbox2opnsense.main(["fritzbox2opnsense.py", "to-yaml"])
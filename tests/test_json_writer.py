@@ -0,0 +1,96 @@
+import io
+import json
+import pytest
+
+from ConfigEventParser import iter_config_string_events, iter_dict_events
+from ConfigFastParser import parse_config_string
+from config_json_writer import write_config, write_config_events, stream_config_file
+from synthetic_config import generate_ar7_cfg, generate_vpn_cfg
+
+CONFIGS = [
+    generate_ar7_cfg(landevices=20),
+    generate_ar7_cfg(landevices=1, ethinterfaces=1),
+    generate_vpn_cfg(connections=3),
+    "",
+    "a { }",
+    "a { b { x { y = 1; } { } } { } c = 1, \"2\"; } d { } { e = \"\\344\"; }",
+]
+
+EXPECTED = {
+    "json": lambda config: json.dumps(config, indent=2) + "\n",
+    "compact": lambda config: json.dumps(config, separators=(',', ':')) + "\n",
+}
+
+
+def write(events, output_format):
+    out = io.StringIO()
+    write_config_events(events, out, output_format)
+    return out.getvalue()
+
+
+@pytest.mark.parametrize("output_format", ["json", "compact"])
+@pytest.mark.parametrize("text", CONFIGS)
+def test_streamed_json_matches_dumps(text, output_format):
+    config = parse_config_string(text)
+    expected = EXPECTED[output_format](config)
+    assert write(iter_config_string_events(text, lookahead=True), output_format) == expected
+    assert write(iter_dict_events(config), output_format) == expected
+    out = io.StringIO()
+    write_config(config, out, output_format)
+    assert out.getvalue() == expected
+
+
+def test_json_needs_lookahead():
+    with pytest.raises(ValueError):
+        write(iter_config_string_events("a { }"), "json")
+
+
+@pytest.mark.parametrize("text", [
+    "a { x = 1; } a { y = 2; } { z = 3; }",
+    "a { b { x = 1; y = 2; x = 3; } }",
+])
+def test_repeated_names_are_not_streamed(text):
+    with pytest.raises(ValueError, match="more than once"):
+        write(iter_config_string_events(text, lookahead=True), "json")
+
+
+def test_stream_error_goes_to_stderr(tmp_path, capsys):
+    import ar7_to_json
+    path = tmp_path / "ar7.cfg"
+    path.write_text("a { x = 1; } a { y = 2; } { z = 3; }", encoding="utf-8")
+    with pytest.raises(SystemExit) as exit_info:
+        ar7_to_json.main(["", "--stream", "--no-cache", str(path)])
+    assert exit_info.value.code == 1
+    out, err = capsys.readouterr()
+    assert "Error" not in out
+    assert "occurs more than once" in err
+
+
+def test_ndjson():
+    text = generate_ar7_cfg(landevices=3)
+    config = parse_config_string(text)
+    lines = [json.loads(line) for line in write(iter_config_string_events(text), "ndjson").splitlines()]
+
+    landevices = [line for line in lines if line["path"] == "landevices.landevices"]
+    assert [line["index"] for line in landevices] == [0, 1, 2]
+    assert [line["value"] for line in landevices] == config["landevices"]["landevices"]
+
+    ar7cfg = next(line["value"] for line in lines if line["path"] == "ar7cfg")
+    assert "ethinterfaces" not in ar7cfg
+    assert ar7cfg["targets"] == config["ar7cfg"]["targets"]
+
+    out = io.StringIO()
+    write_config(config, out, "ndjson")
+    assert out.getvalue() == write(iter_config_string_events(text), "ndjson")
+
+
+@pytest.mark.parametrize("output_format", ["json", "compact", "ndjson"])
+def test_stream_config_file(tmp_path, output_format):
+    text = generate_ar7_cfg(landevices=10)
+    path = tmp_path / "ar7.cfg"
+    path.write_text(text, encoding="utf-8")
+    out = io.StringIO()
+    stream_config_file(str(path), out, output_format)
+    expected = io.StringIO()
+    write_config(parse_config_string(text), expected, output_format)
+    assert out.getvalue() == expected.getvalue()
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+from opnsense_cache import ResponseCache
+from opnsense_client import Capabilities, OPNsenseClient
+from opnsense_standin import OPNsenseStandin, PRODUCT_VERSION
+
+
+@pytest.fixture
+def standin():
+    with OPNsenseStandin() as standin:
+        yield standin
+
+
+def paths(standin):
+    return [path for _, path in standin.requests]
+
+
+def test_ttl_of_longest_prefix():
+    cache = ResponseCache({'kea/': 10, 'kea/dhcpv4/searchSubnet': 0})
+    assert cache.ttl('kea/dhcpv4/searchReservation') == 10
+    assert cache.ttl('kea/dhcpv4/searchSubnet') == 0
+    assert cache.ttl('wireguard/client/searchClient') == 0
+
+
+def test_cached_until_write_to_module(standin):
+    with OPNsenseClient(standin.config()) as api:
+        for _ in range(3):
+            assert api.get('interfaces/overview/interfacesInfo')["rows"]
+        api.get('kea/dhcpv4/searchSubnet')
+        api.get('kea/dhcpv4/searchSubnet')
+        api.post('interfaces/vlan_settings/reconfigure')
+        api.get('interfaces/overview/interfacesInfo')
+    assert paths(standin) == ['interfaces/overview/interfacesInfo', 'kea/dhcpv4/searchSubnet',
+                              'kea/dhcpv4/searchSubnet', 'interfaces/vlan_settings/reconfigure',
+                              'interfaces/overview/interfacesInfo']
+
+
+def test_expired_responses_are_requested_again(standin):
+    with OPNsenseClient(standin.config(cache_ttl={'interfaces/overview/interfacesInfo': 0.05})) as api:
+        api.get('interfaces/overview/interfacesInfo')
+        api.get('interfaces/overview/interfacesInfo')
+        time.sleep(0.06)
+        api.get('interfaces/overview/interfacesInfo')
+    assert len(standin.requests) == 2
+
+
+def test_cached_responses_are_copies(standin):
+    with OPNsenseClient(standin.config()) as api:
+        api.get('interfaces/overview/interfacesInfo')["rows"].clear()
+        assert api.get('interfaces/overview/interfacesInfo')["rows"]
+
+
+def test_persisted_between_clients(standin, tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    for _ in range(2):
+        with OPNsenseClient(standin.config(response_cache=True)) as api:
+            assert api.probe().version == PRODUCT_VERSION
+    assert paths(standin) == ['core/firmware/status']
+    path = ResponseCache.from_config(standin.config(response_cache=True)).path
+    assert path.startswith(str(tmp_path))
+    # Another firewall or API key gets its own file
+    assert ResponseCache.from_config(standin.config(response_cache=True, api_key="other")).path != path
+
+
+@pytest.mark.parametrize("status, nested", [
+    ({"product": {"product_version": "24.7.1", "product_name": "OPNsense"}}, True),
+    ({"product_version": "23.1.11"}, False),
+], ids=["nested", "flat"])
+def test_capabilities_of_both_status_shapes(status, nested):
+    capabilities = Capabilities(status)
+    assert capabilities.nested_product == nested
+    assert capabilities.version == (status.get("product") or status)["product_version"]
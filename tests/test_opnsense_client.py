@@ -0,0 +1,315 @@
+import json
+import time
+
+import pytest
+
+pytest.importorskip("requests")
+
+import ar7_dhcp4_to_opnsense_kea
+import ar7_telekom_to_opnsense_pppoe
+import clean_opnsense_kea_dhcpv4
+import vpn_wireguard_to_opnsense
+from opnsense_client import (
+    AdaptiveLimiter, OPNsenseClient, OPNsenseError, failures, is_idempotent, run_concurrently,
+)
+from opnsense_standin import OPNsenseStandin, PRODUCT_VERSION
+from synthetic_config import generate_ar7_cfg, generate_vpn_cfg
+
+
+@pytest.fixture
+def standin():
+    with OPNsenseStandin() as standin:
+        yield standin
+
+
+def test_calls_share_one_connection(standin):
+    with OPNsenseClient(standin.config()) as api:
+        assert api.get('core/firmware/status')["product_version"] == PRODUCT_VERSION
+        uuids = [api.post('kea/dhcpv4/addSubnet', {"subnet4": {"subnet": f"10.0.{i}.0/24"}})["uuid"] for i in range(5)]
+        rows = api.get('kea/dhcpv4/searchSubnet')["rows"]
+    assert [row["uuid"] for row in rows] == uuids
+    assert standin.connections == 1
+
+
+def test_iter_search_pages(standin):
+    with OPNsenseClient(standin.config()) as api:
+        uuids = [api.post('kea/dhcpv4/addSubnet', {"subnet4": {"subnet": f"10.0.{i}.0/24"}})["uuid"] for i in range(23)]
+        assert [row["uuid"] for row in api.iter_search('kea/dhcpv4/searchSubnet', page_size=5)] == uuids
+        rows = list(api.iter_search('kea/dhcpv4/searchSubnet', phrase="10.0.1", page_size=5))
+    assert sorted(row["subnet"] for row in rows) == ["10.0.1.0/24"] + [f"10.0.{i}.0/24" for i in range(10, 20)]
+    searches = [path for _, path in standin.requests if "search" in path]
+    assert len(searches) == 5 + 3
+    assert searches[-1] == 'kea/dhcpv4/searchSubnet?current=3&rowCount=5&searchPhrase=10.0.1'
+
+
+def test_http_error_raises(standin):
+    config = standin.config(api_secret="wrong")
+    with OPNsenseClient(config) as api, pytest.raises(OPNsenseError, match="401") as error:
+        api.get('core/firmware/status')
+    assert error.value.status == 401
+
+
+@pytest.mark.parametrize("method, endpoint, expected", [
+    ('GET', 'kea/dhcpv4/searchSubnet', True),
+    ('POST', 'kea/dhcpv4/set', False),
+    ('POST', 'kea/dhcpv4/setReservation/0d7c7a7e', True),
+    ('POST', 'kea/dhcpv4/setReservation', False),
+    ('POST', 'kea/dhcpv4/delReservation/0d7c7a7e', True),
+    ('POST', 'firewall/filter/apply', True),
+    ('POST', 'kea/dhcpv4/addReservation', False),
+])
+def test_is_idempotent(method, endpoint, expected):
+    assert is_idempotent(method, endpoint) == expected
+
+
+def test_idempotent_requests_are_retried(standin):
+    standin.fail(2, status=502)
+    with OPNsenseClient(standin.config(backoff=0.01)) as api:
+        assert api.get('core/firmware/status')["product_version"] == PRODUCT_VERSION
+    assert len(standin.failures) == 2
+
+
+def test_creates_are_only_retried_when_refused(standin):
+    standin.fail(1, status=502)
+    with OPNsenseClient(standin.config(backoff=0.01)) as api:
+        with pytest.raises(OPNsenseError) as error:
+            api.post('kea/dhcpv4/addSubnet', {"subnet4": {"subnet": "10.0.0.0/24"}})
+        assert error.value.status == 502
+
+        standin.fail(1, status=429, retry_after="0.3")
+        start = time.monotonic()
+        api.post('kea/dhcpv4/addSubnet', {"subnet4": {"subnet": "10.0.1.0/24"}})
+        assert time.monotonic() - start >= 0.3
+    assert [subnet["subnet"] for subnet in standin.items('kea/dhcpv4', 'Subnet')] == ["10.0.1.0/24"]
+
+
+def test_adaptive_limiter():
+    limiter = AdaptiveLimiter(8)
+    limiter.update(0.01)
+    limiter.update(0.05)
+    assert limiter.limit == 4
+    for _ in range(40):
+        limiter.update(0.01)
+    assert limiter.limit == 8
+    time.sleep(0.02)
+    limiter.update(overloaded=True)
+    # The requests in flight with it report the same overload
+    limiter.update(overloaded=True)
+    assert limiter.limit == 4
+
+
+def test_concurrency_adapts_to_overloaded_firewall():
+    pytest.importorskip("httpx")
+
+    async def add(api, i):
+        return await api.post('kea/dhcpv4/addReservation', {"reservation": {"hostname": f"host-{i}"}})
+
+    with OPNsenseStandin(latency=0.005, capacity=2) as standin:
+        run_concurrently(standin.config(backoff=0.01, retries=8), 16, add, range(100))
+        hostnames = sorted(item["hostname"] for item in standin.items('kea/dhcpv4', 'Reservation'))
+    assert standin.failures
+    assert hostnames == sorted(f"host-{i}" for i in range(100))
+
+
+def write_config(standin, tmp_path):
+    config = tmp_path / "config.json"
+    config.write_text(json.dumps(standin.config()), encoding="utf-8")
+    return str(config)
+
+
+def test_pppoe_migration(standin, tmp_path, capsys):
+    ar7cfg = tmp_path / "ar7.cfg"
+    ar7cfg.write_text(generate_ar7_cfg(landevices=2), encoding="utf-8")
+
+    ar7_telekom_to_opnsense_pppoe.main(["", "--no-cache", "--config", write_config(standin, tmp_path), str(ar7cfg), "WAN"])
+
+    assert [path for _, path in standin.requests] == [
+        'core/firmware/status', 'interfaces/overview/interfacesInfo?current=1&rowCount=500&searchPhrase=WAN',
+        'interfaces/vlan_settings/addItem', 'interfaces/vlan_settings/reconfigure']
+    assert "WAN interface [WAN] is vtnet0" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("options", [[], ["--concurrency", "4"]], ids=["serial", "concurrent"])
+def test_clean_kea(options, standin, tmp_path, capsys):
+    if "--concurrency" in options:
+        pytest.importorskip("httpx")
+    ar7cfg = tmp_path / "ar7.cfg"
+    ar7cfg.write_text(generate_ar7_cfg(landevices=20), encoding="utf-8")
+    config = write_config(standin, tmp_path)
+    ar7_dhcp4_to_opnsense_kea.main(["", "--no-cache", "--config", config, str(ar7cfg)])
+    reservations = len(standin.items('kea/dhcpv4', 'Reservation'))
+    subnets = len(standin.items('kea/dhcpv4', 'Subnet'))
+    capsys.readouterr()
+
+    clean_opnsense_kea_dhcpv4.main(["", "--config", config, "--dry-run"])
+    assert f"Would delete {reservations} reservations and {subnets} subnets" in capsys.readouterr().out
+    assert len(standin.items('kea/dhcpv4', 'Reservation')) == reservations
+
+    clean_opnsense_kea_dhcpv4.main(["", "--config", config, *options])
+
+    assert standin.items('kea/dhcpv4', 'Reservation') == []
+    assert standin.items('kea/dhcpv4', 'Subnet') == []
+    out = capsys.readouterr().out
+    assert "not found" not in out
+    assert f"{reservations} reservations deleted" in out
+    # Every reservation is deleted before the first subnet
+    deletes = [path for method, path in standin.requests if "/del" in path]
+    assert all("delReservation" in path for path in deletes[:reservations])
+
+
+def test_wireguard_clean(standin, tmp_path, capsys):
+    pytest.importorskip("httpx")
+    vpncfg = tmp_path / "vpn.cfg"
+    vpncfg.write_text(generate_vpn_cfg(connections=12), encoding="utf-8")
+    config = write_config(standin, tmp_path)
+    vpn_wireguard_to_opnsense.main(["", "--no-cache", "--config", config, str(vpncfg)])
+    servers = len(standin.items('wireguard/server', 'Server'))
+    clients = len(standin.items('wireguard/client', 'Client'))
+    assert servers and clients
+
+    vpn_wireguard_to_opnsense.main(["", "--no-cache", "--clean", "--dry-run", "--config", config, str(vpncfg)])
+    assert len(standin.items('wireguard/client', 'Client')) == clients
+    assert f"Would remove {servers} servers and {clients} clients" in capsys.readouterr().out
+
+    vpn_wireguard_to_opnsense.main(["", "--no-cache", "--clean", "--concurrency", "4", "--config", config, str(vpncfg)])
+    out = capsys.readouterr().out
+    assert f"Servers removed: {servers}\nClients removed: {clients}" in out
+    # Migrated again after the cleanup
+    assert len(standin.items('wireguard/client', 'Client')) == clients
+
+
+def test_wireguard_flags_are_optional(standin, tmp_path):
+    vpncfg = tmp_path / "vpn.cfg"
+    vpncfg.write_text(generate_vpn_cfg(connections=4), encoding="utf-8")
+    config = write_config(standin, tmp_path)
+    vpn_wireguard_to_opnsense.main(["", "--no-cache", "--config", config, str(vpncfg)])
+    vpn_wireguard_to_opnsense.main(["", "--no-cache", "--config", config, str(vpncfg)])
+    paths = [path for _, path in standin.requests]
+    # Without --clean, the servers of the first run are kept, without --addrules no rules are added
+    assert len(standin.items('wireguard/server', 'Server')) == 2 * 2
+    assert not [path for path in paths if path.startswith(('wireguard/server/delServer', 'firewall/'))]
+
+    vpn_wireguard_to_opnsense.main(["", "--no-cache", "--clean", "--addrules", "--config", config, str(vpncfg)])
+    assert len(standin.items('wireguard/server', 'Server')) == 2
+    assert [path for _, path in standin.requests].count('firewall/filter/addRule') == 4
+
+
+def test_failed_request_ends_script(standin, tmp_path, capsys):
+    ar7cfg = tmp_path / "ar7.cfg"
+    ar7cfg.write_text(generate_ar7_cfg(landevices=2), encoding="utf-8")
+    standin.fail(10, status=504)
+    with pytest.raises(SystemExit):
+        ar7_dhcp4_to_opnsense_kea.main(["", "--no-cache", "--config", write_config(standin, tmp_path), str(ar7cfg)])
+    assert "Error making request to OPNsense: 504" in capsys.readouterr().out
+
+
+def printed_uuids(out):
+    return [line.split("'uuid': '")[1].split("'")[0] for line in out.splitlines() if "'uuid'" in line]
+
+
+def test_dhcp_migration(standin, tmp_path, capsys):
+    ar7cfg = tmp_path / "ar7.cfg"
+    ar7cfg.write_text(generate_ar7_cfg(landevices=20), encoding="utf-8")
+
+    ar7_dhcp4_to_opnsense_kea.main(["", "--no-cache", "--config", write_config(standin, tmp_path), str(ar7cfg)])
+
+    subnets = standin.items('kea/dhcpv4', 'Subnet')
+    reservations = standin.items('kea/dhcpv4', 'Reservation')
+    assert subnets and reservations
+    assert {reservation["subnet"] for reservation in reservations} <= {subnet["uuid"] for subnet in subnets}
+    assert standin.connections == 1
+    assert PRODUCT_VERSION in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("script, text, field", [
+    (ar7_dhcp4_to_opnsense_kea, generate_ar7_cfg(landevices=30), "ip_address"),
+    (vpn_wireguard_to_opnsense, generate_vpn_cfg(connections=12), "name"),
+], ids=["dhcp", "wireguard"])
+def test_concurrent_results_in_input_order(script, text, field, tmp_path, capsys):
+    pytest.importorskip("httpx")
+    cfg = tmp_path / "input.cfg"
+    cfg.write_text(text, encoding="utf-8")
+    outputs = []
+    for concurrency in ("1", "4"):
+        with OPNsenseStandin(latency=0.002) as standin:
+            script.main(["", "--no-cache", "--concurrency", concurrency, "--config", write_config(standin, tmp_path), str(cfg)])
+            items = {item["uuid"]: item for module, kind in (("kea/dhcpv4", "Reservation"), ("wireguard/client", "Client"))
+                     for item in standin.items(module, kind)}
+        # The printed results name the items created for the inputs in input order
+        outputs.append([items[uuid][field] for uuid in printed_uuids(capsys.readouterr().out) if uuid in items])
+    assert len(outputs[0]) > 5
+    assert outputs[0] == outputs[1]
+
+
+def test_concurrent_failures_keep_other_results(standin):
+    pytest.importorskip("httpx")
+
+    async def add(api, i):
+        return await api.post('kea/dhcpv4/addReservation', {"reservation": {"hostname": f"host-{i}"}})
+
+    standin.fail(1, status=400)
+    reported = []
+    pairs = run_concurrently(standin.config(), 4, add, range(10), lambda i, result: reported.append(i))
+    assert [i for i, _ in pairs] == list(range(10)) and sorted(reported) == list(range(10))
+    failed = failures(pairs)
+    assert len(failed) == 1 and failed[0][1].status == 400
+    assert len(standin.items('kea/dhcpv4', 'Reservation')) == 9
+
+
+@pytest.mark.parametrize("script, text, path, skip, error", [
+    (ar7_dhcp4_to_opnsense_kea, generate_ar7_cfg(landevices=30), 'kea/dhcpv4/addReservation', 0,
+     "Error adding reservation "),
+    # The clients of the 6 site to site connections are created first, one at a time
+    (vpn_wireguard_to_opnsense, generate_vpn_cfg(connections=12), 'wireguard/client/addClient', 6,
+     "Error creating peer "),
+], ids=["dhcp", "wireguard"])
+def test_concurrent_failure_names_item(script, text, path, skip, error, tmp_path, capsys):
+    pytest.importorskip("httpx")
+    cfg = tmp_path / "input.cfg"
+    cfg.write_text(text, encoding="utf-8")
+    with OPNsenseStandin() as standin:
+        standin.fail(1, status=400, path=path, skip=skip)
+        with pytest.raises(SystemExit) as exit_info:
+            script.main(["", "--no-cache", "--concurrency", "4", "--config", write_config(standin, tmp_path), str(cfg)])
+        created = {item["uuid"] for module, kind in (("kea/dhcpv4", "Reservation"), ("wireguard/client", "Client"))
+                   for item in standin.items(module, kind)}
+    out = capsys.readouterr().out
+    assert exit_info.value.code == 1
+    assert sum(line.startswith(error) for line in out.splitlines()) == 1
+    # The results of the other requests are still printed
+    assert created <= set(printed_uuids(out))
+
+
+def test_dhcp_bulk_migration(tmp_path, capsys):
+    ar7cfg = tmp_path / "ar7.cfg"
+    ar7cfg.write_text(generate_ar7_cfg(landevices=40), encoding="utf-8")
+
+    def migrate(*options):
+        with OPNsenseStandin() as standin:
+            ar7_dhcp4_to_opnsense_kea.main(["", "--no-cache", *options, "--config", write_config(standin, tmp_path), str(ar7cfg)])
+            subnets = {subnet["uuid"]: subnet["subnet"] for subnet in standin.items('kea/dhcpv4', 'Subnet')}
+            reservations = [dict(reservation, subnet=subnets[reservation["subnet"]], uuid=None)
+                            for reservation in standin.items('kea/dhcpv4', 'Reservation')]
+            return sorted(subnets.values()), reservations, standin.requests
+
+    subnets, reservations, requests = migrate()
+    assert (subnets, reservations) == migrate("--bulk")[:2]
+    assert len(requests) == 1 + len(subnets) + len(reservations)
+    assert [path for _, path in migrate("--bulk")[2]] == [
+        'core/firmware/status', 'kea/dhcpv4/get', 'kea/dhcpv4/set', 'kea/dhcpv4/get', 'kea/dhcpv4/set']
+    assert f"{len(subnets)} subnets and {len(reservations)} reservations migrated" in capsys.readouterr().out
+
+
+def test_dhcp_bulk_set_is_not_repeated(tmp_path, capsys):
+    ar7cfg = tmp_path / "ar7.cfg"
+    ar7cfg.write_text(generate_ar7_cfg(landevices=10), encoding="utf-8")
+    with OPNsenseStandin() as standin:
+        # The firewall stores the subnets, but the answer times out
+        standin.fail(1, status=504, path='kea/dhcpv4/set', applied=True)
+        with pytest.raises(SystemExit):
+            ar7_dhcp4_to_opnsense_kea.main(["", "--no-cache", "--bulk", "--config", write_config(standin, tmp_path),
+                                            str(ar7cfg)])
+        subnets = [subnet["subnet"] for subnet in standin.items('kea/dhcpv4', 'Subnet')]
+    assert subnets and len(subnets) == len(set(subnets))
+    assert [path for _, path in standin.requests].count('kea/dhcpv4/set') == 1
+    assert "504" in capsys.readouterr().out
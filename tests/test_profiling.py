@@ -0,0 +1,42 @@
+import io
+import json
+import pstats
+
+import profiling
+from profiling import PhaseProfiler, phase
+from config_loader import load_config_string
+from synthetic_config import generate_ar7_cfg
+
+
+def test_phase_without_profiler():
+    with phase("parse") as stats:
+        assert stats is None
+
+
+def test_nested_phases(tmp_path):
+    output = io.StringIO()
+    json_path = tmp_path / "profile.json"
+    with PhaseProfiler(json_path=str(json_path), output=output) as profiler:
+        with phase("load"):
+            load_config_string(generate_ar7_cfg(landevices=10))
+        with phase("load"):
+            pass
+    assert profiling._active is None
+
+    assert list(profiler.phases) == ["load", "load/parse"]
+    assert profiler.phases["load"].calls == 2
+    assert profiler.phases["load/parse"].calls == 1
+    assert profiler.phases["load"].wall >= profiler.phases["load/parse"].wall
+
+    report = json.loads(json_path.read_text())
+    assert [p["name"] for p in report["phases"]] == ["load", "load/parse"]
+    assert report["wall"] >= report["phases"][0]["wall"]
+    assert "  parse" in output.getvalue()
+
+
+def test_pstats_dump(tmp_path):
+    pstats_path = tmp_path / "profile.pstats"
+    with PhaseProfiler(pstats_path=str(pstats_path), output=io.StringIO()):
+        load_config_string(generate_ar7_cfg(landevices=10))
+    functions = {function for _, _, function in pstats.Stats(str(pstats_path)).stats}
+    assert "parse_config_string" in functions
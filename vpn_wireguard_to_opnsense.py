@@ -1,20 +1,18 @@
 #!/bin/python3
 
-import json
 import argparse
-import requests
 import sys
-import re
 import warnings
 import secrets
 import base64
 import ipaddress
-import jmespath
-from requests.auth import HTTPBasicAuth
-from antlr4 import *
-from ConfigLexer import ConfigLexer
-from ConfigParser import ConfigParser
-from ConfigJSONPrinter import ConfigJSONPrinter
+from config_loader import add_config_loader_arguments, config_cache_from_args, load_config_file
+from config_query import ConfigQuery
+from profiling import add_profile_arguments, profiler_from_args, phase
+from opnsense_client import (
+    OPNsenseClient, OPNsenseError, add_concurrency_argument, delete_all, failures, load_config,
+    run_concurrently,
+)
 
 tunnel_network = "10.10.10.1/24"
 
@@ -26,48 +24,8 @@ def next_ip(ip_network):
     
     return f"{next_ip}/32"
 
-def load_config(config_file):
-    if config_file is None:
-        config_file="config.json"
-    try:
-        with open(config_file, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Config file '{config_file}' not found.")
-        sys.exit(1)
-    except json.JSONDecodeError:
-        print(f"Error: Invalid JSON in config file '{config_file}'.")
-        sys.exit(1)
-        
-def make_request(config, method, endpoint, data=None):
-    url = f"{config['url']}/api/{endpoint}"
-    try:
-        if method == 'GET':
-            response = requests.get(
-                url,
-                auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
-                verify=config.get('verify_ssl', True)
-            )
-        elif method in ['POST', 'PUT']:
-            response = requests.post(
-                url,
-                auth=HTTPBasicAuth(config['api_key'], config['api_secret']),
-                verify=config.get('verify_ssl', True),
-                json=data
-            )
-        else:
-            raise ValueError(f"Unsupported HTTP method: {method}")
-        
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        print(f"Error making request to OPNsense: {e}")
-        sys.exit(1)
-        
-def get_opnsense_version(config):
-    data = make_request(config, 'GET', 'core/firmware/status')
-    product = data["product"]
-    return product.get('product_version', 'Unknown')
+def get_opnsense_version(api):
+    return api.probe().version
 
 def generate_keypair():
     private_key = base64.b64encode(secrets.token_bytes(32)).decode('utf-8')
@@ -76,7 +34,7 @@ def generate_keypair():
     public_key = base64.b64encode(secrets.token_bytes(32)).decode('utf-8')
     return private_key, public_key
 
-def create_wireguard_server(config, vpn_config, global_vpn_config):
+def create_wireguard_server(api, vpn_config, global_vpn_config):
     server_data = {
         "server": {
             "enabled": "1" if vpn_config["enabled"] == "yes" else "0",
@@ -93,10 +51,10 @@ def create_wireguard_server(config, vpn_config, global_vpn_config):
         }
     }
 
-    response = make_request(config, 'POST', 'wireguard/server/addServer', server_data)
+    response = api.post('wireguard/server/addServer', server_data)
     return response
 
-def create_wireguard_client(config, vpn_config, global_vpn_config, server_uuid, address):
+def create_wireguard_client(api, vpn_config, global_vpn_config, server_uuid, address):
     client_data = {
         "client": {
             "enabled": "1" if vpn_config["enabled"] == "yes" else "0",
@@ -112,85 +70,77 @@ def create_wireguard_client(config, vpn_config, global_vpn_config, server_uuid,
             "servers": server_uuid
         }
     }
-    response = make_request(config, 'POST', 'wireguard/client/addClient', client_data)
+    response = api.post('wireguard/client/addClient', client_data)
     return response
 
-def enable_wireguard_service(config):
+def enable_wireguard_service(api):
     service_data = {
         "general": {
             "enabled": "1"
         }
     }
-    response = make_request(config, 'POST', 'wireguard/general/set', service_data)
+    response = api.post('wireguard/general/set', service_data)
 
     # Reconfigure the service to apply changes
-    make_request(config, 'POST', 'wireguard/service/reconfigure')
+    api.post('wireguard/service/reconfigure')
 
     return response
 
-def remove_all_wireguard_configs(config):
+def search_wireguard_servers(api):
+    # Read completely before deleting, see iter_search()
+    return [server for server in api.iter_search('wireguard/server/searchServer') if server.get('uuid')]
+
+def search_wireguard_clients(api):
+    return [client for client in api.iter_search('wireguard/client/searchClient') if client.get('uuid')]
+
+def delete_wireguard_server(api, uuid):
+    return api.post(f'wireguard/server/delServer/{uuid}')
+
+def delete_wireguard_client(api, uuid):
+    return api.post(f'wireguard/client/delClient/{uuid}')
+
+def remove_all_wireguard_configs(api, config, concurrency=1):
     # Remove all server instances
-    servers_removed = remove_all_servers(config)
+    servers_removed = remove_all_servers(api, config, concurrency)
     
     # Remove all clients
-    clients_removed = remove_all_clients(config)    
+    clients_removed = remove_all_clients(api, config, concurrency)    
    
     return {
         "servers_removed": servers_removed,
         "clients_removed": clients_removed,
     }
 
-def remove_all_servers(config):
-    # Fetch all server instances
-    servers_response = make_request(config, 'GET', 'wireguard/server/searchServer')
-    servers = servers_response.get('rows', [])
-    
-    removed_servers = []
-    for server in servers:
-        uuid = server.get('uuid')
-        if uuid:
-            response = make_request(config, 'POST', f'wireguard/server/delServer/{uuid}')
-            removed_servers.append({
-                "uuid": uuid,
-                "name": server.get('name'),
-                "response": response
-            })
-    
-    return removed_servers
-
-def remove_all_clients(config):
-    # Fetch all clients
-    clients_response = make_request(config, 'GET', 'wireguard/client/searchClient')
-    clients = clients_response.get('rows', [])
-    
-    removed_clients = []
-    for client in clients:
-        uuid = client.get('uuid')
-        if uuid:
-            response = make_request(config, 'POST', f'wireguard/client/delClient/{uuid}')
-            removed_clients.append({
-                "uuid": uuid,
-                "name": client.get('name'),
-                "response": response
-            })
-    
-    return removed_clients
-
-def cleanup_wireguard_configs(config):
-    result = remove_all_wireguard_configs(config)
+def remove_all_servers(api, config, concurrency=1):
+    servers = search_wireguard_servers(api)
+    responses = delete_all(api, config, concurrency, delete_wireguard_server, servers, "servers")
+    return [{"uuid": server['uuid'], "name": server.get('name'), "response": response}
+            for server, response in zip(servers, responses)]
+
+def remove_all_clients(api, config, concurrency=1):
+    clients = search_wireguard_clients(api)
+    responses = delete_all(api, config, concurrency, delete_wireguard_client, clients, "clients")
+    return [{"uuid": client['uuid'], "name": client.get('name'), "response": response}
+            for client, response in zip(clients, responses)]
+
+def cleanup_wireguard_configs(api, config, concurrency=1, dry_run=False):
+    if dry_run:
+        print(f"Would remove {len(search_wireguard_servers(api))} servers and {len(search_wireguard_clients(api))} clients")
+        return
+    result = remove_all_wireguard_configs(api, config, concurrency)
     print("Wireguard configurations removal summary:")
     print(f"Servers removed: {len(result['servers_removed'])}")
     print(f"Clients removed: {len(result['clients_removed'])}")
     print("")
     return result
 
-def add_firewall_rule(config, rule_data):
-    response = make_request(config, 'POST', 'firewall/filter/addRule', rule_data)
+def add_firewall_rule(api, rule_data):
+    response = api.post('firewall/filter/addRule', rule_data)
 
     return response
 
-def apply_firewall_rules(config):
-    response = make_request(config, 'POST', 'firewall/filter/apply')
+def apply_firewall_rules(api):
+    response = api.post('firewall/filter/apply')
 
     return response
 
@@ -199,30 +149,45 @@ def main(argv):
     parser.add_argument("--clean", help="clean up all instances and peer entries before adding new ones", action='store_true')
     parser.add_argument("--addrules", help="add a firewall rule to allow wireguard on the WAN port and a rule to allow vpn users to access the internal network", action='store_true')
     parser.add_argument("--config", default="config.json", help="Path to the config file")
+    add_config_loader_arguments(parser)
+    add_profile_arguments(parser)
+    add_concurrency_argument(parser)
+    parser.add_argument("--dry-run", action="store_true",
+                        help="with --clean, only count the instances and peer entries that would be removed and stop")
     parser.add_argument("vpncfg", metavar="vpn.cfg", help="Path to the vpn.cfg file")
-    args = parser.parse_args()
-
+    args = parser.parse_args(argv[1:])
+    if args.dry_run and not args.clean:
+        parser.error("--dry-run requires --clean")
+
+    with profiler_from_args(args):
+        try:
+            run(args)
+        except OPNsenseError as e:
+            print(f"Error making request to OPNsense: {e}")
+            sys.exit(1)
+
+def run(args):
     warnings.filterwarnings('ignore', message='Unverified HTTPS request')
 
     config = load_config(args.config)
+    api = OPNsenseClient(config)
 
-    version = get_opnsense_version(config)
+    version = get_opnsense_version(api)
     print(f"OPNsense Version: {version}")
 
-    if args.clean is not None:
-        cleanup_wireguard_configs(config)
+    if args.clean:
+        cleanup_wireguard_configs(api, config, args.concurrency, args.dry_run)
+        if args.dry_run:
+            return
 
-    input_stream = FileStream(args.vpncfg, encoding='utf-8')
-    lexer = ConfigLexer(input_stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = ConfigParser(token_stream)
-    tree = parser.config()
-    printer = ConfigJSONPrinter()
-    vpncfg = json.loads(printer.visitConfig(tree))
+    vpncfg = load_config_file(args.vpncfg, backend=args.parser_backend, cache=config_cache_from_args(args),
+                              sections={"vpncfg.global", "vpncfg.connections"})
 
-    global_vpn_config = jmespath.search('vpncfg.global', vpncfg)
-    site_to_site_matches = jmespath.search('vpncfg.connections[?conn_type == `conntype_wg` && wg_hide_network == `no`]', vpncfg)
-    client_matches = jmespath.search('vpncfg.connections[?conn_type == `conntype_wg` && wg_hide_network == `yes`]', vpncfg)
+    with phase("query"):
+        query = ConfigQuery(vpncfg)
+        global_vpn_config = query.section('vpncfg.global')
+        site_to_site_matches = query.where('vpncfg.connections', conn_type='conntype_wg', wg_hide_network='no')
+        client_matches = query.where('vpncfg.connections', conn_type='conntype_wg', wg_hide_network='yes')
 
     peers = []
 
@@ -233,10 +198,10 @@ def main(argv):
     for site_to_site_config in site_to_site_matches:
 #        print(json.dumps(match, indent=2))
 
-        result = create_wireguard_server(config, site_to_site_config, global_vpn_config)
+        result = create_wireguard_server(api, site_to_site_config, global_vpn_config)
         print(result)
         server_uuid = result['uuid']
-        result = create_wireguard_client(config, site_to_site_config, global_vpn_config, server_uuid, site_to_site_config["wg_allowed_ips"])
+        result = create_wireguard_client(api, site_to_site_config, global_vpn_config, server_uuid, site_to_site_config["wg_allowed_ips"])
         print(result)
         client_uuid = result['uuid']
         peers.append(client_uuid)
@@ -245,17 +210,37 @@ def main(argv):
 
     print("")
     print(str(len(client_matches)) + " client vpn configs found")
+    peer_addresses = []
     for client_config in client_matches:
 #        print(json.dumps(client_config, indent=2))
         next_address = next_ip(next_address)
-        result = create_wireguard_client(config, client_config, global_vpn_config, server_uuid, next_address)
-        print(result)
-        client_uuid = result['uuid']
-        peers.append(client_uuid)
+        peer_addresses.append((client_config, next_address))
+
+    def create_peer(api, peer):
+        # With an AsyncOPNsenseClient, this returns a coroutine
+        client_config, address = peer
+        return create_wireguard_client(api, client_config, global_vpn_config, server_uuid, address)
+
+    if args.concurrency > 1:
+        pairs = run_concurrently(config, args.concurrency, create_peer, peer_addresses)
+        for (client_config, address), result in pairs:
+            if isinstance(result, OPNsenseError):
+                print(f"Error creating peer {client_config['name']} ({address}): {result}")
+            else:
+                print(result)
+                peers.append(result['uuid'])
+        if failures(pairs):
+            sys.exit(1)
+    else:
+        for peer in peer_addresses:
+            result = create_peer(api, peer)
+            print(result)
+            client_uuid = result['uuid']
+            peers.append(client_uuid)
 
     print("")
 
-    if args.addrules is not None:
+    if args.addrules:
         print("Allowing WAN access to wireguard port on firewall")
         wan_rule_data = {
             "rule": {
@@ -274,11 +259,11 @@ def main(argv):
             }
         }
 
-        response = add_firewall_rule(config, wan_rule_data)
+        response = add_firewall_rule(api, wan_rule_data)
         print(response)
         wan_rule_data['rule']['ipprotocol'] = "inet6"
         wan_rule_data['rule']['description'] = "Allow IPv6 UDP, Port " + str(global_vpn_config["wg_listen_port"]) + " (Wireguard) to firewall"
-        response = add_firewall_rule(config, wan_rule_data)
+        response = add_firewall_rule(api, wan_rule_data)
         print(response)
 
         print("")
@@ -300,19 +285,19 @@ def main(argv):
             }
         }
 
-        response = add_firewall_rule(config, wireguard_rule_data)
+        response = add_firewall_rule(api, wireguard_rule_data)
         print(response)
 
         wireguard_rule_data['rule']['ipprotocol'] = "inet6"
         wireguard_rule_data['rule']['description'] = "Allow IPv6 access to all internal networks from VPN"
-        response = add_firewall_rule(config, wireguard_rule_data)
+        response = add_firewall_rule(api, wireguard_rule_data)
         print(response)
 
         print("")
         print("Applying firewall rules")
-        apply_firewall_rules(config)
+        apply_firewall_rules(api)
 
-    enable_wireguard_service(config)
+    enable_wireguard_service(api)
 
 if __name__ == '__main__':
     main(sys.argv)